@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.authentication'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .revocation import check_revocation_cache
+        check_revocation_cache()
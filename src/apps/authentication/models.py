@@ -1,10 +1,24 @@
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
-from django.db import models
+from django.db import models, transaction
 
 from apps.core.models import BaseModel
+from .revocation import revoke_tokens
 
 
-class UserManager(BaseUserManager):
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # Bulk updates send no pre_save, so revoke tokens as the signal does
+        if 'role' not in kwargs and 'password' not in kwargs and kwargs.get('is_active', True) is True:
+            return super().update(**kwargs)
+        with transaction.atomic():
+            user_ids = list(self.values_list('pk', flat=True))
+            updated = super().update(**kwargs)
+        if user_ids:
+            revoke_tokens(*user_ids)
+        return updated
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
     def create_user(self, email, password=None, **extra_fields):
         if not email:
             raise ValueError('The Email field must be set')
@@ -0,0 +1,34 @@
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework_simplejwt.settings import api_settings
+
+from apps.core.cache import is_shared_cache
+
+REVOKED_CACHE_KEY = 'auth:revoked:{user_id}'
+
+
+def revoke_tokens(*user_ids) -> None:
+    # Access tokens issued to the users before now stop being accepted by the
+    # stateless authentication. The entries only have to outlive those tokens.
+    revoked = time.time()
+    cache.set_many(
+        {REVOKED_CACHE_KEY.format(user_id=user_id): revoked for user_id in user_ids},
+        timeout=int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()) + 1
+    )
+
+
+def revoked_at(user_id) -> Optional[float]:
+    return cache.get(REVOKED_CACHE_KEY.format(user_id=user_id))
+
+
+def check_revocation_cache() -> None:
+    # A revocation written by one worker has to reach every other worker,
+    # or a revoked token stays valid there until it expires
+    if getattr(settings, 'AUTH_STATELESS_JWT', False) and not is_shared_cache():
+        raise ImproperlyConfigured(
+            "AUTH_STATELESS_JWT requires a cache shared by every process (REDIS_CACHE_URL) to revoke tokens"
+        )
@@ -1,7 +1,8 @@
 from rest_framework import serializers
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 
 from .models import User
+from .tokens import RoleRefreshToken
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -21,6 +22,8 @@ class UserCreateSerializer(serializers.ModelSerializer):
 
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = RoleRefreshToken
+
     def validate(self, attrs):
         data = super().validate(attrs)
         user = self.user
@@ -31,3 +34,7 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
             'is_admin': user.is_admin,
         })
         return data
+
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = RoleRefreshToken
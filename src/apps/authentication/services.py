@@ -1,3 +1,5 @@
+from typing import Optional
+
 from django.db.models import QuerySet
 
 from .repositories import UserRepository
@@ -11,5 +13,8 @@ class UserService:
     def all(self) -> QuerySet:
         return self.repository.all()
     
+    def get_by_id(self, id: int) -> Optional[User]:
+        return self.repository.get_by_id(id)
+    
     def create(self, **kwargs) -> User:
         return self.repository.create(**kwargs)
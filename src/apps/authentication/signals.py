@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, pre_save
+from django.dispatch import receiver
+
+from .models import User
+from .revocation import revoke_tokens
+
+
+@receiver(pre_save, sender=User)
+def revoke_tokens_on_change(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    previous = sender.objects.filter(pk=instance.pk).values('role', 'is_active', 'password').first()
+    if previous is None:
+        return
+    if (
+        previous['role'] != instance.role
+        or previous['password'] != instance.password
+        or (previous['is_active'] and not instance.is_active)
+    ):
+        revoke_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def revoke_tokens_on_delete(sender, instance, **kwargs):
+    revoke_tokens(instance.pk)
@@ -1,3 +1,127 @@
-from django.test import TestCase
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.authentication.authentication import RoleTokenUser, StatelessJWTAuthentication
+from apps.authentication.models import User
+from apps.authentication.revocation import check_revocation_cache
+from apps.rules.services import RuleService
+from apps.rules.store import rule_store
+from apps.rules.views import RuleEvaluationViewSet, RuleViewSet
+
+
+@mock.patch.object(RuleViewSet, 'authentication_classes', [StatelessJWTAuthentication])
+@mock.patch.object(RuleEvaluationViewSet, 'authentication_classes', [StatelessJWTAuthentication])
+class StatelessJWTAuthenticationTests(TestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            email='admin1@gmail.com',
+            password='password123',
+            role='admin'
+        )
+        self.client_user = User.objects.create_user(
+            email='client1@gmail.com',
+            password='password123',
+            role='client'
+        )
+        RuleService().create(name="Adult", condition={"field": "age", "operator": ">=", "value": 18}, created_by=self.admin_user)
+        rule_store.clear()
+        cache.clear()
+        self.api_client = APIClient()
+
+    def login(self, email):
+        response = self.api_client.post('/api/auth/login/', {'email': email, 'password': 'password123'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def evaluate(self, access):
+        self.api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return self.api_client.post('/api/rule-evaluation/evaluate/', {"rules": ["Adult"], "payload": {"age": 30}}, format='json')
+
+    def test_evaluation_makes_no_auth_queries(self):
+        access = self.login('client1@gmail.com')['access']
+        self.evaluate(access)
+        with self.assertNumQueries(0):
+            response = self.evaluate(access)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['result'], 'APPROVED')
+
+    def test_role_comes_from_the_token(self):
+        request = mock.Mock(META={'HTTP_AUTHORIZATION': f"Bearer {self.login('admin1@gmail.com')['access']}"})
+        user, _ = StatelessJWTAuthentication().authenticate(request)
+        self.assertIsInstance(user, RoleTokenUser)
+        self.assertEqual((user.pk, user.is_admin, user.is_client), (self.admin_user.pk, True, False))
+
+        # Admin-only endpoints accept the token user
+        self.api_client.credentials(HTTP_AUTHORIZATION=request.META['HTTP_AUTHORIZATION'])
+        response = self.api_client.post('/api/rules/', {"name": "Thai", "condition": {"field": "country", "operator": "==", "value": "Thailand"}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(RuleService().get_by_name("Thai").created_by, self.admin_user)
+
+        access = self.login('client1@gmail.com')['access']
+        self.api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(self.api_client.get('/api/rules/').status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_deactivation_and_role_changes_revoke_tokens(self):
+        tokens = self.login('client1@gmail.com')
+        self.client_user.is_active = False
+        self.client_user.save()
+        self.assertEqual(self.evaluate(tokens['access']).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.api_client.credentials()
+        response = self.api_client.post('/api/auth/refresh-token/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        tokens = self.login('admin1@gmail.com')
+        self.admin_user.role = 'client'
+        self.admin_user.save()
+        self.assertEqual(self.evaluate(tokens['access']).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # A refreshed access token carries the new role (the revocation is
+        # ignored, since the token may be issued within the same second)
+        self.api_client.credentials()
+        with mock.patch('apps.authentication.authentication.revoked_at', return_value=None):
+            response = self.api_client.post('/api/auth/refresh-token/', {'refresh': tokens['refresh']}, format='json')
+            request = mock.Mock(META={'HTTP_AUTHORIZATION': f"Bearer {response.data['access']}"})
+            user, _ = StatelessJWTAuthentication().authenticate(request)
+        self.assertEqual(user.role, 'client')
+
+    def test_password_changes_and_bulk_updates_revoke_tokens(self):
+        access = self.login('client1@gmail.com')['access']
+        self.client_user.set_password('password456')
+        self.client_user.save()
+        self.assertEqual(self.evaluate(access).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        access = self.login('admin1@gmail.com')['access']
+        cache.clear()
+        User.objects.filter(pk=self.admin_user.pk).update(email='admin2@gmail.com')
+        self.assertEqual(self.evaluate(access).status_code, status.HTTP_200_OK)
+        User.objects.filter(pk=self.admin_user.pk).update(is_active=False)
+        self.assertEqual(self.evaluate(access).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_stateless_mode_requires_a_shared_cache(self):
+        with override_settings(AUTH_STATELESS_JWT=True):
+            with self.assertRaises(ImproperlyConfigured):
+                check_revocation_cache()
+            with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379/1'}}):
+                check_revocation_cache()
+        check_revocation_cache()
+
+    def test_tokens_without_role_are_checked_against_the_database(self):
+        access = AccessToken.for_user(self.client_user)
+        with self.assertNumQueries(1):
+            request = mock.Mock(META={'HTTP_AUTHORIZATION': f'Bearer {access}'})
+            user, _ = StatelessJWTAuthentication().authenticate(request)
+        self.assertEqual(user, self.client_user)
+
+    def test_me_returns_the_stored_user(self):
+        access = self.login('client1@gmail.com')['access']
+        self.api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        with mock.patch('apps.authentication.views.UserViewSet.authentication_classes', [StatelessJWTAuthentication]):
+            response = self.api_client.get('/api/auth/users/me/')
+        self.assertEqual(response.data['email'], 'client1@gmail.com')
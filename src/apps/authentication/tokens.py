@@ -0,0 +1,25 @@
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .models import User
+
+ROLE_CLAIM = 'role'
+
+
+class RoleRefreshToken(RefreshToken):
+    # Access tokens carry the user's role, so a stateless authentication can
+    # authorize requests without loading the user. It is read again whenever
+    # an access token is issued, so a refresh picks up a changed role.
+    @classmethod
+    def for_user(cls, user: User) -> 'RoleRefreshToken':
+        token = super().for_user(user)
+        token[ROLE_CLAIM] = user.role
+        return token
+
+    @property
+    def access_token(self) -> AccessToken:
+        access = super().access_token
+        role = User.objects.filter(pk=self.payload.get(api_settings.USER_ID_CLAIM)).values_list('role', flat=True).first()
+        if role is not None:
+            access[ROLE_CLAIM] = role
+        return access
@@ -1,8 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import TokenRefreshView
-
-from .views import UserViewSet, CustomTokenObtainPairView
+from .views import UserViewSet, CustomTokenObtainPairView, CustomTokenRefreshView
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet, basename='user')
@@ -10,5 +8,5 @@ router.register(r'users', UserViewSet, basename='user')
 urlpatterns = [
     path('', include(router.urls)),
     path('login/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('refresh-token/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('refresh-token/', CustomTokenRefreshView.as_view(), name='token_refresh'),
 ]
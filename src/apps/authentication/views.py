@@ -1,10 +1,10 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 from apps.core.permissions import IsAdminUser, IsClientUser
-from .serializers import UserSerializer, UserCreateSerializer, CustomTokenObtainPairSerializer
+from .serializers import UserSerializer, UserCreateSerializer, CustomTokenObtainPairSerializer, CustomTokenRefreshSerializer
 from .services import UserService
 
 
@@ -12,6 +12,10 @@ class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
 
+class CustomTokenRefreshView(TokenRefreshView):
+    serializer_class = CustomTokenRefreshSerializer
+
+
 class UserViewSet(viewsets.ModelViewSet):
     serializer_class = UserSerializer
     
@@ -38,5 +42,6 @@ class UserViewSet(viewsets.ModelViewSet):
         
     @action(detail=False, methods=['get'])
     def me(self, request):
-        serializer = self.get_serializer(request.user)
+        # With stateless authentication request.user only holds the token's claims
+        serializer = self.get_serializer(self.user_service.get_by_id(request.user.pk))
         return Response(serializer.data)
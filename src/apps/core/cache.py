@@ -0,0 +1,63 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Hashable, Optional, TypeVar
+
+from django.conf import settings
+
+V = TypeVar('V')
+
+_MISSING: Any = object()
+
+# Backends whose entries are only seen by the process that wrote them
+_PROCESS_LOCAL_BACKENDS = frozenset({
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+})
+
+
+def is_shared_cache(alias: str = 'default') -> bool:
+    return settings.CACHES[alias]['BACKEND'] not in _PROCESS_LOCAL_BACKENDS
+
+
+class LRUCache(Generic[V]):
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: 'OrderedDict[Hashable, V]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Optional[V] = None) -> Optional[V]:
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key: Hashable, value: V) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], V]) -> V:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def pop(self, key: Hashable, default: Optional[V] = None) -> Optional[V]:
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
@@ -14,6 +14,12 @@ class RuleNotFoundError(RuleEngineError):
     default_code = "rule_not_found"
 
 
+class RulesetVersionNotFoundError(RuleEngineError):
+    status_code = status.HTTP_404_NOT_FOUND
+    default_detail = "Ruleset version was not found."
+    default_code = "ruleset_version_not_found"
+
+
 class InvalidRuleConditionError(RuleEngineError):
     status_code = status.HTTP_400_BAD_REQUEST
     default_detail = "Rule condition is invalid."
@@ -0,0 +1,86 @@
+import json
+from typing import Any
+
+from django.conf import settings
+from rest_framework import renderers, serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+# orjson reads integers wider than 64 bits as floats, losing precision; any
+# document with a run of digits that long is left to the standard library.
+# Mapping every digit to 0 and searching for a run of zeros is several times
+# faster than a regular expression.
+_DIGITS_TO_ZERO = bytes.maketrans(b'123456789', b'000000000')
+_LONG_NUMBER = b'0' * 19
+
+
+def _reject_constant(value: str):
+    raise ValueError(f"Out of range float values are not JSON compliant: {value}")
+
+
+def is_available() -> bool:
+    return orjson is not None
+
+
+def loads(data: bytes) -> Any:
+    if orjson is not None and _LONG_NUMBER not in data.translate(_DIGITS_TO_ZERO):
+        return orjson.loads(data)
+    return json.loads(data, parse_constant=_reject_constant)
+
+
+def dumps(data: Any) -> bytes:
+    # Raises TypeError or ValueError for data that isn't JSON-serializable
+    if orjson is not None:
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            pass
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode()
+
+
+class FastJSONParser(JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            data = stream.read() if stream is not None else b''
+            if encoding.lower().replace('-', '') != 'utf8':
+                data = data.decode(encoding).encode()
+            return loads(data)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            # Indented output is only asked for by humans
+            return super().render(data, accepted_media_type, renderer_context)
+        if orjson is not None:
+            try:
+                return orjson.dumps(data)
+            except TypeError:
+                pass
+        # Lazy translations, decimals and the other types DRF's encoder knows
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class FastJSONField(serializers.JSONField):
+    # Checks that a payload is JSON-serializable with the fast encoder rather
+    # than a full json.dumps pass
+    def to_internal_value(self, data):
+        if self.binary or getattr(data, 'is_json_string', False):
+            return super().to_internal_value(data)
+        try:
+            dumps(data)
+        except (TypeError, ValueError):
+            self.fail('invalid')
+        return data
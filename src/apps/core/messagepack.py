@@ -0,0 +1,41 @@
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+MEDIA_TYPE = 'application/msgpack'
+
+
+def is_available() -> bool:
+    return msgpack is not None
+
+
+class MessagePackParser(BaseParser):
+    media_type = MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read() if stream is not None else b'', raw=False)
+        except (ValueError, TypeError, msgpack.UnpackException) as exc:
+            raise ParseError('MessagePack parse error - %s' % str(exc))
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = MEDIA_TYPE
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    # Dates, decimals, lazy translations and the like are converted the way
+    # the JSON renderer converts them
+    _encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, use_bin_type=True, default=self._encoder.default)
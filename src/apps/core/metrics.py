@@ -0,0 +1,271 @@
+import bisect
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+Labels = Tuple[str, ...]
+Snapshot = Dict[str, Dict[Labels, Any]]
+
+# Seconds, from 50us (a cached rule) up to the request timeouts
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + '}'
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> Dict[Labels, Any]:
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+        self.registry.start_publishing()
+
+    @staticmethod
+    def merge(total: Dict[Labels, Any], values: Dict[Labels, Any]) -> None:
+        for labels, value in values.items():
+            total[labels] = total.get(labels, 0) + value
+
+    def render(self, values: Dict[Labels, Any]) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        # Each series is a count per bucket (the last for values above every
+        # bound) followed by the sum; counts are made cumulative when rendered
+        if not self.registry.enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+        self.registry.start_publishing()
+
+    def snapshot(self) -> Dict[Labels, List[float]]:
+        with self._lock:
+            return {labels: list(series) for labels, series in self._values.items()}
+
+    @staticmethod
+    def merge(total: Dict[Labels, Any], values: Dict[Labels, Any]) -> None:
+        for labels, series in values.items():
+            if labels in total:
+                total[labels] = [a + b for a, b in zip(total[labels], series)]
+            else:
+                total[labels] = list(series)
+
+    def render(self, values: Dict[Labels, Any]) -> List[str]:
+        lines = []
+        bucket_labelnames = (*self.labelnames, 'le')
+        for labels, series in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float('inf')), series):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labelnames, (*labels, le))} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {_format_value(cumulative)}")
+        return lines
+
+
+class MetricsRegistry:
+    # Metrics recorded in this process. With a publish interval, a background
+    # thread writes the process's totals to the shared cache under a slot of
+    # its own, so a scrape of any process can add up every web and Celery
+    # worker process. A process's totals expire a few intervals after it stops.
+    SLOTS_KEY = 'metrics:slots'
+    PROCESS_KEY_PREFIX = 'metrics:process:'
+
+    def __init__(self, enabled: bool = True, publish_interval: float = 0.0, max_processes: int = 256):
+        self.enabled = enabled
+        self.publish_interval = publish_interval
+        self.max_processes = max_processes
+        self.publishing = False
+        self._metrics: Dict[str, _Metric] = {}
+        self._slot: Optional[int] = None
+        self._lock = threading.Lock()
+        # A forked worker starts from zero rather than counting its parent's
+        # samples again, and needs a slot and thread of its own
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def _register(self, metric: _Metric) -> Any:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self) -> Snapshot:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def start_publishing(self) -> None:
+        # Called on every sample, so the first one in a process starts the thread
+        if self.publishing:
+            return
+        with self._lock:
+            if self.publishing:
+                return
+            self.publishing = True
+            if self.publish_interval > 0:
+                threading.Thread(target=self._publish_loop, name='metrics-publisher', daemon=True).start()
+
+    def _publish_loop(self) -> None:
+        while self.publishing:
+            time.sleep(self.publish_interval)
+            try:
+                self.publish()
+            except Exception:
+                pass
+
+    def publish(self) -> None:
+        if self._slot is None:
+            cache.add(self.SLOTS_KEY, 0, timeout=None)
+            self._slot = cache.incr(self.SLOTS_KEY)
+        cache.set(self._process_key(self._slot), self.snapshot(), timeout=max(self.publish_interval * 6, 60))
+
+    def shared_snapshots(self) -> List[Snapshot]:
+        # The totals other processes have published, not including this one's
+        try:
+            last_slot = cache.get(self.SLOTS_KEY)
+            if not last_slot:
+                return []
+            keys = [self._process_key(slot) for slot in range(max(last_slot - self.max_processes + 1, 1), last_slot + 1) if slot != self._slot]
+            return list(cache.get_many(keys).values())
+        except Exception:
+            return []
+
+    def render(self, snapshots: Iterable[Snapshot] = ()) -> str:
+        # Prometheus text exposition format (version 0.0.4) of this process's
+        # metrics added to the given snapshots
+        totals: Snapshot = {name: {} for name in self._metrics}
+        for snapshot in (self.snapshot(), *snapshots):
+            for name, values in snapshot.items():
+                if name in self._metrics:
+                    self._metrics[name].merge(totals[name], values)
+
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render(totals[name]))
+        return '\n'.join(lines) + '\n'
+
+    def reset(self) -> None:
+        for metric in self._metrics.values():
+            metric.reset()
+
+    def _after_fork(self) -> None:
+        # Locks may have been held by a thread that doesn't exist in the child
+        self._lock = threading.Lock()
+        self._slot = None
+        self.publishing = False
+        for metric in self._metrics.values():
+            metric._lock = threading.Lock()
+            metric._values = {}
+
+    def _process_key(self, slot: int) -> str:
+        return f"{self.PROCESS_KEY_PREFIX}{slot}"
+
+
+class StageTimer:
+    # Times the stages of one request into a histogram labelled by the
+    # request's name and the stage, and keeps the request's own durations.
+    # A stage timed within another is left out of the outer one, so the
+    # stages never overlap.
+    __slots__ = ('histogram', 'name', 'started', 'durations', 'active')
+
+    def __init__(self, histogram: Histogram, name: str):
+        self.histogram = histogram
+        self.name = name
+        self.started = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.active: Optional['_Stage'] = None
+
+    def stage(self, stage: str) -> '_Stage':
+        return _Stage(self, stage)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+class _Stage:
+    __slots__ = ('timer', 'stage', 'started', 'parent', 'nested')
+
+    def __init__(self, timer: StageTimer, stage: str):
+        self.timer = timer
+        self.stage = stage
+
+    def __enter__(self) -> None:
+        self.parent = self.timer.active
+        self.timer.active = self
+        self.nested = 0.0
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        elapsed = time.perf_counter() - self.started
+        self.timer.active = self.parent
+        if self.parent is not None:
+            self.parent.nested += elapsed
+        duration = elapsed - self.nested
+        durations = self.timer.durations
+        durations[self.stage] = durations.get(self.stage, 0.0) + duration
+        self.timer.histogram.observe(duration, self.timer.name, self.stage)
+
+
+registry = MetricsRegistry(
+    enabled=getattr(settings, 'METRICS_ENABLED', True),
+    publish_interval=getattr(settings, 'METRICS_PUBLISH_INTERVAL', 0.0),
+)
@@ -0,0 +1,23 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+from .metrics import registry
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@require_GET
+def metrics(request):
+    # Scraped by Prometheus rather than API clients, so it takes a static
+    # bearer token (METRICS_AUTH_TOKEN) instead of a JWT. Without a token it is
+    # only open with DEBUG, so a deployment doesn't expose it by accident.
+    token = getattr(settings, 'METRICS_AUTH_TOKEN', '')
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponse('METRICS_AUTH_TOKEN is not set\n', status=403, content_type=CONTENT_TYPE)
+    elif not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse('Unauthorized\n', status=401, content_type=CONTENT_TYPE)
+    return HttpResponse(registry.render(registry.shared_snapshots()), content_type=CONTENT_TYPE)
@@ -0,0 +1,50 @@
+from typing import Any, Dict
+
+MISSING: Any = object()
+_UNRESOLVED: Any = object()
+
+
+class PayloadAccessor(dict):
+    # Maps dotted field paths to their values in one payload (MISSING if the
+    # path doesn't resolve). A path is resolved the first time it's looked up
+    # and memoized, so repeated lookups are plain dict hits. Each path is
+    # resolved from its parent path, so "applicant.employment.status" and
+    # "applicant.employment.years" walk "applicant.employment" only once.
+    __slots__ = ('payload',)
+
+    def __init__(self, payload: Dict[str, Any]):
+        super().__init__()
+        self.payload = payload
+
+    def __missing__(self, field: str) -> Any:
+        parent, separator, part = field.rpartition('.')
+        if separator:
+            value = self.get(parent, _UNRESOLVED)
+            if value is _UNRESOLVED:
+                value = self._resolve(parent)
+        else:
+            value = self.payload
+        value = value[part] if isinstance(value, dict) and part in value else MISSING
+        self[field] = value
+        return value
+
+    def _resolve(self, field: str) -> Any:
+        # Backs up to the longest prefix already resolved and walks down from
+        # it, without recursing once per path segment
+        unresolved = []
+        path = field
+        while True:
+            parent, separator, part = path.rpartition('.')
+            unresolved.append((path, part))
+            if not separator:
+                value = self.payload
+                break
+            value = self.get(parent, _UNRESOLVED)
+            if value is not _UNRESOLVED:
+                break
+            path = parent
+
+        for path, part in reversed(unresolved):
+            value = value[part] if isinstance(value, dict) and part in value else MISSING
+            self[path] = value
+        return value
@@ -0,0 +1,174 @@
+import threading
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from django.conf import settings
+
+from apps.core.cache import LRUCache
+from .compiler import Predicate, compile_condition, condition_cost
+from .evaluator import MAX_NESTING_DEPTH, condition_depth
+
+# Pass rate assumed for a child that has never been evaluated
+_PRIOR_PASS_RATE = 0.5
+_MIN_RATE = 1e-3
+
+
+class AdaptiveNode:
+    __slots__ = ('kind', 'condition', 'children', 'predicate', 'static_cost', 'evaluations', 'passes', 'cost')
+
+    def __init__(self, condition: Dict[str, Any], opaque: bool = False):
+        # An opaque node runs its whole condition as a single leaf
+        if ("AND" in condition or "OR" in condition) and not opaque:
+            self.kind = "AND" if "AND" in condition else "OR"
+            self.condition = None
+            self.children = tuple(AdaptiveNode(sub) for sub in condition[self.kind])
+            self.predicate = None
+        else:
+            self.kind = "LEAF"
+            self.condition = condition
+            self.children = ()
+            self.predicate = compile_condition(condition)
+        self.static_cost = condition_cost(condition)
+        self.evaluations = 0
+        self.passes = 0
+        # Work done under this node, in condition_cost units of the leaves actually evaluated
+        self.cost = 0
+
+    def evaluate(self, payload: Dict[str, Any]) -> Tuple[bool, int]:
+        if self.kind == "LEAF":
+            result = bool(self.predicate(payload))
+            cost = self.static_cost
+        else:
+            # all()/any() semantics: stop at the first child that decides the result
+            result = self.kind == "AND"
+            cost = 0
+            for child in self.children:
+                passed, child_cost = child.evaluate(payload)
+                cost += child_cost
+                if passed != result:
+                    result = passed
+                    break
+
+        self.evaluations += 1
+        self.passes += result
+        self.cost += cost
+        return result, cost
+
+    @property
+    def pass_rate(self) -> float:
+        return self.passes / self.evaluations if self.evaluations else _PRIOR_PASS_RATE
+
+    @property
+    def average_cost(self) -> float:
+        return self.cost / self.evaluations if self.evaluations else float(self.static_cost)
+
+    def reorder(self) -> None:
+        if self.kind == "LEAF":
+            return
+        for child in self.children:
+            child.reorder()
+
+        # Cheapest expected work per decisive outcome first: failures decide an
+        # AND, passes decide an OR. The sort is stable, so ties keep rule order.
+        if self.kind == "AND":
+            key = lambda child: child.average_cost / max(1.0 - child.pass_rate, _MIN_RATE)
+        else:
+            key = lambda child: child.average_cost / max(child.pass_rate, _MIN_RATE)
+        # Swapped in as a whole so concurrent evaluations see either order
+        self.children = tuple(sorted(self.children, key=key))
+
+    def ordered_condition(self) -> Dict[str, Any]:
+        # The condition with AND/OR children in their current order
+        if self.kind == "LEAF":
+            return self.condition
+        return {self.kind: [child.ordered_condition() for child in self.children]}
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {'operator': self.kind}
+        if self.kind == "LEAF":
+            stats = {
+                'field': self.condition.get("field"),
+                'operator': self.condition.get("operator"),
+                'value': self.condition.get("value"),
+            }
+        stats.update({
+            'evaluations': self.evaluations,
+            'pass_rate': round(self.pass_rate, 4) if self.evaluations else None,
+            'average_cost': round(self.average_cost, 4),
+        })
+        if self.kind != "LEAF":
+            stats['children'] = [child.stats() for child in self.children]
+        return stats
+
+
+# A compiled rule that reorders its AND/OR children so the ones most likely to
+# short-circuit cheaply are tried first. Most requests get a plain closure
+# compiled from the current order; one in every sample_interval gets the rule
+# itself, which evaluates through the node tree to record how often each node
+# passes and how much work it takes. Every reorder_interval sampled
+# evaluations the children are reordered from those statistics and the
+# closure is recompiled. AND/OR children have no side effects, so the order
+# never changes the result.
+class AdaptiveRule:
+    def __init__(self, condition: Dict[str, Any], reorder_interval: int = 100, sample_interval: int = 16):
+        self.root = AdaptiveNode(condition, opaque=condition_depth(condition) > MAX_NESTING_DEPTH)
+        self.predicate = compile_condition(condition)
+        self.reorder_interval = reorder_interval
+        self.sample_interval = max(sample_interval, 1)
+        self.requests = 0
+        self.evaluations = 0
+        self.reorders = 0
+        self._lock = threading.Lock()
+
+    def select_predicate(self) -> Predicate:
+        # Called once per request, so unsampled requests run the closure with
+        # no bookkeeping at all
+        requests = self.requests
+        self.requests = requests + 1
+        return self if requests % self.sample_interval == 0 else self.predicate
+
+    def __call__(self, payload: Dict[str, Any]) -> bool:
+        result, _ = self.root.evaluate(payload)
+        self.evaluations += 1
+        if self.evaluations % self.reorder_interval == 0:
+            self.reorder()
+        return result
+
+    def reorder(self) -> None:
+        with self._lock:
+            self.root.reorder()
+            self.predicate = compile_condition(self.root.ordered_condition())
+            self.reorders += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'requests': self.requests,
+            'evaluations': self.evaluations,
+            'reorders': self.reorders,
+            'condition': self.root.stats(),
+        }
+
+
+class AdaptiveRuleCache:
+    def __init__(self, maxsize: int = 1024, reorder_interval: int = 100, sample_interval: int = 16):
+        self.reorder_interval = reorder_interval
+        self.sample_interval = sample_interval
+        self._cache: LRUCache[AdaptiveRule] = LRUCache(maxsize)
+
+    def get_or_compile(self, key: Hashable, condition: Dict[str, Any]) -> AdaptiveRule:
+        return self._cache.get_or_set(key, lambda: AdaptiveRule(condition, self.reorder_interval, self.sample_interval))
+
+    def get(self, key: Hashable) -> Optional[AdaptiveRule]:
+        return self._cache.get(key)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+adaptive_rule_cache = AdaptiveRuleCache(
+    maxsize=getattr(settings, 'RULE_COMPILED_CACHE_SIZE', 1024),
+    reorder_interval=getattr(settings, 'RULE_ADAPTIVE_REORDER_INTERVAL', 100),
+    sample_interval=getattr(settings, 'RULE_ADAPTIVE_SAMPLE_INTERVAL', 16),
+)
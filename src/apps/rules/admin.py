@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Rule
+from .models import Rule, RulesetSnapshot
 
 
 @admin.register(Rule)
@@ -9,3 +9,19 @@ class RuleAdmin(admin.ModelAdmin):
     list_filter = ('is_active', 'created_at')
     search_fields = ('name',)
     readonly_fields = ('created_by', 'created_at', 'updated_at')
+
+
+@admin.register(RulesetSnapshot)
+class RulesetSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('version', 'created_at')
+    readonly_fields = ('version', 'rules', 'created_at')
+
+    # Snapshots are immutable; they are only created by rule writes
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,129 @@
+import ast
+import itertools
+from typing import Any, Dict
+
+from django.conf import settings
+
+from .compiler import CompiledRuleCache, Predicate, compile_condition
+from .evaluator import MAX_NESTING_DEPTH, condition_depth
+from .operators import OPERATORS, contains
+
+SCALAR_TYPES = (str, int, float, bool)
+
+COMPARE_NODES = {
+    "==": ast.Eq,
+    "!=": ast.NotEq,
+    ">": ast.Gt,
+    "<": ast.Lt,
+    ">=": ast.GtE,
+    "<=": ast.LtE,
+}
+
+# The generated expression is the fast path. With dicts along the field paths
+# it either produces the interpreter's result or raises (a non-dict on the
+# path, a comparison between mismatched types...), in which case the exact
+# closure-compiled predicate decides instead.
+_TEMPLATE = '''
+def rule(payload):
+    try:
+        return RESULT
+    except Exception:
+        return _exact(payload)
+'''
+
+
+def load(name: str) -> ast.Name:
+    return ast.Name(id=name, ctx=ast.Load())
+
+
+class ExpressionGenerator:
+    # Lowers AND/OR groups to native `and`/`or`; subclasses lower the leaves
+    def __init__(self):
+        self.namespace: Dict[str, Any] = {'_contains': contains}
+        self._constant_ids = itertools.count()
+
+    def constant(self, value: Any) -> ast.expr:
+        if isinstance(value, SCALAR_TYPES):
+            return ast.Constant(value=value)
+        # Lists and dicts are bound as globals rather than rebuilt on every call
+        name = f'_value_{next(self._constant_ids)}'
+        self.namespace[name] = value
+        return load(name)
+
+    def condition(self, condition: Dict[str, Any]) -> ast.expr:
+        if "AND" in condition or "OR" in condition:
+            is_and = "AND" in condition
+            children = [self.condition(sub) for sub in condition["AND" if is_and else "OR"]]
+            if not children:
+                return ast.Constant(value=is_and)
+            if len(children) == 1:
+                return children[0]
+            return ast.BoolOp(op=ast.And() if is_and else ast.Or(), values=children)
+
+        return self.leaf(condition)
+
+    def leaf(self, condition: Dict[str, Any]) -> ast.expr:
+        raise NotImplementedError
+
+
+class _RuleGenerator(ExpressionGenerator):
+    def leaf(self, condition: Dict[str, Any]) -> ast.expr:
+        field = condition.get("field")
+        op = condition.get("operator")
+        value = condition.get("value")
+
+        if not all([field, op, value is not None]) or op not in OPERATORS:
+            return ast.Constant(value=False)
+
+        # "user.profile.age" >= 18 becomes
+        #   'user' in payload and 'profile' in (_v := payload['user'])
+        #   and 'age' in (_v := _v['profile']) and _v['age'] >= 18
+        checks = []
+        container: ast.expr = load('payload')
+        field_parts = field.split('.')
+        for index, part in enumerate(field_parts):
+            if index:
+                lookup = ast.Subscript(value=container, slice=ast.Constant(value=field_parts[index - 1]), ctx=ast.Load())
+                checks.append(ast.Compare(left=ast.Constant(value=part), ops=[ast.In()], comparators=[
+                    ast.NamedExpr(target=ast.Name(id='_v', ctx=ast.Store()), value=lookup)
+                ]))
+                container = load('_v')
+            else:
+                checks.append(ast.Compare(left=ast.Constant(value=part), ops=[ast.In()], comparators=[container]))
+
+        field_value = ast.Subscript(value=container, slice=ast.Constant(value=field_parts[-1]), ctx=ast.Load())
+        if op == "contains":
+            # Kept as a call: a bare `in` would also accept tuples, sets and other containers
+            checks.append(ast.Call(func=load('_contains'), args=[field_value, self.constant(value)], keywords=[]))
+        else:
+            checks.append(ast.Compare(left=field_value, ops=[COMPARE_NODES[op]()], comparators=[self.constant(value)]))
+        return ast.BoolOp(op=ast.And(), values=checks)
+
+    def generate(self, condition: Dict[str, Any]) -> ast.Module:
+        module = ast.parse(_TEMPLATE)
+        module.body[0].body[0].body[0].value = self.condition(condition)
+        return ast.fix_missing_locations(module)
+
+
+def generate_source(condition: Dict[str, Any]) -> str:
+    return ast.unparse(_RuleGenerator().generate(condition))
+
+
+def compile_rule(condition: Dict[str, Any]) -> Predicate:
+    # Turns the condition into a single Python function: field lookups become
+    # inline dict accesses, operators native comparisons and AND/OR native
+    # `and`/`or`, so evaluating a rule makes no Python-level calls apart from
+    # `contains` leaves.
+    exact = compile_condition(condition)
+    if condition_depth(condition) > MAX_NESTING_DEPTH:
+        return exact
+
+    generator = _RuleGenerator()
+    module = generator.generate(condition)
+    namespace = generator.namespace
+    namespace['_exact'] = exact
+    exec(compile(module, '<rule>', 'exec'), namespace)
+    return namespace['rule']
+
+
+bytecode_rule_cache = CompiledRuleCache(getattr(settings, 'RULE_COMPILED_CACHE_SIZE', 1024), compile=compile_rule)
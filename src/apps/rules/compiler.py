@@ -0,0 +1,176 @@
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+from django.conf import settings
+
+from apps.core.cache import LRUCache
+from .accessor import MISSING, PayloadAccessor
+from .evaluator import MAX_NESTING_DEPTH, condition_depth, evaluate_condition
+from .operators import OPERATORS
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+
+def _always_false(payload: Dict[str, Any]) -> bool:
+    return False
+
+
+def _compile_leaf(condition: Dict[str, Any]) -> Predicate:
+    field = condition.get("field")
+    op = condition.get("operator")
+    value = condition.get("value")
+
+    if not all([field, op, value is not None]):
+        return _always_false
+
+    if op not in OPERATORS:
+        return _always_false
+
+    compare = OPERATORS[op]
+    field_parts = tuple(field.split('.'))
+
+    if len(field_parts) == 1:
+        key = field_parts[0]
+
+        def leaf(payload: Dict[str, Any]) -> bool:
+            if type(payload) is PayloadAccessor:
+                # A top-level key is a single lookup either way
+                payload = payload.payload
+            if isinstance(payload, dict) and key in payload:
+                try:
+                    return compare(payload[key], value)
+                except (TypeError, ValueError):
+                    return False
+            return False
+
+        return leaf
+
+    def nested_leaf(payload: Dict[str, Any]) -> bool:
+        if type(payload) is PayloadAccessor:
+            field_value_from_payload = payload[field]
+            if field_value_from_payload is MISSING:
+                return False
+        else:
+            field_value_from_payload = payload
+            for part in field_parts:
+                if isinstance(field_value_from_payload, dict) and part in field_value_from_payload:
+                    field_value_from_payload = field_value_from_payload[part]
+                else:
+                    return False
+        try:
+            return compare(field_value_from_payload, value)
+        except (TypeError, ValueError):
+            return False
+
+    return nested_leaf
+
+
+def _compile_and(children) -> Predicate:
+    def conjunction(payload: Dict[str, Any]) -> bool:
+        for child in children:
+            if not child(payload):
+                return False
+        return True
+
+    return conjunction
+
+
+def _compile_or(children) -> Predicate:
+    def disjunction(payload: Dict[str, Any]) -> bool:
+        for child in children:
+            if child(payload):
+                return True
+        return False
+
+    return disjunction
+
+
+def _compile(condition: Dict[str, Any]) -> Predicate:
+    if "AND" in condition:
+        return _compile_and(tuple(_compile(sub) for sub in condition["AND"]))
+
+    if "OR" in condition:
+        return _compile_or(tuple(_compile(sub) for sub in condition["OR"]))
+
+    return _compile_leaf(condition)
+
+
+def compile_condition(condition: Dict[str, Any]) -> Predicate:
+    # Mirrors RuleEvaluation.evaluate_condition, but resolves the node type,
+    # operator and field path once instead of on every evaluation.
+    if condition_depth(condition) > MAX_NESTING_DEPTH:
+        def deep_condition(payload: Dict[str, Any]) -> bool:
+            return evaluate_condition(condition, payload)
+
+        return deep_condition
+
+    return _compile(condition)
+
+
+def condition_cost(condition: Dict[str, Any]) -> int:
+    # Static estimate used to order rules: one unit per node plus one per
+    # field path segment a leaf has to walk.
+    cost = 0
+    stack = [condition]
+    while stack:
+        node = stack.pop()
+        cost += 1
+        if "AND" in node or "OR" in node:
+            stack.extend(node["AND"] if "AND" in node else node["OR"])
+        else:
+            field = node.get("field")
+            cost += len(field.split('.')) if isinstance(field, str) else 0
+    return cost
+
+
+class CompiledRules(list):
+    # (name, predicate) pairs of compiled rules. Evaluating them together runs
+    # every predicate against one PayloadAccessor, so a field path shared by
+    # several rules is resolved once per payload.
+    def evaluate(self, payload: Dict[str, Any], stop_at_failure: bool = False) -> Dict[str, List[str]]:
+        accessor = PayloadAccessor(payload)
+        passed_rules = []
+        failed_rules = []
+
+        for rule_name, predicate in self:
+            if predicate(accessor):
+                passed_rules.append(rule_name)
+            else:
+                failed_rules.append(rule_name)
+                if stop_at_failure:
+                    break
+
+        return {
+            "passed_rules": passed_rules,
+            "failed_rules": failed_rules
+        }
+
+
+class CompiledRuleCache:
+    def __init__(self, maxsize: int = 1024, compile: Callable[[Dict[str, Any]], Predicate] = compile_condition):
+        self._compile = compile
+        self._cache: LRUCache[Tuple[Predicate, int]] = LRUCache(maxsize)
+
+    def _get(self, key: Hashable, condition: Dict[str, Any]) -> Tuple[Predicate, int]:
+        return self._cache.get_or_set(key, lambda: (self._compile(condition), condition_cost(condition)))
+
+    def get_or_compile(self, key: Hashable, condition: Dict[str, Any]) -> Predicate:
+        return self._get(key, condition)[0]
+
+    def peek_or_compile(self, key: Hashable, condition: Dict[str, Any]) -> Predicate:
+        # For callers that keep every predicate they compile, such as an index
+        # over the whole ruleset: a cached predicate is reused, but a new one
+        # isn't cached, so a large ruleset doesn't evict the per-request rules
+        cached = self._cache.get(key)
+        return cached[0] if cached is not None else self._compile(condition)
+
+    def get_cost(self, key: Hashable, condition: Dict[str, Any]) -> int:
+        return self._get(key, condition)[1]
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+compiled_rule_cache = CompiledRuleCache(getattr(settings, 'RULE_COMPILED_CACHE_SIZE', 1024))
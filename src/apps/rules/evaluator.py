@@ -0,0 +1,88 @@
+from typing import Any, Dict, Union
+
+from .accessor import MISSING, PayloadAccessor
+from .operators import OPERATORS
+
+_DONE: Any = object()
+
+# The recursive engines (compiled closures, the optimizer, the rule network...)
+# spend at least one Python frame per nesting level. Conditions deeper than
+# this are left to the iterative evaluator instead.
+MAX_NESTING_DEPTH = 100
+
+
+def evaluate_leaf(condition: Dict[str, Any], payload: Union[Dict[str, Any], PayloadAccessor]) -> bool:
+    field = condition.get("field")
+    op = condition.get("operator")
+    value = condition.get("value")
+
+    if not all([field, op, value is not None]):
+        return False
+
+    if op not in OPERATORS:
+        return False
+
+    if type(payload) is PayloadAccessor:
+        field_value_from_payload = payload[field]
+        if field_value_from_payload is MISSING:
+            return False
+    else:
+        field_parts = field.split('.') # This is for nested field access with dot notation like "user.age"
+        field_value_from_payload = payload
+
+        for part in field_parts:
+            if isinstance(field_value_from_payload, dict) and part in field_value_from_payload:
+                field_value_from_payload = field_value_from_payload[part]
+            else:
+                return False
+
+    try:
+        return bool(OPERATORS[op](field_value_from_payload, value))
+    except (TypeError, ValueError):
+        return False
+
+
+def evaluate_condition(condition: Dict[str, Any], payload: Union[Dict[str, Any], PayloadAccessor]) -> bool:
+    # Walks the tree with an explicit stack of (is_and, children iterator)
+    # frames, so depth costs neither Python frames nor generator objects and
+    # there is no recursion limit. Short-circuits exactly like all()/any().
+    # Pass a PayloadAccessor to share field lookups across several conditions.
+    if type(payload) is not PayloadAccessor:
+        payload = PayloadAccessor(payload)
+    stack = []
+    node = condition
+
+    while True:
+        if "AND" in node or "OR" in node:
+            is_and = "AND" in node
+            stack.append((is_and, iter(node["AND"] if is_and else node["OR"])))
+            # An empty group resolves to all([]) / any([]) below
+            result = is_and
+        else:
+            result = evaluate_leaf(node, payload)
+
+        while stack:
+            is_and, children = stack[-1]
+            if result != is_and:
+                # A failing AND child or a passing OR child decides the group
+                stack.pop()
+                continue
+            node = next(children, _DONE)
+            if node is not _DONE:
+                break
+            stack.pop()
+        else:
+            return result
+
+
+def condition_depth(condition: Dict[str, Any]) -> int:
+    depth = 0
+    stack = [(condition, 1)]
+    while stack:
+        node, level = stack.pop()
+        depth = max(depth, level)
+        if isinstance(node, dict) and ("AND" in node or "OR" in node):
+            children = node["AND"] if "AND" in node else node["OR"]
+            if isinstance(children, list):
+                stack.extend((child, level + 1) for child in children)
+    return depth
@@ -0,0 +1,83 @@
+import sys
+import types
+from typing import Any, Dict
+
+from .index import PredicateIndex
+from .network import RuleNetwork
+from .snapshot_file import SnapshotReader, encode_snapshot
+from .store import MappedRuleset, Ruleset
+
+# Shared by the whole process rather than held by one structure
+_NOT_OWNED = (type, types.ModuleType, types.BuiltinFunctionType, types.BuiltinMethodType)
+
+
+def deep_sizeof(obj: Any) -> int:
+    # Bytes held by obj and everything it contains or closes over, counting
+    # objects shared between several places (e.g. interned strings) once.
+    # Classes, modules, builtins and function globals aren't counted.
+    seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, _NOT_OWNED):
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif isinstance(item, types.FunctionType):
+            stack.extend(item.__closure__ or ())
+            stack.extend((item.__code__, item.__defaults__, item.__kwdefaults__))
+        elif isinstance(item, types.CellType):
+            try:
+                stack.append(item.cell_contents)
+            except ValueError:
+                # A free variable that was never bound
+                pass
+        elif isinstance(item, types.CodeType):
+            stack.extend(item.co_consts)
+        elif isinstance(item, types.MethodType):
+            stack.extend((item.__self__, item.__func__))
+        else:
+            if hasattr(item, '__dict__'):
+                stack.append(vars(item))
+            for cls in type(item).__mro__:
+                for slot in getattr(cls, '__slots__', ()):
+                    if hasattr(item, slot):
+                        stack.append(getattr(item, slot))
+    return size
+
+
+def ruleset_footprint(ruleset: Ruleset) -> Dict[str, Any]:
+    # Only the rule definitions have a compact form. The structures built
+    # over the whole ruleset (the predicate index used by match and the rule
+    # network) hold compiled closures either way, and are reported so worker
+    # memory can be sized from the total.
+    if isinstance(ruleset, MappedRuleset):
+        snapshot = ruleset.snapshot
+    else:
+        snapshot = SnapshotReader(encode_snapshot(ruleset.version, ruleset.entries))
+    stats = snapshot.stats()
+    entries = ruleset.entries
+    decoded_bytes = deep_sizeof(entries)
+    index_bytes = deep_sizeof(PredicateIndex(entries))
+    network_bytes = deep_sizeof(RuleNetwork(entries))
+    definitions_bytes = stats['bytes'] if isinstance(ruleset, MappedRuleset) else decoded_bytes
+    rules = max(stats['rules'], 1)
+    return {
+        'version': ruleset.version,
+        'compact': isinstance(ruleset, MappedRuleset),
+        **stats,
+        'decoded_bytes': decoded_bytes,
+        'decoded_bytes_per_rule': decoded_bytes // rules,
+        'compact_bytes_per_rule': stats['bytes'] // rules,
+        'index_bytes': index_bytes,
+        'index_bytes_per_rule': index_bytes // rules,
+        'network_bytes': network_bytes,
+        'network_bytes_per_rule': network_bytes // rules,
+        'total_bytes_per_rule': (definitions_bytes + index_bytes + network_bytes) // rules
+    }
@@ -0,0 +1,228 @@
+import math
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from .compiler import compiled_rule_cache
+from .evaluator import MAX_NESTING_DEPTH, condition_depth
+from .operators import OPERATORS
+from .store import RuleEntry, RulesetCache
+
+_MISSING: Any = object()
+
+_SCALAR_TYPES = frozenset({str, int, float, bool})
+_NUMBER_TYPES = frozenset({int, float, bool})
+# Payload value types whose comparisons against scalar constants are known;
+# anything else makes every rule on that field a candidate.
+_JSON_TYPES = frozenset({str, int, float, bool, type(None), list, dict})
+_ORDERING_OPERATORS = frozenset({">", "<", ">=", "<="})
+
+
+def _kind(value) -> Optional[str]:
+    value_type = type(value)
+    if value_type in _NUMBER_TYPES:
+        return "number"
+    if value_type is str:
+        return "string"
+    return None
+
+
+def _is_indexable(condition: Dict[str, Any]) -> bool:
+    field = condition.get("field")
+    op = condition.get("operator")
+    value = condition.get("value")
+
+    if not isinstance(field, str):
+        return False
+    if op == "==" or op == "contains":
+        return type(value) in _SCALAR_TYPES
+    if op in _ORDERING_OPERATORS:
+        return type(value) is str or (type(value) in _NUMBER_TYPES and math.isfinite(value))
+    return False
+
+
+def _access_leaves(condition: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    # Returns leaves of which at least one must hold for the condition to pass,
+    # or None when no such set can be indexed and the rule is always a candidate.
+    if "AND" in condition or "OR" in condition:
+        is_and = "AND" in condition
+        children = [_access_leaves(sub) for sub in condition["AND" if is_and else "OR"]]
+
+        if is_and:
+            indexed = [leaves for leaves in children if leaves is not None]
+            if not indexed:
+                return None
+            # Any one conjunct is a necessary condition; prefer the narrowest,
+            # and among those the one with the most equality probes.
+            return min(indexed, key=lambda leaves: (
+                len(leaves), sum(1 for leaf in leaves if leaf["operator"] != "==")
+            ))
+
+        if any(leaves is None for leaves in children):
+            return None
+        return [leaf for leaves in children for leaf in leaves]
+
+    field = condition.get("field")
+    op = condition.get("operator")
+    value = condition.get("value")
+    if not all([field, op, value is not None]) or op not in OPERATORS:
+        return []
+
+    return [condition] if _is_indexable(condition) else None
+
+
+class _FieldIndex:
+    __slots__ = ('parts', 'equals', 'equals_all', 'thresholds', 'ordered_all', 'contains', 'contains_all', 'contains_lengths', 'contains_strings')
+
+    def __init__(self, parts: Tuple[str, ...]):
+        self.parts = parts
+        self.equals: Dict[Any, List[int]] = {}
+        self.equals_all: List[int] = []
+        self.thresholds: Dict[Tuple[str, str], Tuple[List[Any], List[int]]] = {}
+        self.ordered_all: List[int] = []
+        self.contains: Dict[Any, List[int]] = {}
+        self.contains_all: List[int] = []
+        self.contains_lengths: List[int] = []
+        self.contains_strings = 0
+
+    def add(self, op: str, value: Any, position: int) -> None:
+        if op == "==":
+            self.equals.setdefault(value, []).append(position)
+            self.equals_all.append(position)
+        elif op == "contains":
+            self.contains.setdefault(value, []).append(position)
+            self.contains_all.append(position)
+            if type(value) is str:
+                self.contains_strings += 1
+                if len(value) not in self.contains_lengths:
+                    self.contains_lengths.append(len(value))
+        else:
+            self.thresholds.setdefault((op, _kind(value)), ([], []))[0].append((value, position))
+            self.ordered_all.append(position)
+
+    def finalize(self) -> None:
+        for key, (pairs, _) in list(self.thresholds.items()):
+            pairs.sort(key=lambda pair: pair[0])
+            self.thresholds[key] = ([value for value, _ in pairs], [position for _, position in pairs])
+
+    def collect(self, value: Any, candidates: Set[int]) -> None:
+        value_type = type(value)
+        is_exotic = value_type not in _JSON_TYPES
+
+        if self.equals_all:
+            if is_exotic:
+                candidates.update(self.equals_all)
+            elif value_type in _SCALAR_TYPES:
+                candidates.update(self.equals.get(value, ()))
+
+        if self.ordered_all:
+            if is_exotic:
+                candidates.update(self.ordered_all)
+            else:
+                kind = _kind(value)
+                for (op, constant_kind), (constants, positions) in self.thresholds.items():
+                    if constant_kind != kind:
+                        continue
+                    # value OP constant holds for a contiguous run of the sorted constants
+                    if op == ">":
+                        candidates.update(positions[:bisect_left(constants, value)])
+                    elif op == ">=":
+                        candidates.update(positions[:bisect_right(constants, value)])
+                    elif op == "<":
+                        candidates.update(positions[bisect_right(constants, value):])
+                    else:
+                        candidates.update(positions[bisect_left(constants, value):])
+
+        if self.contains_all:
+            if value_type is list or value_type is dict:
+                for element in value:
+                    element_type = type(element)
+                    if element_type in _SCALAR_TYPES:
+                        candidates.update(self.contains.get(element, ()))
+                    elif element_type not in _JSON_TYPES:
+                        candidates.update(self.contains_all)
+                        return
+            elif value_type is str:
+                self._collect_substrings(value, candidates)
+            elif isinstance(value, (list, str, dict)):
+                candidates.update(self.contains_all)
+
+    def _collect_substrings(self, value: str, candidates: Set[int]) -> None:
+        # Either probe every substring of a length some constant has, or test
+        # every string constant, whichever is fewer lookups.
+        if len(value) * len(self.contains_lengths) < self.contains_strings:
+            for length in self.contains_lengths:
+                for start in range(len(value) - length + 1):
+                    candidates.update(self.contains.get(value[start:start + length], ()))
+        else:
+            for constant, positions in self.contains.items():
+                if type(constant) is str and constant in value:
+                    candidates.update(positions)
+
+
+# Finds every active rule a payload satisfies without testing each rule. Each
+# rule is indexed on a set of leaves one of which must hold for it to pass;
+# only rules with a matching leaf (plus the few that can't be indexed) are
+# then checked in full.
+class PredicateIndex:
+    def __init__(self, rule_entries: Sequence[RuleEntry]):
+        rule_entries = list(rule_entries)
+        # Only names are kept, so a compact ruleset's decoded conditions can
+        # be freed once the index is built
+        self._names = [entry.name for entry in rule_entries]
+        # Held by the index rather than the size-capped compiled rule cache,
+        # which a ruleset larger than it would only churn
+        self._predicates = [
+            compiled_rule_cache.peek_or_compile(entry.version, entry.condition)
+            for entry in rule_entries
+        ]
+        self._always: List[int] = []
+        self._fields: Dict[Tuple[str, ...], _FieldIndex] = {}
+
+        for position, entry in enumerate(rule_entries):
+            leaves = None
+            if condition_depth(entry.condition) <= MAX_NESTING_DEPTH:
+                leaves = _access_leaves(entry.condition)
+            if leaves is None:
+                self._always.append(position)
+                continue
+            for leaf in leaves:
+                parts = tuple(leaf["field"].split('.'))
+                field_index = self._fields.get(parts)
+                if field_index is None:
+                    field_index = self._fields[parts] = _FieldIndex(parts)
+                field_index.add(leaf["operator"], leaf["value"], position)
+
+        for field_index in self._fields.values():
+            field_index.finalize()
+
+    def candidates(self, payload: Dict[str, Any]) -> Set[int]:
+        candidates = set(self._always)
+        for parts, field_index in self._fields.items():
+            value = payload
+            for part in parts:
+                if isinstance(value, dict) and part in value:
+                    value = value[part]
+                else:
+                    value = _MISSING
+                    break
+            if value is not _MISSING:
+                field_index.collect(value, candidates)
+        return candidates
+
+    def match(self, payload: Dict[str, Any]) -> List[str]:
+        return [
+            self._names[position]
+            for position in sorted(self.candidates(payload))
+            if self._predicates[position](payload)
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'rules': len(self._names),
+            'indexed_rules': len(self._names) - len(self._always),
+            'unindexed_rules': len(self._always),
+            'fields': len(self._fields),
+        }
+
+
+rule_index_cache: RulesetCache[PredicateIndex] = RulesetCache(PredicateIndex)
@@ -0,0 +1,57 @@
+import threading
+import time
+from typing import Any, Callable, Optional
+
+import redis
+
+
+class InvalidationListener:
+    # Subscribes to a Redis pub/sub channel on a background thread and calls
+    # on_message for every message published there. on_message is also called
+    # with None after each (re)subscription, since anything published while
+    # disconnected was missed.
+    def __init__(self, url: str, channel: str, on_message: Callable[[Optional[bytes]], None], reconnect_delay: float = 1.0):
+        self.url = url
+        self.channel = channel
+        self.on_message = on_message
+        self.reconnect_delay = reconnect_delay
+        self.connected = False
+        self._client: Any = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='rule-invalidation-listener', daemon=True)
+                self._thread.start()
+
+    def publish(self, message: Any) -> None:
+        try:
+            self._get_client().publish(self.channel, str(message))
+        except Exception:
+            # Other nodes still notice the change through the shared version counter
+            pass
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.url)
+        return self._client
+
+    def _run(self) -> None:
+        while True:
+            try:
+                pubsub = self._get_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                self.connected = True
+                self.on_message(None)
+                for message in pubsub.listen():
+                    if message.get('type') == 'message':
+                        self.on_message(message.get('data'))
+            except Exception:
+                pass
+            # While disconnected the store falls back to polling the shared version
+            self.connected = False
+            time.sleep(self.reconnect_delay)
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.exceptions import RulesetVersionNotFoundError
+from apps.rules.footprint import ruleset_footprint
+from apps.rules.store import rule_store
+
+
+class Command(BaseCommand):
+    help = 'Report the memory footprint of a ruleset, decoded and in the compact format'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ruleset-version', type=int, help='Ruleset version (defaults to the current one)')
+
+    def handle(self, *args, **kwargs):
+        try:
+            ruleset = rule_store.get_ruleset(kwargs['ruleset_version'])
+        except RulesetVersionNotFoundError as e:
+            raise CommandError(str(e))
+
+        footprint = ruleset_footprint(ruleset)
+        width = max(len(key) for key in footprint)
+        for key, value in footprint.items():
+            self.stdout.write(f"{key.ljust(width)}  {value}")
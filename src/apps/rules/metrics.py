@@ -0,0 +1,113 @@
+import itertools
+from typing import Dict
+
+from django.conf import settings
+from rest_framework.response import Response
+
+from apps.core.metrics import StageTimer, registry
+from apps.core.permissions import IsAdminUser
+from .profiling import RequestProfiler, profile_limiter
+
+STAGE_SECONDS = registry.histogram(
+    'rule_engine_stage_seconds',
+    'Time spent in each stage of an evaluation request or task: auth, parse, db, compile, eval, serialize',
+    ['endpoint', 'stage']
+)
+REQUEST_SECONDS = registry.histogram(
+    'rule_engine_request_seconds',
+    'Time to handle an evaluation request or task, from authentication to the rendered response',
+    ['endpoint']
+)
+RULE_SECONDS = registry.histogram(
+    'rule_engine_rule_seconds',
+    'Time to evaluate one rule against a payload, for a sample of evaluations (METRICS_RULE_LABELS)',
+    ['rule']
+)
+RESULT_CACHE_TOTAL = registry.counter(
+    'rule_engine_result_cache_total',
+    'Evaluation result cache lookups by outcome',
+    ['result']
+)
+RULE_NOT_FOUND_TOTAL = registry.counter(
+    'rule_engine_rule_not_found_total',
+    'Evaluation requests and tasks naming a rule that does not exist',
+    ['endpoint']
+)
+ERRORS_TOTAL = registry.counter(
+    'rule_engine_errors_total',
+    'Evaluation requests and tasks that failed with an unexpected error',
+    ['endpoint']
+)
+
+# Timing every rule would cost more than evaluating the cheap ones, so only
+# one evaluation in every _RULE_SAMPLE_EVERY is timed rule by rule. Rule names
+# end up in the scraped labels, so this is off unless METRICS_RULE_LABELS is set.
+_rule_sample_rate = getattr(settings, 'METRICS_RULE_SAMPLE_RATE', 0.01)
+_RULE_SAMPLE_EVERY = round(1 / _rule_sample_rate) if _rule_sample_rate > 0 else 0
+_evaluations = itertools.count()
+
+
+def sample_rule_latency() -> bool:
+    return registry.enabled and _RULE_SAMPLE_EVERY > 0 and settings.METRICS_RULE_LABELS and next(_evaluations) % _RULE_SAMPLE_EVERY == 0
+
+
+class InstrumentedViewMixin:
+    # Times authentication and rendering of every action, and the whole
+    # request; actions time their own parse, db, compile and eval stages
+    # through self.timer. With RULE_SERVER_TIMING the request's stage
+    # durations are sent back in a Server-Timing header, and admins can add
+    # ?profile=1 to get the request's top functions under cProfile in the
+    # response's "profile" (null when over the profiling limit).
+    def initialize_request(self, request, *args, **kwargs):
+        request = super().initialize_request(request, *args, **kwargs)
+        self.timer = StageTimer(STAGE_SECONDS, self.action or 'unknown')
+        self.profile_requested = False
+        self.profiler = None
+        return request
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            # An exception DRF doesn't handle skips finalize_response, and a
+            # profiler left running would hold the limiter
+            if getattr(self, 'profiler', None) is not None:
+                self.profiler.stop()
+                self.profiler = None
+
+    def perform_authentication(self, request):
+        with self.timer.stage('auth'):
+            super().perform_authentication(request)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.query_params.get('profile') == '1' and IsAdminUser().has_permission(request, self):
+            self.profile_requested = True
+            self.profiler = RequestProfiler.start(profile_limiter)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        timer = getattr(self, 'timer', None)
+        if timer is None:
+            return response
+        if self.profile_requested:
+            functions = self.profiler.stop(settings.RULE_PROFILE_TOP) if self.profiler is not None else None
+            self.profiler = None
+            if isinstance(response, Response) and isinstance(response.data, dict):
+                response.data['profile'] = functions
+        # Rendered here rather than by the handler so rendering is timed;
+        # Django doesn't render a response twice
+        if isinstance(response, Response):
+            with timer.stage('serialize'):
+                response.render()
+        if response.status_code >= 500:
+            ERRORS_TOTAL.inc(timer.name)
+        elapsed = timer.elapsed()
+        REQUEST_SECONDS.observe(elapsed, timer.name)
+        if settings.RULE_SERVER_TIMING:
+            response['Server-Timing'] = server_timing(timer.durations, elapsed)
+        return response
+
+
+def server_timing(durations: Dict[str, float], total: float) -> str:
+    return ', '.join(f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in (*durations.items(), ('total', total)))
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+def optimize_existing_rules(apps, schema_editor):
+    from apps.rules.optimizer import optimize_condition
+
+    Rule = apps.get_model('rules', 'Rule')
+    for rule in Rule.objects.all().iterator():
+        rule.optimized_condition = optimize_condition(rule.condition)
+        rule.save(update_fields=['optimized_condition'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rules', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rule',
+            name='optimized_condition',
+            field=models.JSONField(editable=False, null=True),
+        ),
+        migrations.RunPython(optimize_existing_rules, migrations.RunPython.noop),
+    ]
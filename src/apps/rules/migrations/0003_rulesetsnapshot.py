@@ -0,0 +1,33 @@
+# Generated by Django 5.1.8 on 2026-10-17 20:43
+
+from django.db import migrations, models
+
+
+def capture_initial_snapshot(apps, schema_editor):
+    from apps.rules.models import snapshot_rule
+
+    Rule = apps.get_model('rules', 'Rule')
+    RulesetSnapshot = apps.get_model('rules', 'RulesetSnapshot')
+    active_rules = Rule.objects.filter(is_active=True).order_by('id').values(
+        'id', 'name', 'condition', 'optimized_condition', 'updated_at'
+    )
+    RulesetSnapshot.objects.create(rules=[snapshot_rule(rule) for rule in active_rules])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rules', '0002_rule_optimized_condition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RulesetSnapshot',
+            fields=[
+                ('version', models.BigAutoField(primary_key=True, serialize=False)),
+                ('rules', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(capture_initial_snapshot, migrations.RunPython.noop),
+    ]
@@ -1,49 +1,83 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 
 from django.db.models import QuerySet
 
 from apps.core.models import BaseModel
+from .optimizer import optimize_condition
 
 User = get_user_model()
 
+REQUIRED_CONDITION_KEYS = {"field", "operator", "value"}
+VALID_OPERATORS = {"==", "!=", ">", "<", ">=", "<=", "contains"}
+
 
 def validate_condition_json(condition):
-    if not isinstance(condition, dict):
-        raise ValidationError("Condition must be a JSON object")
-    
-    if "AND" in condition or "OR" in condition:
-        if "AND" in condition and isinstance(condition["AND"], list):
-            for subcondition in condition["AND"]:
-                validate_condition_json(subcondition)
-        elif "OR" in condition and isinstance(condition["OR"], list):
-            for subcondition in condition["OR"]:
-                validate_condition_json(subcondition)
+    # Explicit stack instead of recursion so arbitrarily deep conditions validate
+    stack = [condition]
+    while stack:
+        condition = stack.pop()
+        if not isinstance(condition, dict):
+            raise ValidationError("Condition must be a JSON object")
+        
+        if "AND" in condition or "OR" in condition:
+            subconditions = condition.get("AND")
+            if not isinstance(subconditions, list):
+                subconditions = condition.get("OR")
+                if not isinstance(subconditions, list):
+                    raise ValidationError("AND/OR conditions must contain a list of subconditions")
+            # Reversed so subconditions are still checked in document order
+            stack.extend(subconditions[::-1])
         else:
-            raise ValidationError("AND/OR conditions must contain a list of subconditions")
-    else:
-        validate_subcondition(condition)
+            validate_subcondition(condition)
 
 
 def validate_subcondition(condition):
-    required_keys = {"field", "operator", "value"}
-    if not all(key in condition for key in required_keys):
-        raise ValidationError(f"Simple condition must contain: {', '.join(required_keys)}")
+    if not all(map(condition.__contains__, REQUIRED_CONDITION_KEYS)):
+        raise ValidationError(f"Simple condition must contain: {', '.join(REQUIRED_CONDITION_KEYS)}")
     
-    valid_operators = {"==", "!=", ">", "<", ">=", "<=", "contains"}
-    if condition["operator"] not in valid_operators:
-        raise ValidationError(f"Operator must be one of: {', '.join(valid_operators)}")
+    if condition["operator"] not in VALID_OPERATORS:
+        raise ValidationError(f"Operator must be one of: {', '.join(VALID_OPERATORS)}")
 
 
 class RuleQuerySet(QuerySet):   
     def by_names(self, names):
         return self.filter(name__in=names, is_active=True)
+    
+    def update(self, **kwargs):
+        # Keep the optimized form in step with bulk updates, which skip save()
+        if 'condition' in kwargs and 'optimized_condition' not in kwargs:
+            condition = kwargs['condition']
+            kwargs['optimized_condition'] = optimize_condition(condition) if isinstance(condition, dict) else None
+        # auto_now isn't applied by update(), and compiled rules and cached
+        # results are keyed on (id, updated_at)
+        kwargs.setdefault('updated_at', timezone.now())
+        with transaction.atomic():
+            updated = super().update(**kwargs)
+            if updated:
+                RulesetSnapshot.capture()
+                # Bulk updates send no post_save, so invalidate as the signal does
+                from .signals import invalidate_rules
+                invalidate_rules()
+        return updated
+    
+    def delete(self):
+        with transaction.atomic():
+            deleted = super().delete()
+            if deleted[0]:
+                RulesetSnapshot.capture()
+        return deleted
 
 
 class Rule(BaseModel):
     name = models.CharField(max_length=255, unique=True)
     condition = models.JSONField(validators=[validate_condition_json])
+    # Equivalent, simplified form of condition that the evaluation engines run
+    optimized_condition = models.JSONField(null=True, editable=False)
     is_active = models.BooleanField(default=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='created_rules')
     
@@ -51,3 +85,77 @@ class Rule(BaseModel):
     
     def __str__(self):
         return self.name
+    
+    def save(self, *args, **kwargs):
+        self.optimized_condition = optimize_condition(self.condition)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'condition' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'optimized_condition'}
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            RulesetSnapshot.capture()
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            deleted = super().delete(*args, **kwargs)
+            RulesetSnapshot.capture()
+        return deleted
+
+
+def snapshot_rule(rule):
+    # Rules saved before the optimizer existed have no optimized form yet
+    condition = rule['optimized_condition'] if rule['optimized_condition'] is not None else rule['condition']
+    return {
+        'id': rule['id'],
+        'name': rule['name'],
+        'condition': condition,
+        'updated_at': rule['updated_at'].isoformat()
+    }
+
+
+class RulesetSnapshot(models.Model):
+    # Immutable copy of the active rules, taken in the same transaction as
+    # every rule write. The version only ever increases.
+    PIN_KEY_PREFIX = 'rules:snapshot:pin:'
+    
+    version = models.BigAutoField(primary_key=True)
+    rules = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Ruleset v{self.version}"
+    
+    @classmethod
+    def capture(cls) -> 'RulesetSnapshot':
+        # Locking the latest snapshot serializes concurrent rule writers, so
+        # each snapshot includes every write committed before it
+        list(cls.objects.select_for_update().order_by('-version')[:1])
+        active_rules = Rule.objects.filter(is_active=True).order_by('id').values(
+            'id', 'name', 'condition', 'optimized_condition', 'updated_at'
+        )
+        snapshot = cls.objects.create(rules=[snapshot_rule(rule) for rule in active_rules])
+        cls.prune(snapshot.version)
+        return snapshot
+    
+    @classmethod
+    def pin(cls, version: int) -> None:
+        # Keeps a version past the retention window while queued tasks need it
+        cache.set(f"{cls.PIN_KEY_PREFIX}{version}", True, timeout=getattr(settings, 'RULE_SNAPSHOT_PIN_TIMEOUT', 86400))
+    
+    @classmethod
+    def prune(cls, latest_version: int) -> int:
+        # Each snapshot holds every active rule, so only the last
+        # RULE_SNAPSHOT_RETENTION versions and pinned ones are kept
+        retention = getattr(settings, 'RULE_SNAPSHOT_RETENTION', 100)
+        if retention <= 0:
+            return 0
+        expired = list(cls.objects.filter(version__lte=latest_version - retention).values_list('version', flat=True))
+        if not expired:
+            return 0
+        try:
+            pinned = cache.get_many([f"{cls.PIN_KEY_PREFIX}{version}" for version in expired])
+        except Exception:
+            # Without the pins nothing is known to be safe to delete
+            return 0
+        expired = [version for version in expired if f"{cls.PIN_KEY_PREFIX}{version}" not in pinned]
+        return cls.objects.filter(version__in=expired).delete()[0]
@@ -0,0 +1,154 @@
+import json
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from apps.core.exceptions import RuleNotFoundError
+from .compiler import Predicate, compile_condition
+from .evaluator import MAX_NESTING_DEPTH, condition_depth
+from .store import RuleEntry, RulesetCache
+
+NodeFunction = Callable[[Dict[str, Any], Dict[int, Any]], Any]
+
+
+class _Node:
+    __slots__ = ('kind', 'condition', 'children', 'references')
+
+    def __init__(self, kind: str, condition: Optional[Dict[str, Any]] = None, children: Tuple[int, ...] = ()):
+        self.kind = kind
+        self.condition = condition
+        self.children = children
+        self.references = 0
+
+
+class _Session:
+    __slots__ = ('payload', 'memo')
+
+    def __init__(self):
+        self.payload = None
+        self.memo: Dict[int, Any] = {}
+
+    def bind(self, root: NodeFunction) -> Predicate:
+        def predicate(payload: Dict[str, Any]) -> bool:
+            # Node results are shared by every rule bound to this session,
+            # until a different payload comes through.
+            if payload is not self.payload:
+                self.payload = payload
+                self.memo = {}
+            return root(payload, self.memo)
+
+        return predicate
+
+
+# Identical leaves and AND/OR subtrees across the whole ruleset become a
+# single node; nodes referenced from more than one place are computed at most
+# once per payload.
+class RuleNetwork:
+    def __init__(self, rule_entries: Sequence[RuleEntry]):
+        self._nodes: List[_Node] = []
+        self._node_ids: Dict[Hashable, int] = {}
+        self._entries: Dict[str, RuleEntry] = {}
+        self._roots: Dict[str, int] = {}
+
+        for entry in rule_entries:
+            self._entries[entry.name] = entry
+            if condition_depth(entry.condition) > MAX_NESTING_DEPTH:
+                # Too deep to share nodes recursively; runs as one opaque leaf
+                root = len(self._nodes)
+                self._nodes.append(_Node("LEAF", condition=entry.condition))
+            else:
+                root = self._add(entry.condition)
+            self._nodes[root].references += 1
+            self._roots[entry.name] = root
+
+        self._functions: List[Optional[NodeFunction]] = [None] * len(self._nodes)
+        for node_id in range(len(self._nodes)):
+            self._link(node_id)
+
+    def _add(self, condition: Dict[str, Any]) -> int:
+        if "AND" in condition or "OR" in condition:
+            kind = "AND" if "AND" in condition else "OR"
+            # Repeated children don't change all()/any(), so they collapse into one
+            children = tuple(dict.fromkeys(self._add(sub) for sub in condition[kind]))
+            key = (kind, frozenset(children))
+            node = _Node(kind, children=children)
+        else:
+            key = ("LEAF", json.dumps(
+                [condition.get("field"), condition.get("operator"), condition.get("value")],
+                sort_keys=True
+            ))
+            node = _Node("LEAF", condition=condition)
+
+        node_id = self._node_ids.get(key)
+        if node_id is None:
+            node_id = self._node_ids[key] = len(self._nodes)
+            self._nodes.append(node)
+            for child in node.children:
+                self._nodes[child].references += 1
+        return node_id
+
+    def _link(self, node_id: int) -> NodeFunction:
+        function = self._functions[node_id]
+        if function is not None:
+            return function
+
+        node = self._nodes[node_id]
+        if node.kind == "LEAF":
+            leaf = compile_condition(node.condition)
+
+            def function(payload, memo):
+                return leaf(payload)
+        elif node.kind == "AND":
+            children = tuple(self._link(child) for child in node.children)
+
+            def function(payload, memo):
+                for child in children:
+                    if not child(payload, memo):
+                        return False
+                return True
+        else:
+            children = tuple(self._link(child) for child in node.children)
+
+            def function(payload, memo):
+                for child in children:
+                    if child(payload, memo):
+                        return True
+                return False
+
+        if node.references > 1:
+            function = self._memoize(node_id, function)
+
+        self._functions[node_id] = function
+        return function
+
+    @staticmethod
+    def _memoize(node_id: int, function: NodeFunction) -> NodeFunction:
+        def memoized(payload, memo):
+            try:
+                return memo[node_id]
+            except KeyError:
+                result = memo[node_id] = function(payload, memo)
+                return result
+
+        return memoized
+
+    def get_entries(self, names: Sequence[str]) -> List[RuleEntry]:
+        names = list(dict.fromkeys(names))
+        if any(name not in self._entries for name in names):
+            raise RuleNotFoundError
+        return [self._entries[name] for name in names]
+
+    def bind(self, names: Sequence[str]) -> List[Tuple[str, Predicate]]:
+        if any(name not in self._roots for name in names):
+            raise RuleNotFoundError
+        session = _Session()
+        return [(name, session.bind(self._functions[self._roots[name]])) for name in names]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'rules': len(self._roots),
+            'nodes': len(self._nodes),
+            'leaf_nodes': sum(1 for node in self._nodes if node.kind == "LEAF"),
+            'shared_nodes': sum(1 for node in self._nodes if node.references > 1),
+        }
+
+
+rule_network_cache: RulesetCache[RuleNetwork] = RulesetCache(RuleNetwork)
@@ -0,0 +1,21 @@
+import operator
+
+
+def contains(a, b):
+    return b in a if isinstance(a, (list, str, dict)) else False
+
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    "<": operator.lt,
+    ">=": operator.ge,
+    "<=": operator.le,
+    "contains": contains,
+}
+
+LOGIC_OPERATORS = {
+    "AND": all,
+    "OR": any,
+}
@@ -0,0 +1,198 @@
+import copy
+import json
+import math
+from typing import Any, Dict, List, Optional
+
+from .evaluator import MAX_NESTING_DEPTH, condition_depth
+from .operators import OPERATORS
+
+# Canonical forms of constant conditions; all([]) is True and any([]) is False
+ALWAYS_TRUE: Dict[str, Any] = {"AND": []}
+ALWAYS_FALSE: Dict[str, Any] = {"OR": []}
+
+_LOWER_BOUNDS = (">", ">=")
+_UPPER_BOUNDS = ("<", "<=")
+
+
+def _is_number(value) -> bool:
+    return type(value) in (int, float) and not math.isnan(value)
+
+
+def _is_scalar(value) -> bool:
+    return type(value) in (str, int, float, bool) and not (type(value) is float and math.isnan(value))
+
+
+def _leaf_key(condition: Dict[str, Any]) -> str:
+    if "AND" in condition or "OR" in condition:
+        return json.dumps(condition, sort_keys=True)
+    return json.dumps(["LEAF", condition["field"], condition["operator"], condition["value"]], sort_keys=True)
+
+
+def _optimize_leaf(condition: Dict[str, Any]) -> Dict[str, Any]:
+    field = condition.get("field")
+    op = condition.get("operator")
+    value = condition.get("value")
+
+    if not all([field, op, value is not None]):
+        return ALWAYS_FALSE
+    if not isinstance(field, str) or not isinstance(op, str):
+        raise TypeError("Unsupported leaf")
+    if op not in OPERATORS:
+        return ALWAYS_FALSE
+
+    return {"field": field, "operator": op, "value": value}
+
+
+def _tightest(bounds: List[Dict[str, Any]], lower: bool) -> Dict[str, Any]:
+    # At equal values the strict bound is the tighter one
+    if lower:
+        return max(bounds, key=lambda leaf: (leaf["value"], leaf["operator"] == ">"))
+    return min(bounds, key=lambda leaf: (leaf["value"], leaf["operator"] != "<"))
+
+
+def _loosest(bounds: List[Dict[str, Any]], lower: bool) -> Dict[str, Any]:
+    if lower:
+        return min(bounds, key=lambda leaf: (leaf["value"], leaf["operator"] == ">"))
+    return max(bounds, key=lambda leaf: (leaf["value"], leaf["operator"] == "<="))
+
+
+def _merge_and_field(leaves: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+    # Returns the leaves to keep for one field, or None if they can't all hold
+    equals = [leaf for leaf in leaves if leaf["operator"] == "=="]
+    lowers = [leaf for leaf in leaves if leaf["operator"] in _LOWER_BOUNDS]
+    uppers = [leaf for leaf in leaves if leaf["operator"] in _UPPER_BOUNDS]
+    bounds = [_tightest(lowers, True)] if lowers else []
+    bounds += [_tightest(uppers, False)] if uppers else []
+
+    if len(bounds) == 2:
+        lower, upper = bounds
+        if lower["value"] > upper["value"]:
+            return None
+        if lower["value"] == upper["value"] and (lower["operator"] == ">" or upper["operator"] == "<"):
+            return None
+
+    if equals:
+        if any(leaf["value"] != equals[0]["value"] for leaf in equals):
+            return None
+        for bound in bounds:
+            # A string can't satisfy a numeric bound either; the comparison raises and fails
+            if not _is_number(equals[0]["value"]) and type(equals[0]["value"]) is not bool:
+                return None
+            if not OPERATORS[bound["operator"]](equals[0]["value"], bound["value"]):
+                return None
+        # The equality already implies every bound it satisfies
+        return equals
+
+    return bounds
+
+
+def _merge_ranges(kind: str, children: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+    # Numeric bounds (and, under AND, scalar equalities) on the same field are
+    # merged into the one or two leaves that express the same range.
+    groups: Dict[str, List[int]] = {}
+    for position, child in enumerate(children):
+        if "AND" in child or "OR" in child:
+            continue
+        op = child["operator"]
+        if (op in _LOWER_BOUNDS or op in _UPPER_BOUNDS) and _is_number(child["value"]):
+            groups.setdefault(child["field"], []).append(position)
+        elif kind == "AND" and op == "==" and _is_scalar(child["value"]):
+            groups.setdefault(child["field"], []).append(position)
+
+    replacements: Dict[int, List[Dict[str, Any]]] = {}
+    removed = set()
+    for positions in groups.values():
+        if len(positions) < 2:
+            continue
+        leaves = [children[position] for position in positions]
+
+        if kind == "AND":
+            merged = _merge_and_field(leaves)
+            if merged is None:
+                return None
+        else:
+            lowers = [leaf for leaf in leaves if leaf["operator"] in _LOWER_BOUNDS]
+            uppers = [leaf for leaf in leaves if leaf["operator"] in _UPPER_BOUNDS]
+            merged = [_loosest(lowers, True)] if lowers else []
+            merged += [_loosest(uppers, False)] if uppers else []
+
+        if len(merged) == len(leaves):
+            continue
+        replacements[positions[0]] = merged
+        removed.update(positions[1:])
+
+    optimized = []
+    for position, child in enumerate(children):
+        if position in replacements:
+            optimized.extend(replacements[position])
+        elif position not in removed:
+            optimized.append(child)
+    return optimized
+
+
+def _optimize_logic(kind: str, children: List[Dict[str, Any]]) -> Dict[str, Any]:
+    absorbing, neutral = (ALWAYS_FALSE, ALWAYS_TRUE) if kind == "AND" else (ALWAYS_TRUE, ALWAYS_FALSE)
+
+    flattened = []
+    for child in children:
+        if child == absorbing:
+            return absorbing
+        if child == neutral:
+            continue
+        if kind in child:
+            flattened.extend(child[kind])
+        else:
+            flattened.append(child)
+
+    unique = []
+    seen = set()
+    for child in flattened:
+        key = _leaf_key(child)
+        if key not in seen:
+            seen.add(key)
+            unique.append(child)
+    merged = _merge_ranges(kind, unique)
+    if merged is None:
+        return absorbing
+
+    if not merged:
+        return neutral
+    if len(merged) == 1:
+        return merged[0]
+    return {kind: merged}
+
+
+def _optimize(condition: Dict[str, Any]) -> Dict[str, Any]:
+    if not isinstance(condition, dict):
+        raise TypeError("Unsupported condition")
+
+    if "AND" in condition or "OR" in condition:
+        kind = "AND" if "AND" in condition else "OR"
+        if not isinstance(condition[kind], list):
+            raise TypeError("Unsupported condition")
+        return _optimize_logic(kind, [_optimize(sub) for sub in condition[kind]])
+
+    return _optimize_leaf(condition)
+
+
+def optimize_condition(condition: Dict[str, Any]) -> Dict[str, Any]:
+    # Returns a condition that evaluates the same as the given one for every
+    # JSON payload: nested AND/OR are flattened, duplicate children dropped,
+    # constant branches folded and numeric ranges on a field merged.
+    if condition_depth(condition) > MAX_NESTING_DEPTH:
+        return condition
+    try:
+        return copy.deepcopy(_optimize(condition))
+    except (TypeError, ValueError, KeyError):
+        # Shapes validate_condition_json lets through but the optimizer
+        # doesn't model are left exactly as written
+        return condition
+
+
+def constant_result(condition: Dict[str, Any]) -> Optional[bool]:
+    # True or False for an optimized condition that no payload can change, otherwise None
+    if condition == ALWAYS_TRUE:
+        return True
+    if condition == ALWAYS_FALSE:
+        return False
+    return None
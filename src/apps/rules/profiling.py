@@ -0,0 +1,75 @@
+import cProfile
+import pstats
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class ProfileLimiter:
+    # Profiling slows a request down several times, so only one request per
+    # process is profiled at a time and at most max_per_minute across all
+    # processes sharing the cache; requests over the limit run unprofiled
+    KEY_PREFIX = 'rules:profile:'
+
+    def __init__(self, max_per_minute: int = 10):
+        self.max_per_minute = max_per_minute
+        self._running = threading.Lock()
+
+    def acquire(self) -> bool:
+        if self.max_per_minute <= 0 or not self._running.acquire(blocking=False):
+            return False
+        try:
+            key = f"{self.KEY_PREFIX}{int(time.time() // 60)}"
+            cache.add(key, 0, timeout=120)
+            if cache.incr(key) <= self.max_per_minute:
+                return True
+        except Exception:
+            pass
+        self._running.release()
+        return False
+
+    def release(self) -> None:
+        self._running.release()
+
+
+class RequestProfiler:
+    def __init__(self, limiter: ProfileLimiter):
+        self.limiter = limiter
+        self.profile = cProfile.Profile()
+
+    @classmethod
+    def start(cls, limiter: ProfileLimiter) -> Optional['RequestProfiler']:
+        if not limiter.acquire():
+            return None
+        profiler = cls(limiter)
+        try:
+            profiler.profile.enable()
+        except ValueError:
+            # Another profiler is already active in this thread
+            limiter.release()
+            return None
+        return profiler
+
+    def stop(self, top: int = 25) -> List[Dict[str, Any]]:
+        # The functions with the highest cumulative time, as in
+        # pstats' print_stats(top) sorted by cumulative
+        self.profile.disable()
+        self.limiter.release()
+        stats = pstats.Stats(self.profile).strip_dirs().sort_stats(pstats.SortKey.CUMULATIVE)
+        functions = []
+        for function in stats.fcn_list[:top]:
+            primitive_calls, calls, total_time, cumulative_time, _ = stats.stats[function]
+            functions.append({
+                'function': pstats.func_std_string(function),
+                'calls': calls,
+                'primitive_calls': primitive_calls,
+                'total_time': total_time,
+                'cumulative_time': cumulative_time,
+            })
+        return functions
+
+
+profile_limiter = ProfileLimiter(getattr(settings, 'RULE_PROFILE_MAX_PER_MINUTE', 10))
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.core.cache import LRUCache
+from .accessor import MISSING, PayloadAccessor
+from .metrics import RESULT_CACHE_TOTAL
+from .store import RuleEntry
+
+EvaluationResult = Dict[str, List[str]]
+
+
+def referenced_fields(condition: Dict[str, Any]) -> Optional[Tuple[str, ...]]:
+    # The field paths a condition can read, or None if it has a leaf whose
+    # field isn't a string (its result can't be tied to payload fields)
+    fields = set()
+    stack = [condition]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, dict):
+            return None
+        if "AND" in node or "OR" in node:
+            children = node["AND"] if "AND" in node else node["OR"]
+            if not isinstance(children, list):
+                return None
+            stack.extend(children)
+        elif "field" in node:
+            field = node["field"]
+            if not isinstance(field, str):
+                if field:
+                    return None
+                continue
+            fields.add(field)
+    return tuple(sorted(fields))
+
+
+class EvaluationResultCache:
+    # Memoizes evaluation results for a rule set and payload. The key is made
+    # of each rule's version, the evaluation mode and a canonical hash of only
+    # the payload fields the rules reference, so a saved rule changes the key
+    # and payload fields no rule reads don't split entries.
+    KEY_PREFIX = 'rules:result:'
+    _RESULTS = {'_hits': 'hit', '_shared_hits': 'shared_hit', '_misses': 'miss'}
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0, enabled: bool = False, shared: bool = False):
+        self.ttl = ttl
+        self.enabled = enabled
+        self.shared = shared
+        self._entries: LRUCache[Tuple[float, EvaluationResult]] = LRUCache(maxsize)
+        self._fields: LRUCache[Optional[Tuple[str, ...]]] = LRUCache(maxsize)
+        self._hits = 0
+        self._shared_hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def get_or_evaluate(self, rule_entries: Sequence[RuleEntry], payload: Dict[str, Any], mode: str, evaluate: Callable[[], EvaluationResult]) -> EvaluationResult:
+        key = self.key(rule_entries, payload, mode) if self.enabled else None
+        if key is None:
+            return evaluate()
+
+        result = self._get(key)
+        if result is None:
+            result = evaluate()
+            self._set(key, result)
+        return {
+            "passed_rules": list(result["passed_rules"]),
+            "failed_rules": list(result["failed_rules"])
+        }
+
+    def key(self, rule_entries: Sequence[RuleEntry], payload: Dict[str, Any], mode: str) -> Optional[str]:
+        fields = set()
+        for entry in rule_entries:
+            entry_fields = self._fields.get_or_set(entry.version, lambda: referenced_fields(entry.condition))
+            if entry_fields is None:
+                return None
+            fields.update(entry_fields)
+
+        accessor = PayloadAccessor(payload)
+        # Missing fields are left out, so they stay distinct from an explicit null
+        values = {field: accessor[field] for field in fields if accessor[field] is not MISSING}
+        try:
+            fingerprint = json.dumps(
+                [[[entry.name, entry.id, str(entry.updated_at)] for entry in rule_entries], mode, values],
+                sort_keys=True, separators=(',', ':')
+            )
+        except (TypeError, ValueError):
+            # Values JSON can't represent canonically aren't cached
+            return None
+        return self.KEY_PREFIX + hashlib.sha256(fingerprint.encode()).hexdigest()
+
+    def _get(self, key: Hashable) -> Optional[EvaluationResult]:
+        cached = self._entries.get(key)
+        if cached is not None:
+            expires_at, result = cached
+            if expires_at > time.monotonic():
+                self._count('_hits')
+                return result
+            self._entries.pop(key)
+
+        if self.shared:
+            try:
+                result = cache.get(key)
+            except Exception:
+                result = None
+            if result is not None:
+                self._entries.set(key, (time.monotonic() + self.ttl, result))
+                self._count('_shared_hits')
+                return result
+
+        self._count('_misses')
+        return None
+
+    def _set(self, key: Hashable, result: EvaluationResult) -> None:
+        self._entries.set(key, (time.monotonic() + self.ttl, result))
+        if self.shared:
+            try:
+                cache.set(key, result, timeout=self.ttl)
+            except Exception:
+                pass
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        RESULT_CACHE_TOTAL.inc(self._RESULTS[counter])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'shared': self.shared,
+            'size': len(self._entries),
+            'hits': self._hits,
+            'shared_hits': self._shared_hits,
+            'misses': self._misses
+        }
+
+    def clear(self) -> None:
+        # Shared entries are keyed on rule versions, so a changed rule can't hit them
+        self._entries.clear()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._hits = self._shared_hits = self._misses = 0
+
+
+evaluation_result_cache = EvaluationResultCache(
+    maxsize=getattr(settings, 'RULE_RESULT_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'RULE_RESULT_CACHE_TTL', 60.0),
+    enabled=getattr(settings, 'RULE_RESULT_CACHE_ENABLED', False),
+    shared=getattr(settings, 'RULE_RESULT_CACHE_SHARED', False),
+)
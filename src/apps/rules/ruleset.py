@@ -0,0 +1,198 @@
+import ast
+import json
+from typing import Any, Callable, Dict, Hashable, List, Sequence, Tuple
+
+from django.conf import settings
+
+from apps.core.cache import LRUCache
+from .codegen import COMPARE_NODES, ExpressionGenerator, load
+from .compiler import CompiledRules, compiled_rule_cache
+from .evaluator import MAX_NESTING_DEPTH, condition_depth
+from .operators import OPERATORS
+from .store import RuleEntry
+
+_MISSING: Any = object()
+
+RulesetFunction = Callable[[Dict[str, Any], bool], Dict[str, List[str]]]
+
+
+def _template(source: str, **substitutions: ast.AST) -> List[ast.stmt]:
+    # Parses a statement template and swaps its upper-case placeholder names for AST nodes
+    class Substitute(ast.NodeTransformer):
+        def visit_Name(self, node):
+            return substitutions.get(node.id, node)
+
+    return Substitute().visit(ast.parse(source)).body
+
+
+def _is_leaf(condition: Dict[str, Any]) -> bool:
+    return "AND" not in condition and "OR" not in condition
+
+
+def _valid_leaf(condition: Dict[str, Any]) -> bool:
+    field = condition.get("field")
+    op = condition.get("operator")
+    value = condition.get("value")
+    return all([field, op, value is not None]) and op in OPERATORS
+
+
+def _leaf_key(condition: Dict[str, Any]) -> str:
+    return json.dumps([condition["field"], condition["operator"], condition["value"]], sort_keys=True)
+
+
+class _RulesetGenerator(ExpressionGenerator):
+    def __init__(self, rule_entries: Sequence[RuleEntry]):
+        super().__init__()
+        self.rule_entries = rule_entries
+        self.namespace['_MISSING'] = _MISSING
+        self._paths: Dict[Tuple[str, ...], str] = {}
+        self._shared_leaves: Dict[str, str] = {}
+        self._compilable = []
+
+        leaf_counts: Dict[str, int] = {}
+        for entry in rule_entries:
+            leaves = list(self._leaves(entry.condition)) if condition_depth(entry.condition) <= MAX_NESTING_DEPTH else None
+            # Too deep, or a field that isn't a dotted string: the exact predicate evaluates the rule
+            compilable = leaves is not None and all(isinstance(leaf["field"], str) for leaf in leaves)
+            self._compilable.append(compilable)
+            if compilable:
+                for leaf in leaves:
+                    key = _leaf_key(leaf)
+                    leaf_counts[key] = leaf_counts.get(key, 0) + 1
+                    self._path(tuple(leaf["field"].split('.')))
+        for key, count in leaf_counts.items():
+            if count > 1:
+                self._shared_leaves[key] = f'_leaf_{len(self._shared_leaves)}'
+
+    @staticmethod
+    def _leaves(condition: Dict[str, Any]):
+        stack = [condition]
+        while stack:
+            node = stack.pop()
+            if _is_leaf(node):
+                if _valid_leaf(node):
+                    yield node
+            else:
+                stack.extend(node["AND"] if "AND" in node else node["OR"])
+
+    def _path(self, field_parts: Tuple[str, ...]) -> str:
+        name = self._paths.get(field_parts)
+        if name is None:
+            if len(field_parts) > 1:
+                self._path(field_parts[:-1])
+            name = self._paths[field_parts] = f'_path_{len(self._paths)}'
+        return name
+
+    def leaf(self, condition: Dict[str, Any]) -> ast.expr:
+        if not _valid_leaf(condition):
+            return ast.Constant(value=False)
+
+        path = load(self._paths[tuple(condition["field"].split('.'))])
+        op = condition["operator"]
+        constant = self.constant(condition["value"])
+        if op == "contains":
+            compare = ast.Call(func=load('_contains'), args=[path, constant], keywords=[])
+        else:
+            compare = ast.Compare(left=path, ops=[COMPARE_NODES[op]()], comparators=[constant])
+        # PATH is not _MISSING and PATH <op> VALUE
+        leaf = ast.BoolOp(op=ast.And(), values=[
+            ast.Compare(left=path, ops=[ast.IsNot()], comparators=[load('_MISSING')]), compare
+        ])
+
+        shared = self._shared_leaves.get(_leaf_key(condition))
+        if shared is None:
+            return leaf
+        # Shared leaves are computed by whichever rule reaches them first:
+        # SHARED if SHARED is not None else (SHARED := LEAF)
+        return ast.IfExp(
+            test=ast.Compare(left=load(shared), ops=[ast.IsNot()], comparators=[ast.Constant(value=None)]),
+            body=load(shared),
+            orelse=ast.NamedExpr(target=ast.Name(id=shared, ctx=ast.Store()), value=leaf)
+        )
+
+    def generate(self) -> ast.Module:
+        body: List[ast.stmt] = _template("passed = []\nfailed = []")
+
+        # Every distinct path is resolved once, each from its parent path
+        for field_parts, name in self._paths.items():
+            parent = load(self._paths[field_parts[:-1]]) if len(field_parts) > 1 else load('payload')
+            body += _template(
+                "PATH = PARENT[PART] if isinstance(PARENT, dict) and PART in PARENT else _MISSING",
+                PATH=ast.Name(id=name, ctx=ast.Store()), PARENT=parent, PART=ast.Constant(value=field_parts[-1])
+            )
+        for name in self._shared_leaves.values():
+            body += _template("SHARED = None", SHARED=ast.Name(id=name, ctx=ast.Store()))
+
+        for index, (entry, compilable) in enumerate(zip(self.rule_entries, self._compilable)):
+            exact = f'_exact_{index}'
+            self.namespace[exact] = compiled_rule_cache.get_or_compile(entry.version, entry.condition)
+            if compilable:
+                # A comparison that raises (mismatched types...) hands the rule to its exact predicate
+                body += _template(
+                    "try:\n    result = RESULT\nexcept Exception:\n    result = EXACT(payload)",
+                    RESULT=self.condition(entry.condition), EXACT=load(exact)
+                )
+            else:
+                body += _template("result = EXACT(payload)", EXACT=load(exact))
+            body += _template(
+                "if result:\n"
+                "    passed.append(NAME)\n"
+                "else:\n"
+                "    failed.append(NAME)\n"
+                "    if stop_at_failure:\n"
+                "        return {'passed_rules': passed, 'failed_rules': failed}",
+                NAME=ast.Constant(value=entry.name)
+            )
+
+        body += _template("return {'passed_rules': passed, 'failed_rules': failed}")
+        function = _template("def ruleset(payload, stop_at_failure=False):\n    pass")[0]
+        function.body = body
+        return ast.fix_missing_locations(ast.Module(body=[function], type_ignores=[]))
+
+
+def generate_source(rule_entries: Sequence[RuleEntry]) -> str:
+    return ast.unparse(_RulesetGenerator(rule_entries).generate())
+
+
+def compile_ruleset(rule_entries: Sequence[RuleEntry]) -> RulesetFunction:
+    # One function for the whole rule set: each distinct payload path is
+    # resolved once, leaves used by several rules are computed at most once,
+    # and the passed/failed lists are filled in a single pass in rule order.
+    generator = _RulesetGenerator(rule_entries)
+    module = generator.generate()
+    exec(compile(module, '<ruleset>', 'exec'), generator.namespace)
+    return generator.namespace['ruleset']
+
+
+class CompiledRuleset(CompiledRules):
+    # The (name, predicate) pairs of the rules, so it can stand in wherever
+    # compiled rules are expected, plus the single function evaluating them all.
+    def __init__(self, rule_entries: Sequence[RuleEntry], function: RulesetFunction):
+        super().__init__(
+            (entry.name, compiled_rule_cache.get_or_compile(entry.version, entry.condition))
+            for entry in rule_entries
+        )
+        self.function = function
+
+    def evaluate(self, payload: Dict[str, Any], stop_at_failure: bool = False) -> Dict[str, List[str]]:
+        return self.function(payload, stop_at_failure)
+
+
+class CompiledRulesetCache:
+    def __init__(self, maxsize: int = 128):
+        self._cache: LRUCache[CompiledRuleset] = LRUCache(maxsize)
+
+    def get_or_compile(self, rule_entries: Sequence[RuleEntry]) -> CompiledRuleset:
+        # Keyed by the rules in evaluation order, since that is the order of the
+        # passed/failed lists, together with each rule's version
+        key: Hashable = tuple((entry.name, entry.version) for entry in rule_entries)
+        return self._cache.get_or_set(key, lambda: CompiledRuleset(rule_entries, compile_ruleset(rule_entries)))
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+ruleset_cache = CompiledRulesetCache(getattr(settings, 'RULE_RULESET_CACHE_SIZE', 128))
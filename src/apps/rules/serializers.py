@@ -1,15 +1,28 @@
+from django.conf import settings
 from rest_framework import serializers
 
+from apps.core.fastjson import FastJSONField
 from .models import Rule
+from .optimizer import constant_result
+from .services import BATCH_ENGINES, ENGINE_COMPILED, ENGINE_VECTORIZED, EVALUATION_ENGINES, EVALUATION_MODES, MODE_FULL
+from . import vectorized
 
 
 class RuleSerializer(serializers.ModelSerializer):
     created_by = serializers.StringRelatedField(read_only=True)
+    constant_result = serializers.SerializerMethodField(
+        help_text="true or false if the condition passes or fails for every payload, otherwise null."
+    )
     
     class Meta:
         model = Rule
-        fields = ['id', 'name', 'condition', 'is_active', 'created_by', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_by', 'created_at', 'updated_at']
+        fields = ['id', 'name', 'condition', 'optimized_condition', 'constant_result', 'is_active', 'created_by', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'optimized_condition', 'created_by', 'created_at', 'updated_at']
+    
+    def get_constant_result(self, obj):
+        if obj.optimized_condition is None:
+            return None
+        return constant_result(obj.optimized_condition)
 
 
 class RuleEvaluationRequestSerializer(serializers.Serializer):
@@ -17,16 +30,79 @@ class RuleEvaluationRequestSerializer(serializers.Serializer):
         child=serializers.CharField(),
         min_length=1
     )
-    payload = serializers.JSONField()
+    payload = FastJSONField()
+    mode = serializers.ChoiceField(
+        choices=EVALUATION_MODES,
+        default=MODE_FULL,
+        help_text="'verdict' stops at the first failing rule; passed_rules and failed_rules then only cover the rules evaluated."
+    )
+    cheapest_first = serializers.BooleanField(
+        default=False,
+        help_text="Evaluate the rules with the cheapest conditions first."
+    )
+    engine = serializers.ChoiceField(
+        choices=EVALUATION_ENGINES,
+        default=ENGINE_COMPILED,
+        help_text="'network' shares identical conditions across rules so each is evaluated once per payload. 'adaptive' reorders AND/OR children by their observed pass rates and costs. 'bytecode' runs each rule as a generated Python function. 'ruleset' compiles the requested rules together into one function that resolves each payload path once."
+    )
 
 
 class RuleEvaluationResponseSerializer(serializers.Serializer):
     result = serializers.CharField()
     passed_rules = serializers.ListField(child=serializers.CharField())
     failed_rules = serializers.ListField(child=serializers.CharField())
+    ruleset_version = serializers.IntegerField(required=False, help_text="Version of the ruleset snapshot the rules were evaluated against.")
+
+
+class RuleMatchRequestSerializer(serializers.Serializer):
+    payload = FastJSONField()
+
+
+class RuleMatchResponseSerializer(serializers.Serializer):
+    matched_rules = serializers.ListField(child=serializers.CharField())
+    ruleset_version = serializers.IntegerField()
+
+
+class RuleBatchEvaluationItemSerializer(serializers.Serializer):
+    id = serializers.CharField(required=False)
+    payload = FastJSONField()
+
+
+class RuleBatchEvaluationRequestSerializer(serializers.Serializer):
+    rules = serializers.ListField(
+        child=serializers.CharField(),
+        min_length=1
+    )
+    payloads = serializers.ListField(
+        child=RuleBatchEvaluationItemSerializer(),
+        min_length=1
+    )
+
+    engine = serializers.ChoiceField(choices=BATCH_ENGINES, default=ENGINE_COMPILED)
+
+    def validate_engine(self, value):
+        if value == ENGINE_VECTORIZED and not vectorized.is_available():
+            raise serializers.ValidationError("The vectorized engine requires NumPy, which is not installed.")
+        return value
+
+    def validate_payloads(self, value):
+        max_size = settings.RULE_EVALUATION_BATCH_MAX_SIZE
+        if len(value) > max_size:
+            raise serializers.ValidationError(f"Ensure this field has no more than {max_size} elements.")
+        return value
+
+
+class RuleBatchEvaluationResultSerializer(RuleEvaluationResponseSerializer):
+    id = serializers.CharField(required=False)
+
+
+class RuleBatchEvaluationResponseSerializer(serializers.Serializer):
+    results = RuleBatchEvaluationResultSerializer(many=True)
+    ruleset_version = serializers.IntegerField()
 
 
 class RuleEvaluationAsyncResponseSerializer(serializers.Serializer):
     task_id = serializers.CharField()
     status = serializers.CharField()
     message = serializers.CharField()
+    ruleset_version = serializers.IntegerField(help_text="Version of the ruleset snapshot the task will evaluate against.")
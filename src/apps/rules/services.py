@@ -1,10 +1,38 @@
-import operator
-from typing import List, Dict, Any, Optional, Tuple
+import time
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
 from django.db.models import QuerySet
 
-from apps.core.exceptions import RuleNotFoundError
+from apps.core import fastjson
+from apps.core.metrics import StageTimer
+
+from .accessor import PayloadAccessor
+from .adaptive import adaptive_rule_cache
+from .codegen import bytecode_rule_cache
+from .compiler import CompiledRules, Predicate, compiled_rule_cache
+from .evaluator import evaluate_condition
+from .metrics import RULE_SECONDS, STAGE_SECONDS, sample_rule_latency
 from .models import Rule
+from .operators import OPERATORS, LOGIC_OPERATORS
 from .repositories import RuleRepository
+from .result_cache import evaluation_result_cache
+from .index import PredicateIndex, rule_index_cache
+from .network import RuleNetwork, rule_network_cache
+from .ruleset import ruleset_cache
+from .store import RuleEntry, Ruleset, rule_store
+from . import vectorized
+
+ENGINE_COMPILED = 'compiled'
+ENGINE_NETWORK = 'network'
+ENGINE_VECTORIZED = 'vectorized'
+ENGINE_ADAPTIVE = 'adaptive'
+ENGINE_BYTECODE = 'bytecode'
+ENGINE_RULESET = 'ruleset'
+EVALUATION_ENGINES = (ENGINE_COMPILED, ENGINE_NETWORK, ENGINE_ADAPTIVE, ENGINE_BYTECODE, ENGINE_RULESET)
+BATCH_ENGINES = (ENGINE_COMPILED, ENGINE_NETWORK, ENGINE_VECTORIZED, ENGINE_ADAPTIVE, ENGINE_BYTECODE, ENGINE_RULESET)
+
+MODE_FULL = 'full'
+MODE_VERDICT = 'verdict'
+EVALUATION_MODES = (MODE_FULL, MODE_VERDICT)
 
 
 class RuleService:
@@ -23,81 +51,249 @@ class RuleService:
     def get_by_name(self, name: str) -> Optional[Rule]:
         return self.repository.get_by_filters(name=name)
     
+    def get_ruleset(self, version: Optional[int] = None) -> Ruleset:
+        return rule_store.get_ruleset(version)
+    
+    def get_rule_entries_by_names(self, names: List[str], ruleset: Optional[Ruleset] = None) -> List[RuleEntry]:
+        return (ruleset or self.get_ruleset()).get_many(names)
+    
     def get_rules_by_names(self, names: List[str]) -> List[Tuple[str, Dict[str, Any]]]:
-        rules = self.repository._get_queryset().by_names(names)
-        found_names = set(rule.name for rule in rules)
-        missing_names = set(names) - found_names
+        return [(entry.name, entry.condition) for entry in self.get_rule_entries_by_names(names)]
+    
+    def get_rule_network(self, ruleset: Optional[Ruleset] = None) -> RuleNetwork:
+        return rule_network_cache.get(ruleset or self.get_ruleset())
+    
+    def get_rule_index(self, ruleset: Optional[Ruleset] = None) -> PredicateIndex:
+        return rule_index_cache.get(ruleset or self.get_ruleset())
+    
+    def get_compiled_rules_by_names(self, names: List[str], cheapest_first: bool = False, engine: str = ENGINE_COMPILED, ruleset: Optional[Ruleset] = None) -> List[Tuple[str, Predicate]]:
+        if engine == ENGINE_NETWORK:
+            network = self.get_rule_network(ruleset)
+            rule_entries = network.get_entries(names)
+        else:
+            rule_entries = self.get_rule_entries_by_names(names, ruleset)
         
-        if missing_names:
-            raise RuleNotFoundError
+        if cheapest_first:
+            rule_entries = self.sort_cheapest_first(rule_entries)
         
-        return [(rule.name, rule.condition) for rule in rules]
+        if engine == ENGINE_NETWORK:
+            return network.bind([entry.name for entry in rule_entries])
+        return RuleEvaluation.compile_rules(rule_entries, engine)
+    
+    def evaluate(self, names: List[str], payload: Dict[str, Any], mode: str = MODE_FULL, cheapest_first: bool = False, engine: str = ENGINE_COMPILED, version: Optional[int] = None, timer: Optional[StageTimer] = None) -> Dict[str, Any]:
+        # Evaluates against one ruleset snapshot (the current one unless a
+        # version is pinned) and reports its version with the result. Goes
+        # through the result cache when it's enabled; the rules are only
+        # compiled and evaluated on a miss. The db, compile and eval stages are
+        # timed into the caller's timer.
+        timer = timer or StageTimer(STAGE_SECONDS, 'service')
+        with timer.stage('db'):
+            ruleset = self.get_ruleset(version)
+            rule_entries = self.get_rule_entries_by_names(names, ruleset)
+            if cheapest_first:
+                rule_entries = self.sort_cheapest_first(rule_entries)
+        
+        with timer.stage('eval'):
+            evaluation_result = evaluation_result_cache.get_or_evaluate(
+                rule_entries,
+                payload,
+                mode,
+                lambda: self._evaluate_compiled(names, payload, mode, cheapest_first, engine, ruleset, timer)
+            )
+        evaluation_result['ruleset_version'] = ruleset.version
+        return evaluation_result
+    
+    def _evaluate_compiled(self, names: List[str], payload: Dict[str, Any], mode: str, cheapest_first: bool, engine: str, ruleset: Ruleset, timer: StageTimer) -> Dict[str, List[str]]:
+        # Timed within the eval stage but counted apart from it; usually a cache hit
+        with timer.stage('compile'):
+            compiled_rules = self.get_compiled_rules_by_names(names, cheapest_first, engine, ruleset)
+        if sample_rule_latency():
+            return RuleEvaluation.evaluate_timed(compiled_rules, payload, mode, RULE_SECONDS.observe)
+        return RuleEvaluation.evaluate(compiled_rules, payload, mode)
+    
+    @staticmethod
+    def sort_cheapest_first(rule_entries: List[RuleEntry]) -> List[RuleEntry]:
+        return sorted(
+            rule_entries,
+            key=lambda entry: compiled_rule_cache.get_cost(entry.version, entry.condition)
+        )
 
 
 class RuleEvaluation:
-    OPERATORS = {
-        "==": operator.eq,
-        "!=": operator.ne,
-        ">": operator.gt,
-        "<": operator.lt,
-        ">=": operator.ge,
-        "<=": operator.le,
-        "contains": lambda a, b: b in a if isinstance(a, (list, str, dict)) else False
-    }
-
-    LOGIC_OPERATORS = {
-        "AND": all,
-        "OR": any
-    }
+    OPERATORS = OPERATORS
+
+    LOGIC_OPERATORS = LOGIC_OPERATORS
 
     @staticmethod
     def evaluate_condition(condition: Dict[str, Any], payload: Dict[str, Any]) -> bool:
-        if "AND" in condition:
-            return RuleEvaluation.LOGIC_OPERATORS["AND"](
-                RuleEvaluation.evaluate_condition(subcondition, payload) for subcondition in condition["AND"]
-            )
+        return evaluate_condition(condition, payload)
+
+    @staticmethod
+    def evaluate_rules(rule_conditions: List[Dict[str, Any]], payload: Dict[str, Any]) -> Dict[str, List[str]]:
+        # One accessor for all the rules, so each field path is resolved once
+        accessor = PayloadAccessor(payload)
+        passed_rules = []
+        failed_rules = []
         
-        if "OR" in condition:
-            return RuleEvaluation.LOGIC_OPERATORS["OR"](
-                RuleEvaluation.evaluate_condition(subcondition, payload) for subcondition in condition["OR"]
-            )
+        for rule_name, condition in rule_conditions:
+            if RuleEvaluation.evaluate_condition(condition, accessor):
+                passed_rules.append(rule_name)
+            else:
+                failed_rules.append(rule_name)
+        
+        return {
+            "passed_rules": passed_rules,
+            "failed_rules": failed_rules
+        }
+
+    @staticmethod
+    def evaluate_compiled_rules(compiled_rules: List[Tuple[str, Predicate]], payload: Dict[str, Any]) -> Dict[str, List[str]]:
+        if isinstance(compiled_rules, CompiledRules):
+            return compiled_rules.evaluate(payload)
         
-        field = condition.get("field")
-        op = condition.get("operator")
-        value = condition.get("value")
+        passed_rules = []
+        failed_rules = []
         
-        if not all([field, op, value is not None]):
-            return False
+        for rule_name, predicate in compiled_rules:
+            if predicate(payload):
+                passed_rules.append(rule_name)
+            else:
+                failed_rules.append(rule_name)
         
-        if op not in RuleEvaluation.OPERATORS:
-            return False
+        return {
+            "passed_rules": passed_rules,
+            "failed_rules": failed_rules
+        }
+
+    @staticmethod
+    def evaluate_verdict(compiled_rules: List[Tuple[str, Predicate]], payload: Dict[str, Any]) -> Dict[str, List[str]]:
+        # Stops at the first failing rule; the verdict is all that's needed to
+        # decide REJECTED, so the remaining rules are never evaluated.
+        if isinstance(compiled_rules, CompiledRules):
+            return compiled_rules.evaluate(payload, stop_at_failure=True)
         
-        field_parts = field.split('.') # This is for nested field access with dot notation like "user.age"
-        field_value_from_payload = payload
+        passed_rules = []
         
-        for part in field_parts:
-            if isinstance(field_value_from_payload, dict) and part in field_value_from_payload:
-                field_value_from_payload = field_value_from_payload[part]
-            else:
-                return False
+        for rule_name, predicate in compiled_rules:
+            if not predicate(payload):
+                return {
+                    "passed_rules": passed_rules,
+                    "failed_rules": [rule_name]
+                }
+            passed_rules.append(rule_name)
         
-        try:
-            return RuleEvaluation.OPERATORS[op](field_value_from_payload, value)
-        except (TypeError, ValueError):
-            return False
+        return {
+            "passed_rules": passed_rules,
+            "failed_rules": []
+        }
 
     @staticmethod
-    def evaluate_rules(rule_conditions: List[Dict[str, Any]], payload: Dict[str, Any]) -> Dict[str, List[str]]:
+    def evaluate(compiled_rules: List[Tuple[str, Predicate]], payload: Dict[str, Any], mode: str = MODE_FULL) -> Dict[str, List[str]]:
+        if mode == MODE_VERDICT:
+            return RuleEvaluation.evaluate_verdict(compiled_rules, payload)
+        return RuleEvaluation.evaluate_compiled_rules(compiled_rules, payload)
+
+    @staticmethod
+    def evaluate_timed(compiled_rules: List[Tuple[str, Predicate]], payload: Dict[str, Any], mode: str, observe: Callable[[float, str], None]) -> Dict[str, List[str]]:
+        # The same result as evaluate, rule by rule, passing each rule's
+        # evaluation time and name to observe
+        if isinstance(compiled_rules, CompiledRules):
+            payload = PayloadAccessor(payload)
         passed_rules = []
         failed_rules = []
         
-        for rule_name, condition in rule_conditions:
-            if RuleEvaluation.evaluate_condition(condition, payload):
+        for rule_name, predicate in compiled_rules:
+            started = time.perf_counter()
+            passed = predicate(payload)
+            observe(time.perf_counter() - started, rule_name)
+            if passed:
                 passed_rules.append(rule_name)
             else:
                 failed_rules.append(rule_name)
+                if mode == MODE_VERDICT:
+                    break
         
         return {
             "passed_rules": passed_rules,
             "failed_rules": failed_rules
         }
+
+    @staticmethod
+    def compile_rules(rule_entries: List[RuleEntry], engine: str = ENGINE_COMPILED) -> List[Tuple[str, Predicate]]:
+        if engine == ENGINE_ADAPTIVE:
+            # Adaptive rules hand out closure-compiled predicates, which share the payload accessor
+            return CompiledRules(
+                (entry.name, adaptive_rule_cache.get_or_compile(entry.version, entry.condition).select_predicate())
+                for entry in rule_entries
+            )
+        if engine == ENGINE_BYTECODE:
+            return [
+                (entry.name, bytecode_rule_cache.get_or_compile(entry.version, entry.condition))
+                for entry in rule_entries
+            ]
+        if engine == ENGINE_RULESET:
+            return ruleset_cache.get_or_compile(rule_entries)
+        return CompiledRules(
+            (entry.name, compiled_rule_cache.get_or_compile(entry.version, entry.condition))
+            for entry in rule_entries
+        )
+
+    @staticmethod
+    def evaluate_batch(rule_entries: List[RuleEntry], payloads: List[Dict[str, Any]], engine: str = ENGINE_COMPILED, ruleset: Optional[Ruleset] = None) -> List[Dict[str, List[str]]]:
+        # ruleset is the one rule_entries were resolved from (the current one
+        # if not given); the network engine is built from it
+        if engine == ENGINE_VECTORIZED:
+            return vectorized.evaluate_batch([(entry.name, entry.condition) for entry in rule_entries], payloads)
+        
+        if engine == ENGINE_NETWORK:
+            network = rule_network_cache.get(ruleset or rule_store.get_ruleset())
+            compiled_rules = network.bind([entry.name for entry in rule_entries])
+        else:
+            compiled_rules = RuleEvaluation.compile_rules(rule_entries, engine)
+        return [RuleEvaluation.evaluate_compiled_rules(compiled_rules, payload) for payload in payloads]
+
+    @staticmethod
+    def evaluate_stream(rule_entries: List[RuleEntry], lines: Iterable[bytes], engine: str = ENGINE_COMPILED, chunk_size: int = 100, ruleset: Optional[Ruleset] = None) -> Iterator[Dict[str, Any]]:
+        # Lines are evaluated in fixed-size chunks so batch engines can be used
+        # while memory stays bounded by the chunk, not the stream.
+        chunk = []
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            
+            try:
+                item = fastjson.loads(line)
+            except ValueError:
+                chunk.append({'line': line_number, 'error': 'Invalid JSON'})
+            else:
+                if not isinstance(item, dict) or 'payload' not in item:
+                    chunk.append({'line': line_number, 'error': 'Each line must be an object with a "payload" key'})
+                else:
+                    chunk.append(item)
+            
+            if len(chunk) >= chunk_size:
+                yield from RuleEvaluation._evaluate_stream_chunk(rule_entries, chunk, engine, ruleset)
+                chunk = []
+        
+        if chunk:
+            yield from RuleEvaluation._evaluate_stream_chunk(rule_entries, chunk, engine, ruleset)
+
+    @staticmethod
+    def _evaluate_stream_chunk(rule_entries: List[RuleEntry], chunk: List[Dict[str, Any]], engine: str, ruleset: Optional[Ruleset]) -> Iterator[Dict[str, Any]]:
+        items = [item for item in chunk if 'payload' in item]
+        evaluation_results = iter(RuleEvaluation.evaluate_batch(rule_entries, [item['payload'] for item in items], engine, ruleset))
+        
+        for item in chunk:
+            if 'payload' not in item:
+                yield item
+                continue
+            
+            evaluation_result = next(evaluation_results)
+            result = {
+                'result': "APPROVED" if not evaluation_result['failed_rules'] else "REJECTED",
+                'passed_rules': evaluation_result['passed_rules'],
+                'failed_rules': evaluation_result['failed_rules']
+            }
+            if 'id' in item:
+                result['id'] = item['id']
+            yield result
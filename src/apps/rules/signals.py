@@ -0,0 +1,22 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Rule
+from .result_cache import evaluation_result_cache
+from .store import rule_store
+
+
+def invalidate_rules() -> None:
+    rule_store.invalidate()
+    # Invalidate again once the write is committed, so a concurrent reader
+    # can't repopulate the store with the pre-commit row in the meantime.
+    transaction.on_commit(rule_store.invalidate)
+    # Results involving the rule are keyed on its previous version and can't
+    # be hit again; clearing the in-process tier just frees their slots
+    evaluation_result_cache.clear()
+
+
+@receiver([post_save, post_delete], sender=Rule)
+def invalidate_rule_store(sender, **kwargs):
+    invalidate_rules()
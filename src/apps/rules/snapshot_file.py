@@ -0,0 +1,226 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .evaluator import MAX_NESTING_DEPTH, condition_depth
+
+# File layout (little-endian):
+#   header   magic, format, ruleset version, string/node/rule counts
+#   strings  (string count + 1) offsets into the UTF-8 string blob, then the blob
+#   nodes    one fixed-size record per condition node; the children of an
+#            AND/OR node are a contiguous range of nodes
+#   rules    one record per rule, in id order
+#   names    rule positions sorted by name, for binary search
+MAGIC = b'RSNP'
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct('<4sHHQIII')
+_OFFSET = struct.Struct('<I')
+_NODE = struct.Struct('<BIII')
+_RULE = struct.Struct('<qIII')
+
+NODE_AND = 0
+NODE_OR = 1
+NODE_LEAF = 2
+# Anything the other node kinds can't reproduce exactly, stored as JSON
+NODE_JSON = 3
+
+_LEAF_KEYS = {'field', 'operator', 'value'}
+
+
+class _StringTable:
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+
+    def add(self, value: str) -> int:
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = self.ids[value] = len(self.ids)
+        return string_id
+
+    def add_json(self, value: Any) -> int:
+        return self.add(json.dumps(value, separators=(',', ':')))
+
+
+def _encode_condition(condition: Any, strings: _StringTable, nodes: List[Tuple[int, int, int, int]]) -> int:
+    # Returns the index of the condition's root node
+    position = len(nodes)
+    nodes.append(None)
+    _encode_node(condition, position, strings, nodes)
+    return position
+
+
+def _encode_node(node: Any, position: int, strings: _StringTable, nodes: List[Tuple[int, int, int, int]]) -> None:
+    if isinstance(node, dict) and len(node) == 1 and isinstance(node.get('AND', node.get('OR')), list):
+        kind = NODE_AND if 'AND' in node else NODE_OR
+        children = node['AND'] if kind == NODE_AND else node['OR']
+        first_child = len(nodes)
+        nodes.extend([None] * len(children))
+        nodes[position] = (kind, first_child, len(children), 0)
+        for offset, child in enumerate(children):
+            _encode_node(child, first_child + offset, strings, nodes)
+    elif isinstance(node, dict) and node.keys() == _LEAF_KEYS and isinstance(node['field'], str) and isinstance(node['operator'], str):
+        nodes[position] = (NODE_LEAF, strings.add(node['field']), strings.add(node['operator']), strings.add_json(node['value']))
+    else:
+        nodes[position] = (NODE_JSON, strings.add_json(node), 0, 0)
+
+
+def encode_snapshot(version: int, entries: Iterable[Sequence[Any]]) -> bytes:
+    # entries are (id, name, condition, updated_at) rows, such as RuleEntry
+    strings = _StringTable()
+    nodes: List[Tuple[int, int, int, int]] = []
+    rules = []
+    for rule_id, name, condition, updated_at in entries:
+        if isinstance(condition, dict) and condition_depth(condition) <= MAX_NESTING_DEPTH:
+            root = _encode_condition(condition, strings, nodes)
+        else:
+            root = len(nodes)
+            nodes.append((NODE_JSON, strings.add_json(condition), 0, 0))
+        rules.append((rule_id, strings.add(name), root, strings.add(updated_at.isoformat())))
+    values = list(strings.ids)
+    names = sorted(range(len(rules)), key=lambda position: values[rules[position][1]])
+
+    blob = bytearray()
+    offsets = [0]
+    for value in values:
+        blob += value.encode()
+        offsets.append(len(blob))
+
+    parts = [_HEADER.pack(MAGIC, FORMAT_VERSION, 0, version, len(strings.ids), len(nodes), len(rules))]
+    parts.append(struct.pack(f'<{len(offsets)}I', *offsets))
+    parts.append(bytes(blob))
+    parts.extend(_NODE.pack(*node) for node in nodes)
+    parts.extend(_RULE.pack(*rule) for rule in rules)
+    parts.append(struct.pack(f'<{len(names)}I', *names))
+    return b''.join(parts)
+
+
+def write_snapshot(path: str, version: int, entries: Iterable[Sequence[Any]]) -> None:
+    # Written to a temporary file and renamed over the old one, so readers
+    # either map the previous snapshot or the complete new one
+    data = encode_snapshot(version, entries)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.ruleset-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class SnapshotReader:
+    # Reads an encoded ruleset snapshot in place. Rules are decoded on demand,
+    # with field paths and operators interned.
+    def __init__(self, buffer: Any):
+        magic, format_version, _, self.version, string_count, node_count, rule_count = _HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError("Not a ruleset snapshot")
+
+        self._buffer = buffer
+        self._node_count = node_count
+        self._rule_count = rule_count
+        self._offsets_at = _HEADER.size
+        self._blob_at = self._offsets_at + _OFFSET.size * (string_count + 1)
+        blob_size = _OFFSET.unpack_from(self._buffer, self._offsets_at + _OFFSET.size * string_count)[0]
+        self._nodes_at = self._blob_at + blob_size
+        self._rules_at = self._nodes_at + _NODE.size * node_count
+        self._names_at = self._rules_at + _RULE.size * rule_count
+
+    def __len__(self) -> int:
+        return self._rule_count
+
+    def string(self, string_id: int) -> str:
+        start, end = struct.unpack_from('<II', self._buffer, self._offsets_at + _OFFSET.size * string_id)
+        return self._buffer[self._blob_at + start:self._blob_at + end].decode()
+
+    def name(self, position: int) -> str:
+        return self.string(_RULE.unpack_from(self._buffer, self._rules_at + _RULE.size * position)[1])
+
+    def find(self, name: str) -> Optional[int]:
+        low, high = 0, self._rule_count
+        while low < high:
+            middle = (low + high) // 2
+            position = _OFFSET.unpack_from(self._buffer, self._names_at + _OFFSET.size * middle)[0]
+            found = self.name(position)
+            if found == name:
+                return position
+            if found < name:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def entry(self, position: int) -> Tuple[int, str, Any, datetime]:
+        rule_id, name_id, root, updated_at_id = _RULE.unpack_from(self._buffer, self._rules_at + _RULE.size * position)
+        return rule_id, self.string(name_id), self._node(root), datetime.fromisoformat(self.string(updated_at_id))
+
+    def _node(self, index: int) -> Any:
+        kind, a, b, c = _NODE.unpack_from(self._buffer, self._nodes_at + _NODE.size * index)
+        if kind == NODE_LEAF:
+            return {'field': sys.intern(self.string(a)), 'operator': sys.intern(self.string(b)), 'value': json.loads(self.string(c))}
+        if kind == NODE_JSON:
+            return json.loads(self.string(a))
+        return {'AND' if kind == NODE_AND else 'OR': [self._node(child) for child in range(a, a + b)]}
+
+    def stats(self) -> Dict[str, int]:
+        leaves = json_nodes = 0
+        fields = set()
+        constants = set()
+        for kind, a, _, c in _NODE.iter_unpack(self._buffer[self._nodes_at:self._rules_at]):
+            if kind == NODE_LEAF:
+                leaves += 1
+                fields.add(a)
+                constants.add(c)
+            elif kind == NODE_JSON:
+                json_nodes += 1
+        return {
+            'rules': self._rule_count,
+            'nodes': self._node_count,
+            'leaves': leaves,
+            'json_nodes': json_nodes,
+            'distinct_fields': len(fields),
+            'distinct_constants': len(constants),
+            'bytes': len(self._buffer)
+        }
+
+
+class SnapshotFile(SnapshotReader):
+    # A snapshot file mapped read-only. Its pages are shared between every
+    # process mapping the same file.
+    def __init__(self, path: str):
+        with open(path, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            super().__init__(buffer)
+        except ValueError:
+            buffer.close()
+            raise ValueError(f"{path} is not a ruleset snapshot file")
+
+    def close(self) -> None:
+        self._buffer.close()
+
+
+def read_version(path: str) -> Optional[int]:
+    try:
+        with open(path, 'rb') as file:
+            header = file.read(_HEADER.size)
+    except OSError:
+        return None
+    if len(header) < _HEADER.size:
+        return None
+    magic, format_version, _, version, _, _, _ = _HEADER.unpack(header)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        return None
+    return version
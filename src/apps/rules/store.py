@@ -0,0 +1,346 @@
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Generic, Iterable, List, NamedTuple, Optional, Tuple, TypeVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.core.cache import LRUCache, is_shared_cache
+from apps.core.exceptions import RuleNotFoundError, RulesetVersionNotFoundError
+from .invalidation import InvalidationListener
+from .models import Rule, RulesetSnapshot
+from .snapshot_file import SnapshotFile, SnapshotReader, encode_snapshot, read_version, write_snapshot
+
+T = TypeVar('T')
+
+
+class RuleEntry(NamedTuple):
+    id: int
+    name: str
+    condition: Dict[str, Any]
+    updated_at: datetime
+
+    @property
+    def version(self):
+        return (self.id, self.updated_at)
+
+    @classmethod
+    def from_rule(cls, rule: Rule) -> 'RuleEntry':
+        # Rules saved before the optimizer existed have no optimized form yet
+        condition = rule.optimized_condition if rule.optimized_condition is not None else rule.condition
+        return cls(rule.id, rule.name, condition, rule.updated_at)
+
+
+class Ruleset:
+    # The active rules at one ruleset version. Immutable, so it can be shared
+    # between requests and pinned by evaluations that must not see later writes.
+    __slots__ = ('version', 'entries', '_by_name')
+
+    def __init__(self, version: int, entries: Tuple[RuleEntry, ...]):
+        self.version = version
+        self.entries = entries
+        self._by_name = {entry.name: entry for entry in entries}
+
+    @classmethod
+    def from_snapshot(cls, snapshot: RulesetSnapshot) -> 'Ruleset':
+        return cls(snapshot.version, tuple(
+            RuleEntry(rule['id'], rule['name'], rule['condition'], datetime.fromisoformat(rule['updated_at']))
+            for rule in snapshot.rules
+        ))
+
+    def get_many(self, names: Iterable[str]) -> List[RuleEntry]:
+        entries = [self._by_name.get(name) for name in dict.fromkeys(names)]
+        if any(entry is None for entry in entries):
+            raise RuleNotFoundError
+        return entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class MappedRuleset(Ruleset):
+    # A ruleset read in place from an encoded snapshot: a memory-mapped file
+    # shared with other processes, or a compact in-memory buffer. Only the
+    # rules that are looked up by name stay decoded; the full entries are
+    # decoded afresh each time they're asked for, so structures built over
+    # the whole ruleset don't keep a second copy of every condition alive.
+    __slots__ = ('snapshot',)
+
+    def __init__(self, snapshot: SnapshotReader):
+        self.version = snapshot.version
+        self.snapshot = snapshot
+        self._by_name: Dict[str, RuleEntry] = {}
+
+    @property
+    def entries(self) -> Tuple[RuleEntry, ...]:
+        return tuple(self._decode(position, keep=False) for position in range(len(self.snapshot)))
+
+    def get_many(self, names: Iterable[str]) -> List[RuleEntry]:
+        entries = []
+        for name in dict.fromkeys(names):
+            entry = self._by_name.get(name)
+            if entry is None:
+                position = self.snapshot.find(name)
+                if position is None:
+                    raise RuleNotFoundError
+                entry = self._decode(position)
+            entries.append(entry)
+        return entries
+
+    def _decode(self, position: int, keep: bool = True) -> RuleEntry:
+        entry = self._by_name.get(self.snapshot.name(position))
+        if entry is None:
+            entry = RuleEntry(*self.snapshot.entry(position))
+            if keep:
+                self._by_name[entry.name] = entry
+        return entry
+
+    def __len__(self) -> int:
+        return len(self.snapshot)
+
+
+class RuleStore:
+    # Shared counter other processes compare against to notice rule changes.
+    # It only says that something changed; the ruleset version itself comes
+    # from the latest RulesetSnapshot.
+    VERSION_CACHE_KEY = 'rules:store:version'
+    # The current ruleset shared between processes, scoped to the counter value it was read at
+    RULESET_CACHE_KEY = 'rules:store:ruleset:{shared_version}'
+
+    def __init__(self, max_versions: int = 8, version_check_interval: float = 1.0, shared_ruleset_timeout: Optional[float] = 3600, listener_url: str = '', listener_channel: str = 'rules:store:invalidate', snapshot_path: str = '', compact: bool = False, shared_cache: bool = True):
+        self.version_check_interval = version_check_interval
+        # Whether the Django cache, and so the version counter, is seen by
+        # every process. A per-process cache only ever holds our own changes,
+        # so other processes' are noticed from the latest snapshot instead.
+        self.shared_cache = shared_cache
+        self.shared_ruleset_timeout = shared_ruleset_timeout
+        # When set, the current ruleset is read from a memory-mapped snapshot
+        # file at this path, shared by every process on the host, instead of
+        # being held in full by each of them
+        self.snapshot_path = snapshot_path
+        # Holds rulesets encoded in the compact snapshot format rather than
+        # as decoded rule conditions
+        self.compact = compact
+        # Pushes invalidations from other processes over Redis pub/sub; while it
+        # is connected the shared version doesn't need polling
+        self.listener = InvalidationListener(listener_url, listener_channel, self._on_invalidation) if listener_url else None
+        self._current: Optional[Ruleset] = None
+        # Recently used rulesets by version, including ones pinned by queued evaluations
+        self._rulesets: LRUCache[Ruleset] = LRUCache(max_versions)
+        self._generation = 0
+        self._shared_version = None
+        # Checked on first use, whatever the monotonic clock's starting point
+        self._version_checked_at = float('-inf')
+        self._lock = threading.Lock()
+
+    def get_ruleset(self, version: Optional[int] = None) -> Ruleset:
+        if version is None:
+            return self._get_current()
+
+        ruleset = self._rulesets.get(version)
+        if ruleset is None:
+            snapshot = RulesetSnapshot.objects.filter(version=version).first()
+            if snapshot is None:
+                raise RulesetVersionNotFoundError
+            ruleset = self._compact(Ruleset.from_snapshot(snapshot))
+            self._rulesets.set(version, ruleset)
+        return ruleset
+
+    def get_many(self, names: Iterable[str]) -> List[RuleEntry]:
+        return self._get_current().get_many(names)
+
+    def get_active_rules(self) -> Tuple[RuleEntry, ...]:
+        return self._get_current().entries
+
+    def invalidate(self) -> None:
+        try:
+            try:
+                shared_version = cache.incr(self.VERSION_CACHE_KEY)
+            except ValueError:
+                self._start_version()
+                shared_version = cache.incr(self.VERSION_CACHE_KEY)
+        except Exception:
+            shared_version = None
+        # The counter moves before the clear, so nothing loaded after the clear
+        # can come from a ruleset shared under the previous value
+        self._shared_version = shared_version
+        self.clear()
+        if self.listener is not None and shared_version is not None:
+            self.listener.publish(shared_version)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._current = None
+            self._rulesets.clear()
+
+    def _get_current(self) -> Ruleset:
+        self._sync_version()
+        current = self._current
+        if current is None:
+            generation = self._generation
+            shared_version = self._shared_version
+            if self.snapshot_path:
+                current = self._load_mapped()
+            else:
+                current = self._load_shared(shared_version)
+                if current is None:
+                    current = self._load_snapshot()
+                    self._store_shared(current, shared_version)
+                current = self._compact(current)
+
+            with self._lock:
+                # Skip caching if the store was invalidated while loading
+                if generation == self._generation:
+                    self._current = current
+                    self._rulesets.set(current.version, current)
+        return current
+
+    def _load_snapshot(self, version: Optional[int] = None) -> Ruleset:
+        snapshots = RulesetSnapshot.objects.order_by('-version')
+        snapshot = (snapshots.filter(version=version) if version is not None else snapshots).first()
+        return Ruleset.from_snapshot(snapshot) if snapshot is not None else Ruleset(0, ())
+
+    def _load_mapped(self) -> Ruleset:
+        version = RulesetSnapshot.objects.order_by('-version').values_list('version', flat=True).first()
+        if version is None:
+            return Ruleset(0, ())
+        try:
+            file_version = read_version(self.snapshot_path)
+            if file_version is None or file_version < version:
+                # The first process to see a new version writes the file;
+                # the rest only map it. A file that is already newer is left
+                # alone, so a slow writer can't replace it with an older one.
+                ruleset = self._load_snapshot(version)
+                write_snapshot(self.snapshot_path, ruleset.version, ruleset.entries)
+            snapshot = SnapshotFile(self.snapshot_path)
+            if snapshot.version != version:
+                # Replaced by another version since the check above, or newer
+                # than what we read; either way not the version to cache
+                snapshot.close()
+                return self._compact(self._load_snapshot(version))
+            return MappedRuleset(snapshot)
+        except (OSError, ValueError):
+            # Without a usable file this process holds the ruleset itself
+            return self._compact(self._load_snapshot(version))
+
+    def _compact(self, ruleset: Ruleset) -> Ruleset:
+        if not self.compact or isinstance(ruleset, MappedRuleset):
+            return ruleset
+        return MappedRuleset(SnapshotReader(encode_snapshot(ruleset.version, ruleset.entries)))
+
+    def _load_shared(self, shared_version) -> Optional[Ruleset]:
+        if shared_version is None:
+            return None
+        try:
+            cached = cache.get(self.RULESET_CACHE_KEY.format(shared_version=shared_version))
+        except Exception:
+            return None
+        if cached is None:
+            return None
+        version, entries = cached
+        return Ruleset(version, tuple(RuleEntry(*entry) for entry in entries))
+
+    def _store_shared(self, ruleset: Ruleset, shared_version) -> None:
+        if shared_version is None:
+            return
+        try:
+            cache.set(
+                self.RULESET_CACHE_KEY.format(shared_version=shared_version),
+                (ruleset.version, [tuple(entry) for entry in ruleset.entries]),
+                timeout=self.shared_ruleset_timeout
+            )
+        except Exception:
+            pass
+
+    def _start_version(self) -> None:
+        # Started from the clock rather than 1: if the counter is evicted, a
+        # restarted one must not reuse values still keying shared rulesets
+        cache.add(self.VERSION_CACHE_KEY, time.time_ns() // 1000, timeout=None)
+
+    def _on_invalidation(self, message: Optional[bytes]) -> None:
+        try:
+            shared_version = int(message) if message is not None else cache.get(self.VERSION_CACHE_KEY)
+        except Exception:
+            shared_version = None
+        current = self._shared_version
+        if shared_version is not None and current is not None and shared_version <= current:
+            # Our own or an out-of-date notification; we're already at that version
+            return
+        self._shared_version = shared_version
+        self.clear()
+        self._version_checked_at = time.monotonic()
+
+    def _sync_version(self) -> None:
+        if self.listener is not None:
+            self.listener.start()
+            if self.listener.connected:
+                return
+
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+        self._version_checked_at = now
+
+        if not self.shared_cache:
+            self._sync_snapshot_version()
+            return
+
+        try:
+            shared_version = cache.get(self.VERSION_CACHE_KEY)
+            if shared_version is None:
+                # Start the counter so the ruleset can be shared before the first rule write
+                self._start_version()
+                shared_version = cache.get(self.VERSION_CACHE_KEY)
+        except Exception:
+            # Without the shared counter we can't tell whether we're stale
+            self._shared_version = None
+            self.clear()
+            return
+
+        if shared_version != self._shared_version:
+            self._shared_version = shared_version
+            self.clear()
+
+    def _sync_snapshot_version(self) -> None:
+        # One indexed query per check interval; every rule write captures a
+        # new snapshot, so a different latest version means we're stale
+        current = self._current
+        if current is None:
+            return
+        latest = RulesetSnapshot.objects.order_by('-version').values_list('version', flat=True).first()
+        if (latest or 0) != current.version:
+            self.clear()
+
+    def __len__(self) -> int:
+        return len(self._rulesets)
+
+
+class RulesetCache(Generic[T]):
+    # Holds one structure built over the whole active ruleset. It is keyed on
+    # the identity of the store's current Ruleset, which is replaced whenever
+    # a rule changes.
+    def __init__(self, builder: Callable[[Tuple[RuleEntry, ...]], T]):
+        self._builder = builder
+        self._ruleset: Optional[Ruleset] = None
+        self._value: Optional[T] = None
+        self._lock = threading.Lock()
+
+    def get(self, ruleset: Ruleset) -> T:
+        with self._lock:
+            if ruleset is not self._ruleset:
+                self._value = self._builder(ruleset.entries)
+                self._ruleset = ruleset
+            return self._value
+
+
+rule_store = RuleStore(
+    max_versions=getattr(settings, 'RULE_STORE_MAX_VERSIONS', 8),
+    version_check_interval=getattr(settings, 'RULE_STORE_VERSION_CHECK_INTERVAL', 1.0),
+    shared_ruleset_timeout=getattr(settings, 'RULE_STORE_SHARED_RULESET_TIMEOUT', 3600),
+    listener_url=getattr(settings, 'RULE_STORE_PUBSUB_URL', ''),
+    snapshot_path=getattr(settings, 'RULE_STORE_SNAPSHOT_PATH', ''),
+    compact=getattr(settings, 'RULE_STORE_COMPACT', False),
+    shared_cache=is_shared_cache(),
+)
@@ -1,31 +1,40 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from celery import shared_task
 
-from apps.core.exceptions import RuleNotFoundError
-from .services import RuleService, RuleEvaluation
+from apps.core.exceptions import RuleNotFoundError, RulesetVersionNotFoundError
+from apps.core.metrics import StageTimer
+from .metrics import ERRORS_TOTAL, REQUEST_SECONDS, RULE_NOT_FOUND_TOTAL, STAGE_SECONDS
+from .services import RuleService, ENGINE_COMPILED, MODE_FULL
 
 
 @shared_task
-def evaluate_rules_async(rule_names: List[str], payload: Dict[str, Any]) -> Dict[str, Any]:
+def evaluate_rules_async(rule_names: List[str], payload: Dict[str, Any], mode: str = MODE_FULL, cheapest_first: bool = False, engine: str = ENGINE_COMPILED, ruleset_version: Optional[int] = None) -> Dict[str, Any]:
     rule_service = RuleService()
+    # Recorded in the worker process; /metrics adds up what workers publish
+    timer = StageTimer(STAGE_SECONDS, 'evaluate_rules_async')
     
     try:
-        rule_conditions = rule_service.get_rules_by_names(rule_names)
-        evaluation_result = RuleEvaluation.evaluate_rules(rule_conditions, payload)
+        evaluation_result = rule_service.evaluate(rule_names, payload, mode, cheapest_first, engine, ruleset_version, timer)
         result = "APPROVED" if not evaluation_result['failed_rules'] else "REJECTED"
         return {
             'result': result,
             'passed_rules': evaluation_result['passed_rules'],
             'failed_rules': evaluation_result['failed_rules'],
+            'ruleset_version': evaluation_result['ruleset_version'],
             'status': 'success'
         }
-    except RuleNotFoundError as e:
+    except (RuleNotFoundError, RulesetVersionNotFoundError) as e:
+        if isinstance(e, RuleNotFoundError):
+            RULE_NOT_FOUND_TOTAL.inc(timer.name)
         return {
             'status': 'error',
             'error': str(e)
         }
     except Exception as e:
+        ERRORS_TOTAL.inc(timer.name)
         return {
             'status': 'error',
             'error': f"An unexpected error occurred: {str(e)}"
         }
+    finally:
+        REQUEST_SECONDS.observe(timer.elapsed(), timer.name)
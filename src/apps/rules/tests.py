@@ -3,7 +3,46 @@ from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
 
+import json
+import os
+import sys
+import tempfile
+import threading
+
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from unittest import mock, skipUnless
+
+from django.db.models import QuerySet
+from django.test import override_settings
+from django.utils import timezone
+
+from apps.core import fastjson, messagepack
+from apps.core.exceptions import RuleNotFoundError, RulesetVersionNotFoundError
+from apps.core.metrics import MetricsRegistry, StageTimer, registry as metrics_registry
+from apps.rules.accessor import MISSING, PayloadAccessor
+from apps.rules.adaptive import AdaptiveRule, adaptive_rule_cache
+from apps.rules.evaluator import MAX_NESTING_DEPTH, condition_depth
+from apps.rules.footprint import deep_sizeof, ruleset_footprint
+from apps.rules.codegen import compile_rule, generate_source
+from apps.rules.compiler import CompiledRules, compile_condition, compiled_rule_cache, condition_cost
+from apps.rules.index import PredicateIndex
+from apps.rules.metrics import ERRORS_TOTAL, REQUEST_SECONDS, RESULT_CACHE_TOTAL, RULE_NOT_FOUND_TOTAL, RULE_SECONDS, STAGE_SECONDS, sample_rule_latency
+from apps.rules.invalidation import InvalidationListener
+from apps.rules.models import Rule, RulesetSnapshot, validate_condition_json
+from apps.rules.network import RuleNetwork
+from apps.rules.optimizer import ALWAYS_FALSE, ALWAYS_TRUE, optimize_condition
+from apps.rules.profiling import profile_limiter
+from apps.rules.result_cache import evaluation_result_cache, referenced_fields
+from apps.rules.ruleset import CompiledRuleset, compile_ruleset, ruleset_cache
+from apps.rules.snapshot_file import SnapshotFile, read_version, write_snapshot
+from apps.rules.store import MappedRuleset, RuleEntry, RuleStore, rule_store
+from apps.rules import vectorized
 from apps.rules.services import RuleService, RuleEvaluation
+from apps.rules.tasks import evaluate_rules_async
 
 User = get_user_model()
 evaluate_condition = RuleEvaluation.evaluate_condition
@@ -670,3 +709,1647 @@ class ComplexRuleAPITests(TestCase):
         response = self.api_client.post(self.evaluate_url, evaluation_data, format='json')
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
         self.assertIn('Rule was not found.', response.data.get('detail', ''))
+
+
+class CompiledRuleTests(TestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            email='admin1@gmail.com',
+            password='password123',
+            role='admin'
+        )
+        self.rule_servie = RuleService()
+        compiled_rule_cache.clear()
+
+    def test_compiled_condition_matches_interpreter(self):
+        condition = {
+            "AND": [
+                {"field": "user.age", "operator": ">=", "value": 18},
+                {
+                    "OR": [
+                        {"field": "user.subscription", "operator": "==", "value": "premium"},
+                        {"field": "user.tags", "operator": "contains", "value": "vip"},
+                        {"field": "user.score", "operator": ">", "value": "not-a-number"}
+                    ]
+                },
+                {"field": "country", "operator": "!=", "value": "Japan"}
+            ]
+        }
+        payloads = [
+            {"user": {"age": 25, "subscription": "premium"}, "country": "Thailand"},
+            {"user": {"age": 25, "subscription": "basic", "tags": ["vip"]}, "country": "Thailand"},
+            {"user": {"age": 25, "subscription": "basic", "score": 10}, "country": "Thailand"},
+            {"user": {"age": 17, "subscription": "premium"}, "country": "Thailand"},
+            {"user": {"age": 25, "subscription": "premium"}, "country": "Japan"},
+            {"user": {"age": 25, "subscription": "premium"}},
+            {"user": "not-a-dict"},
+            {},
+        ]
+        predicate = compile_condition(condition)
+        for payload in payloads:
+            self.assertEqual(bool(predicate(payload)), evaluate_condition(condition, payload))
+
+        # Incomplete and unknown-operator leaves never pass
+        self.assertFalse(compile_condition({"field": "age", "operator": "==", "value": None})({"age": None}))
+        self.assertFalse(compile_condition({"field": "age", "operator": "~", "value": 1})({"age": 1}))
+
+    def test_compiled_rules_are_cached_by_rule_version(self):
+        rule = self.rule_servie.create(
+            name="Age Check",
+            condition={"field": "age", "operator": ">=", "value": 18},
+            created_by=self.admin_user
+        )
+
+        first = self.rule_servie.get_compiled_rules_by_names(["Age Check"])
+        second = self.rule_servie.get_compiled_rules_by_names(["Age Check"])
+        self.assertIs(first[0][1], second[0][1])
+        self.assertTrue(first[0][1]({"age": 20}))
+
+        # Updating the rule bumps updated_at and produces a fresh predicate
+        rule.condition = {"field": "age", "operator": ">=", "value": 21}
+        rule.save()
+        updated = self.rule_servie.get_compiled_rules_by_names(["Age Check"])
+        self.assertIsNot(first[0][1], updated[0][1])
+        self.assertFalse(updated[0][1]({"age": 20}))
+
+        result = RuleEvaluation.evaluate_compiled_rules(updated, {"age": 25})
+        self.assertEqual(result, {"passed_rules": ["Age Check"], "failed_rules": []})
+
+
+class RuleStoreTests(TestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            email='admin1@gmail.com',
+            password='password123',
+            role='admin'
+        )
+        self.rule_servie = RuleService()
+        rule_store.clear()
+
+    def test_lookups_are_served_without_db_queries(self):
+        self.rule_servie.create(
+            name="Age Check",
+            condition={"field": "age", "operator": ">=", "value": 18},
+            created_by=self.admin_user
+        )
+        self.rule_servie.get_rules_by_names(["Age Check"])
+
+        with self.assertNumQueries(0):
+            rule_conditions = self.rule_servie.get_rules_by_names(["Age Check", "Age Check"])
+        self.assertEqual(rule_conditions, [("Age Check", {"field": "age", "operator": ">=", "value": 18})])
+
+    def test_unknown_and_inactive_rules_raise(self):
+        self.rule_servie.create(
+            name="Inactive Rule",
+            condition={"field": "status", "operator": "==", "value": "active"},
+            created_by=self.admin_user,
+            is_active=False
+        )
+        for _ in range(2):
+            with self.assertRaises(RuleNotFoundError):
+                self.rule_servie.get_rules_by_names(["Inactive Rule"])
+            with self.assertRaises(RuleNotFoundError):
+                self.rule_servie.get_rules_by_names(["Non-existent Rule"])
+
+        # Activating the rule invalidates the cached miss
+        rule = self.rule_servie.find(name="Inactive Rule")
+        rule.is_active = True
+        rule.save()
+        self.assertEqual(len(self.rule_servie.get_rules_by_names(["Inactive Rule"])), 1)
+
+        rule.delete()
+        with self.assertRaises(RuleNotFoundError):
+            self.rule_servie.get_rules_by_names(["Inactive Rule"])
+
+    def test_shared_version_change_clears_other_stores(self):
+        rule = self.rule_servie.create(
+            name="Age Check",
+            condition={"field": "age", "operator": ">=", "value": 18},
+            created_by=self.admin_user
+        )
+        other_store = RuleStore(version_check_interval=0)
+        other_store.get_many(["Age Check"])
+
+        # Simulate a write made by another process: the DB changes and the
+        # shared version moves, but nothing is invalidated in this process
+        condition = {"field": "age", "operator": ">=", "value": 21}
+        QuerySet.update(type(rule).objects.filter(pk=rule.pk), condition=condition, optimized_condition=condition)
+        RulesetSnapshot.capture()
+        with self.assertNumQueries(0):
+            self.assertEqual(other_store.get_many(["Age Check"])[0].condition["value"], 18)
+
+        cache.set(RuleStore.VERSION_CACHE_KEY, (cache.get(RuleStore.VERSION_CACHE_KEY) or 0) + 1, timeout=None)
+        self.assertEqual(other_store.get_many(["Age Check"])[0].condition["value"], 21)
+
+    def test_store_without_shared_cache_checks_the_latest_snapshot(self):
+        rule = self.rule_servie.create(
+            name="Age Check",
+            condition={"field": "age", "operator": ">=", "value": 18},
+            created_by=self.admin_user
+        )
+        other_store = RuleStore(version_check_interval=0, shared_cache=False)
+        other_store.get_many(["Age Check"])
+
+        # Another process's write never reaches this process's cache
+        condition = {"field": "age", "operator": ">=", "value": 21}
+        QuerySet.update(type(rule).objects.filter(pk=rule.pk), condition=condition, optimized_condition=condition)
+        with self.assertNumQueries(1):
+            self.assertEqual(other_store.get_many(["Age Check"])[0].condition["value"], 18)
+        RulesetSnapshot.capture()
+        self.assertEqual(other_store.get_many(["Age Check"])[0].condition["value"], 21)
+
+    def test_entries_are_shared_between_stores(self):
+        self.rule_servie.create(
+            name="Age Check",
+            condition={"field": "age", "operator": ">=", "value": 18},
+            created_by=self.admin_user
+        )
+        RuleStore(version_check_interval=0).get_many(["Age Check"])
+        with self.assertRaises(RuleNotFoundError):
+            RuleStore(version_check_interval=0).get_many(["Unknown Rule"])
+
+        # A store in another process finds both the entry and the miss in the shared cache
+        with self.assertNumQueries(0):
+            other_store = RuleStore(version_check_interval=0)
+            self.assertEqual(other_store.get_many(["Age Check"])[0].condition["value"], 18)
+            with self.assertRaises(RuleNotFoundError):
+                other_store.get_many(["Unknown Rule"])
+
+    def test_invalidation_messages(self):
+        rule = self.rule_servie.create(
+            name="Age Check",
+            condition={"field": "age", "operator": ">=", "value": 18},
+            created_by=self.admin_user
+        )
+        other_store = RuleStore(version_check_interval=3600)
+        other_store.get_many(["Age Check"])
+        version = other_store._shared_version
+
+        type(rule).objects.filter(pk=rule.pk).update(condition={"field": "age", "operator": ">=", "value": 21})
+        other_store._on_invalidation(str(version).encode())
+        self.assertEqual(len(other_store), 1)
+
+        cache.set(RuleStore.VERSION_CACHE_KEY, version + 1, timeout=None)
+        other_store._on_invalidation(str(version + 1).encode())
+        self.assertEqual(len(other_store), 0)
+        self.assertEqual(other_store.get_many(["Age Check"])[0].condition["value"], 21)
+
+    def test_listener_subscribes_and_publishes(self):
+        received = []
+        done = threading.Event()
+        fake_redis = mock.Mock()
+        fake_redis.pubsub.return_value.listen.return_value = iter([
+            {'type': 'subscribe', 'data': 1},
+            {'type': 'message', 'data': b'7'}
+        ])
+
+        def on_message(message):
+            received.append(message)
+            if message is not None:
+                done.set()
+
+        with mock.patch('redis.Redis.from_url', return_value=fake_redis):
+            listener = InvalidationListener('redis://example', 'rules:test', on_message, reconnect_delay=3600)
+            listener.start()
+            self.assertTrue(done.wait(5))
+            listener.publish(8)
+
+        self.assertEqual(received, [None, b'7'])
+        fake_redis.pubsub.return_value.subscribe.assert_called_once_with('rules:test')
+        fake_redis.publish.assert_called_once_with('rules:test', '8')
+
+
+class BatchEvaluationAPITests(TestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            email='admin1@gmail.com',
+            password='password123',
+            role='admin'
+        )
+        self.client_user = User.objects.create_user(
+            email='client1@gmail.com',
+            password='password123',
+            role='client'
+        )
+        self.rule_servie = RuleService()
+        self.rule_servie.create(
+            name="Age Check",
+            condition={"field": "applicant.age", "operator": ">=", "value": 18},
+            created_by=self.admin_user
+        )
+        self.rule_servie.create(
+            name="Country Check",
+            condition={"field": "applicant.country", "operator": "==", "value": "Thailand"},
+            created_by=self.admin_user
+        )
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.client_user)
+        self.batch_url = '/api/rule-evaluation/evaluate_batch/'
+
+    def test_evaluate_batch(self):
+        evaluation_data = {
+            "rules": ["Age Check", "Country Check"],
+            "payloads": [
+                {"id": "a-1", "payload": {"applicant": {"age": 30, "country": "Thailand"}}},
+                {"id": "a-2", "payload": {"applicant": {"age": 16, "country": "Thailand"}}},
+                {"payload": {"applicant": {"age": 16, "country": "Japan"}}}
+            ]
+        }
+        response = self.api_client.post(self.batch_url, evaluation_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [
+            {"id": "a-1", "result": "APPROVED", "passed_rules": ["Age Check", "Country Check"], "failed_rules": []},
+            {"id": "a-2", "result": "REJECTED", "passed_rules": ["Country Check"], "failed_rules": ["Age Check"]},
+            {"result": "REJECTED", "passed_rules": [], "failed_rules": ["Age Check", "Country Check"]}
+        ])
+
+    @skipUnless(vectorized.is_available(), "NumPy is not installed")
+    def test_evaluate_batch_vectorized_engine(self):
+        payloads = [
+            {"id": "a-1", "payload": {"applicant": {"age": 30, "country": "Thailand"}}},
+            {"id": "a-2", "payload": {"applicant": {"age": "30", "country": ["Thailand"]}}},
+            {"id": "a-3", "payload": {"applicant": {"country": "Thailand"}}},
+            {"id": "a-4", "payload": {"applicant": None}}
+        ]
+        responses = [
+            self.api_client.post(self.batch_url, {"rules": ["Age Check", "Country Check"], "payloads": payloads, "engine": engine}, format='json')
+            for engine in ("compiled", "vectorized")
+        ]
+        self.assertEqual(responses[1].status_code, status.HTTP_200_OK)
+        self.assertEqual(responses[0].data, responses[1].data)
+        self.assertEqual(responses[1].data['results'][0]['result'], 'APPROVED')
+
+        response = self.api_client.post(self.batch_url, {"rules": ["Age Check"], "payloads": payloads, "engine": "unknown"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_evaluate_batch_unknown_rule(self):
+        evaluation_data = {
+            "rules": ["Age Check", "Non-existent Rule"],
+            "payloads": [{"payload": {"applicant": {"age": 30}}}]
+        }
+        response = self.api_client.post(self.batch_url, evaluation_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(RULE_EVALUATION_BATCH_MAX_SIZE=2)
+    def test_evaluate_batch_size_limit(self):
+        evaluation_data = {
+            "rules": ["Age Check"],
+            "payloads": [{"payload": {"applicant": {"age": age}}} for age in (17, 18, 19)]
+        }
+        response = self.api_client.post(self.batch_url, evaluation_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('payloads', response.data)
+
+    def test_evaluate_stream(self):
+        lines = [
+            json.dumps({"id": "a-1", "payload": {"applicant": {"age": 30, "country": "Thailand"}}}),
+            "",
+            "not json",
+            json.dumps({"applicant": {"age": 30}}),
+            json.dumps({"payload": {"applicant": {"age": 16, "country": "Thailand"}}}),
+        ]
+        response = self.api_client.post(
+            '/api/rule-evaluation/evaluate_stream/?rules=Age%20Check&rules=Country%20Check',
+            data='\n'.join(lines) + '\n',
+            content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        results = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(results, [
+            {"id": "a-1", "result": "APPROVED", "passed_rules": ["Age Check", "Country Check"], "failed_rules": []},
+            {"line": 3, "error": "Invalid JSON"},
+            {"line": 4, "error": 'Each line must be an object with a "payload" key'},
+            {"result": "REJECTED", "passed_rules": ["Country Check"], "failed_rules": ["Age Check"]}
+        ])
+
+    def test_evaluate_stream_uses_fast_json(self):
+        lines = [
+            '{"payload": {"applicant": {"age": NaN, "country": "Thailand"}}}',
+            json.dumps({"payload": {"applicant": {"age": 30, "country": "Thailand"}}}),
+        ]
+        response = self.api_client.post(
+            '/api/rule-evaluation/evaluate_stream/?rules=Age%20Check',
+            data='\n'.join(lines) + '\n',
+            content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), (
+            b'{"line":1,"error":"Invalid JSON"}\n'
+            b'{"result":"APPROVED","passed_rules":["Age Check"],"failed_rules":[]}\n'
+        ))
+
+    def test_stream_evaluates_the_resolved_ruleset(self):
+        ruleset = self.rule_servie.get_ruleset()
+        rule_entries = self.rule_servie.get_rule_entries_by_names(["Age Check"], ruleset)
+
+        def lines():
+            yield json.dumps({"payload": {"applicant": {"age": 30}}}).encode()
+            # Renamed while the stream is being read
+            rule = self.rule_servie.get_by_name("Age Check")
+            rule.name = "Adult Check"
+            rule.save()
+            yield json.dumps({"payload": {"applicant": {"age": 10}}}).encode()
+
+        for engine in ('compiled', 'network'):
+            results = list(RuleEvaluation.evaluate_stream(rule_entries, lines(), engine, chunk_size=1, ruleset=ruleset))
+            self.assertEqual([result['passed_rules'] for result in results], [["Age Check"], []], engine)
+            self.rule_servie.get_by_name("Adult Check").delete()
+            self.rule_servie.create(name="Age Check", condition=rule_entries[0].condition, created_by=self.admin_user)
+
+    def test_evaluate_stream_requires_known_rules(self):
+        url = '/api/rule-evaluation/evaluate_stream/'
+        response = self.api_client.post(url, data='{}', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.api_client.post(url + '?rules=Missing', data='{}', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@skipUnless(vectorized.is_available(), "NumPy is not installed")
+class VectorizedEvaluationTests(TestCase):
+
+    def test_matches_interpreter(self):
+        rule_conditions = [
+            ("Numeric", {"AND": [
+                {"field": "user.age", "operator": ">=", "value": 18},
+                {"field": "user.score", "operator": "<", "value": 99.5}
+            ]}),
+            ("Strings", {"OR": [
+                {"field": "user.country", "operator": "==", "value": "Thailand"},
+                {"field": "user.email", "operator": "contains", "value": "gmail"},
+                {"field": "user.version", "operator": ">=", "value": "2.0.0"}
+            ]}),
+            ("Mismatches", {"AND": [
+                {"field": "user.country", "operator": "!=", "value": 5},
+                {"field": "user.tags", "operator": "contains", "value": "vip"}
+            ]}),
+            ("Empty AND", {"AND": []}),
+            ("Invalid Leaf", {"field": "user.age", "operator": "~", "value": 1})
+        ]
+        payloads = [
+            {"user": {"age": 30, "score": 10, "country": "Thailand", "tags": ["vip"], "version": "2.5.0"}},
+            {"user": {"age": "30", "score": None, "country": 5, "email": "a@gmail.com", "tags": {"vip": 1}}},
+            {"user": {"age": True, "score": [1], "country": ["Thailand"], "tags": "very vip", "version": 2}},
+            {"user": {"age": 2 ** 60, "score": 99.5, "email": ["gmail"]}},
+            {"user": "not-a-dict"},
+            {}
+        ]
+        expected = [evaluate_rules(rule_conditions, payload) for payload in payloads]
+        self.assertEqual(vectorized.evaluate_batch(rule_conditions, payloads), expected)
+
+    def test_int_beyond_float_range(self):
+        rule_conditions = [
+            ("Adult", {"field": "user.age", "operator": ">=", "value": 18}),
+            ("Not Ten", {"field": "user.age", "operator": "!=", "value": 10})
+        ]
+        payloads = [{"user": {"age": 10 ** 400}}, {"user": {"age": 10}}, {"user": {"age": "30"}}]
+        expected = [evaluate_rules(rule_conditions, payload) for payload in payloads]
+        self.assertEqual(vectorized.evaluate_batch(rule_conditions, payloads), expected)
+
+
+class VerdictModeTests(TestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            email='admin1@gmail.com',
+            password='password123',
+            role='admin'
+        )
+        self.client_user = User.objects.create_user(
+            email='client1@gmail.com',
+            password='password123',
+            role='client'
+        )
+        self.rule_servie = RuleService()
+        self.rule_servie.create(
+            name="Expensive Check",
+            condition={"AND": [
+                {"field": "applicant.profile.details.age", "operator": ">=", "value": 18},
+                {"field": "applicant.profile.details.country", "operator": "==", "value": "Thailand"}
+            ]},
+            created_by=self.admin_user
+        )
+        self.rule_servie.create(
+            name="Cheap Check",
+            condition={"field": "score", "operator": ">", "value": 50},
+            created_by=self.admin_user
+        )
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.client_user)
+        self.evaluate_url = '/api/rule-evaluation/evaluate/'
+
+    def test_verdict_stops_at_first_failure(self):
+        compiled_rules = self.rule_servie.get_compiled_rules_by_names(["Expensive Check", "Cheap Check"])
+        payload = {"applicant": {"profile": {"details": {"age": 17}}}, "score": 10}
+        self.assertEqual(
+            RuleEvaluation.evaluate(compiled_rules, payload, "verdict"),
+            {"passed_rules": [], "failed_rules": ["Expensive Check"]}
+        )
+        self.assertEqual(
+            RuleEvaluation.evaluate(compiled_rules, payload),
+            {"passed_rules": [], "failed_rules": ["Expensive Check", "Cheap Check"]}
+        )
+
+    def test_cheapest_first_ordering(self):
+        compiled_rules = self.rule_servie.get_compiled_rules_by_names(["Expensive Check", "Cheap Check"], cheapest_first=True)
+        self.assertEqual([rule_name for rule_name, _ in compiled_rules], ["Cheap Check", "Expensive Check"])
+
+    def test_verdict_mode_api(self):
+        evaluation_data = {
+            "rules": ["Expensive Check", "Cheap Check"],
+            "payload": {"applicant": {"profile": {"details": {"age": 30, "country": "Thailand"}}}, "score": 10},
+            "mode": "verdict",
+            "cheapest_first": True
+        }
+        response = self.api_client.post(self.evaluate_url, evaluation_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"result": "REJECTED", "passed_rules": [], "failed_rules": ["Cheap Check"], "ruleset_version": self.rule_servie.get_ruleset().version})
+
+        evaluation_data["payload"]["score"] = 90
+        response = self.api_client.post(self.evaluate_url, evaluation_data, format='json')
+        self.assertEqual(response.data["result"], "APPROVED")
+        self.assertEqual(set(response.data["passed_rules"]), {"Expensive Check", "Cheap Check"})
+
+
+class CountingPayload(dict):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reads = 0
+
+    def __getitem__(self, key):
+        self.reads += 1
+        return super().__getitem__(key)
+
+
+class RuleNetworkTests(TestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            email='admin1@gmail.com',
+            password='password123',
+            role='admin'
+        )
+        self.rule_servie = RuleService()
+        adult = {"field": "age", "operator": ">=", "value": 18}
+        employed = {"field": "status", "operator": "==", "value": "employed"}
+        self.rule_conditions = [
+            ("Adult", adult),
+            ("Employed Adult", {"AND": [adult, employed]}),
+            ("Employed Adult Reordered", {"AND": [employed, adult, adult]}),
+            ("Adult Or Student", {"OR": [adult, {"field": "student", "operator": "==", "value": True}]}),
+            ("Numeric Status", {"field": "status", "operator": "==", "value": 1}),
+        ]
+        for name, condition in self.rule_conditions:
+            self.rule_servie.create(name=name, condition=condition, created_by=self.admin_user)
+        rule_store.clear()
+
+    def test_shared_nodes(self):
+        network = self.rule_servie.get_rule_network()
+        self.assertEqual(network.stats(), {'rules': 5, 'nodes': 6, 'leaf_nodes': 4, 'shared_nodes': 2})
+        self.assertIs(network, self.rule_servie.get_rule_network())
+
+    def test_shared_leaf_evaluated_once_per_payload(self):
+        rule_names = [name for name, _ in self.rule_conditions]
+        compiled_rules = self.rule_servie.get_compiled_rules_by_names(rule_names, engine="network")
+
+        # age is read once and status once per distinct leaf, however many rules use them
+        payload = CountingPayload({"age": 30, "status": "employed"})
+        result = RuleEvaluation.evaluate_compiled_rules(compiled_rules, payload)
+        self.assertEqual(payload.reads, 3)
+        self.assertEqual(result, evaluate_rules(self.rule_conditions, payload))
+
+        for payload in ({"age": 17, "status": "employed", "student": True}, {"status": 1.0}, {}):
+            self.assertEqual(RuleEvaluation.evaluate_compiled_rules(compiled_rules, payload), evaluate_rules(self.rule_conditions, payload))
+
+    def test_network_rebuilt_on_rule_change(self):
+        network = self.rule_servie.get_rule_network()
+        rule = self.rule_servie.find(name="Adult")
+        rule.is_active = False
+        rule.save()
+
+        updated_network = self.rule_servie.get_rule_network()
+        self.assertIsNot(network, updated_network)
+        with self.assertRaises(RuleNotFoundError):
+            self.rule_servie.get_compiled_rules_by_names(["Adult"], engine="network")
+        with self.assertRaises(RuleNotFoundError):
+            updated_network.bind(["Adult"])
+
+    def test_network_engine_api(self):
+        api_client = APIClient()
+        api_client.force_authenticate(user=self.admin_user)
+        evaluation_data = {
+            "rules": ["Employed Adult", "Adult Or Student"],
+            "payload": {"age": 30, "status": "unemployed"},
+            "engine": "network"
+        }
+        response = api_client.post('/api/rule-evaluation/evaluate/', evaluation_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"result": "REJECTED", "passed_rules": ["Adult Or Student"], "failed_rules": ["Employed Adult"], "ruleset_version": self.rule_servie.get_ruleset().version})
+
+
+class PredicateIndexTests(TestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            email='admin1@gmail.com',
+            password='password123',
+            role='admin'
+        )
+        self.rule_servie = RuleService()
+        rule_store.clear()
+
+    def test_matches_interpreter(self):
+        rule_conditions = [
+            ("Thai", {"field": "user.country", "operator": "==", "value": "Thailand"}),
+            ("Adult", {"field": "user.age", "operator": ">=", "value": 18}),
+            ("Minor", {"field": "user.age", "operator": "<", "value": 18}),
+            ("Senior Or Young", {"OR": [
+                {"field": "user.age", "operator": ">", "value": 65},
+                {"field": "user.age", "operator": "<=", "value": 21}
+            ]}),
+            ("Late Version", {"field": "user.version", "operator": ">", "value": "2.0"}),
+            ("VIP Gmail", {"AND": [
+                {"field": "user.tags", "operator": "contains", "value": "vip"},
+                {"field": "user.email", "operator": "contains", "value": "gmail"}
+            ]}),
+            ("Has 1", {"field": "user.tags", "operator": "contains", "value": 1}),
+            ("Not Thai", {"field": "user.country", "operator": "!=", "value": "Thailand"}),
+            ("Empty AND", {"AND": []}),
+            ("Empty OR", {"OR": []}),
+            ("Invalid Leaf", {"field": "user.age", "operator": "~", "value": 1}),
+            ("Thai And Unindexed", {"AND": [
+                {"field": "user.country", "operator": "==", "value": "Thailand"},
+                {"field": "user.tags", "operator": "==", "value": ["vip"]}
+            ]}),
+        ]
+        rule_entries = [
+            RuleEntry(rule_id, name, condition, None)
+            for rule_id, (name, condition) in enumerate(rule_conditions, start=1)
+        ]
+        rule_index = PredicateIndex(rule_entries)
+        self.assertEqual(rule_index.stats(), {'rules': 12, 'indexed_rules': 10, 'unindexed_rules': 2, 'fields': 4})
+
+        payloads = [
+            {"user": {"age": 30, "country": "Thailand", "tags": ["vip", 1], "email": "a@gmail.com", "version": "2.5"}},
+            {"user": {"age": 18.0, "country": ["Thailand"], "tags": "very vip", "email": ["gmail"], "version": 3}},
+            {"user": {"age": True, "country": 5, "tags": {"vip": 1, "1": 2}, "email": "vip@gmail"}},
+            {"user": {"age": "70", "tags": [True], "version": "10"}},
+            {"user": {"age": 70, "tags": None}},
+            {"user": "not-a-dict"},
+            {}
+        ]
+        for payload in payloads:
+            expected = evaluate_rules(rule_conditions, payload)["passed_rules"]
+            self.assertEqual(rule_index.match(payload), expected)
+
+    def test_only_candidates_evaluated(self):
+        rule_entries = [
+            RuleEntry(rule_id, f"Country {rule_id}", {"field": "country", "operator": "==", "value": f"C{rule_id}"}, None)
+            for rule_id in range(1, 501)
+        ]
+        rule_index = PredicateIndex(rule_entries)
+        self.assertEqual(rule_index.candidates({"country": "C42"}), {41})
+        self.assertEqual(rule_index.match({"country": "C42"}), ["Country 42"])
+        self.assertEqual(rule_index.match({"country": "C0"}), [])
+
+    def test_index_keeps_its_own_predicates(self):
+        rule_entries = [
+            RuleEntry(rule_id, f"Country {rule_id}", {"field": "country", "operator": "==", "value": f"C{rule_id}"}, None)
+            for rule_id in range(1, 501)
+        ]
+        compiled_rule_cache.clear()
+        self.addCleanup(compiled_rule_cache.clear)
+        cached = compiled_rule_cache.get_or_compile(rule_entries[0].version, rule_entries[0].condition)
+        rule_index = PredicateIndex(rule_entries)
+        # Built without filling (and evicting from) the shared cache
+        self.assertEqual(len(compiled_rule_cache), 1)
+        self.assertIs(rule_index._predicates[0], cached)
+        self.assertEqual(rule_index.match({"country": "C500"}), ["Country 500"])
+        self.assertEqual(len(compiled_rule_cache), 1)
+
+    def test_match_api(self):
+        self.rule_servie.create(name="Adult", condition={"field": "age", "operator": ">=", "value": 18}, created_by=self.admin_user)
+        self.rule_servie.create(name="Thai", condition={"field": "country", "operator": "==", "value": "Thailand"}, created_by=self.admin_user)
+        self.rule_servie.create(name="Inactive Adult", condition={"field": "age", "operator": ">=", "value": 18}, is_active=False, created_by=self.admin_user)
+
+        api_client = APIClient()
+        api_client.force_authenticate(user=self.admin_user)
+        response = api_client.post('/api/rule-evaluation/match/', {"payload": {"age": 30, "country": "Laos"}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"matched_rules": ["Adult"], "ruleset_version": self.rule_servie.get_ruleset().version})
+
+        rule = self.rule_servie.find(name="Thai")
+        rule.condition = {"field": "country", "operator": "==", "value": "Laos"}
+        rule.save()
+        response = api_client.post('/api/rule-evaluation/match/', {"payload": {"age": 30, "country": "Laos"}}, format='json')
+        self.assertEqual(response.data, {"matched_rules": ["Adult", "Thai"], "ruleset_version": self.rule_servie.get_ruleset().version})
+
+
+class AdaptiveRuleTests(TestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            email='admin1@gmail.com',
+            password='password123',
+            role='admin'
+        )
+        self.rule_servie = RuleService()
+        self.condition = {"AND": [
+            {"field": "user.profile.age", "operator": ">=", "value": 18},
+            {"field": "country", "operator": "==", "value": "Thailand"},
+            {"OR": [
+                {"field": "score", "operator": ">", "value": 90},
+                {"field": "vip", "operator": "==", "value": True}
+            ]}
+        ]}
+        adaptive_rule_cache.clear()
+        rule_store.clear()
+
+    def test_reorders_children_by_observed_selectivity(self):
+        adaptive_rule = AdaptiveRule(self.condition, reorder_interval=10)
+        payloads = [
+            {"user": {"profile": {"age": 30}}, "country": "Laos", "score": 10, "vip": True},
+            {"user": {"profile": {"age": 40}}, "country": "Thailand", "score": 50, "vip": True},
+        ] * 10
+        for payload in payloads:
+            self.assertEqual(adaptive_rule(payload), RuleEvaluation.evaluate_condition(self.condition, payload))
+
+        stats = adaptive_rule.stats()
+        self.assertEqual(stats['evaluations'], 20)
+        self.assertEqual(stats['reorders'], 2)
+        # country fails most often and is the cheapest leaf; vip always passes, so it leads the OR
+        children = stats['condition']['children']
+        self.assertEqual([child.get('field', child['operator']) for child in children], ["country", "OR", "user.profile.age"])
+        self.assertEqual(children[0]['pass_rate'], 0.5)
+        self.assertEqual([child['field'] for child in children[1]['children']], ["vip", "score"])
+
+        for payload in ({"user": {"profile": {"age": 17}}, "country": "Thailand", "vip": True}, {"country": "Thailand", "score": 95}, {}):
+            self.assertEqual(adaptive_rule(payload), RuleEvaluation.evaluate_condition(self.condition, payload))
+
+    def test_unsampled_requests_run_the_reordered_closure(self):
+        adaptive_rule = AdaptiveRule(self.condition, reorder_interval=5, sample_interval=4)
+        payloads = [
+            {"user": {"profile": {"age": 30}}, "country": "Laos", "score": 10, "vip": True},
+            {"user": {"profile": {"age": 40}}, "country": "Thailand", "score": 95},
+            {"country": "Thailand", "vip": True},
+        ] * 20
+        predicates = [adaptive_rule.select_predicate() for _ in payloads]
+        self.assertEqual(sum(predicate is adaptive_rule for predicate in predicates), 15)
+        for predicate, payload in zip(predicates, payloads):
+            self.assertEqual(predicate(payload), RuleEvaluation.evaluate_condition(self.condition, payload))
+
+        stats = adaptive_rule.stats()
+        self.assertEqual((stats['requests'], stats['evaluations'], stats['reorders']), (60, 15, 3))
+        self.assertEqual(adaptive_rule.root.ordered_condition()["AND"][0]["field"], "country")
+        for payload in payloads:
+            self.assertEqual(adaptive_rule.predicate(payload), RuleEvaluation.evaluate_condition(self.condition, payload))
+
+    def test_adaptive_engine_api_and_stats(self):
+        rule = self.rule_servie.create(name="Adaptive", condition=self.condition, created_by=self.admin_user)
+        api_client = APIClient()
+        api_client.force_authenticate(user=self.admin_user)
+
+        response = api_client.get(f'/api/rules/{rule.id}/adaptive_stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'rule': "Adaptive", 'stats': None})
+
+        evaluation_data = {
+            "rules": ["Adaptive"],
+            "payload": {"user": {"profile": {"age": 30}}, "country": "Thailand", "vip": True},
+            "engine": "adaptive"
+        }
+        response = api_client.post('/api/rule-evaluation/evaluate/', evaluation_data, format='json')
+        self.assertEqual(response.data, {"result": "APPROVED", "passed_rules": ["Adaptive"], "failed_rules": [], "ruleset_version": self.rule_servie.get_ruleset().version})
+
+        response = api_client.get(f'/api/rules/{rule.id}/adaptive_stats/')
+        self.assertEqual(response.data['stats']['evaluations'], 1)
+        self.assertEqual(response.data['stats']['condition']['pass_rate'], 1.0)
+
+
+class ConditionOptimizerTests(TestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            email='admin1@gmail.com',
+            password='password123',
+            role='admin'
+        )
+        self.rule_servie = RuleService()
+        rule_store.clear()
+
+    def test_flattens_and_removes_duplicates(self):
+        adult = {"field": "age", "operator": ">=", "value": 18}
+        employed = {"field": "status", "operator": "==", "value": "employed"}
+        condition = {"AND": [adult, {"AND": [employed, {"OR": [adult]}]}, adult]}
+        self.assertEqual(optimize_condition(condition), {"AND": [adult, employed]})
+        self.assertEqual(optimize_condition({"OR": [{"AND": [employed]}]}), employed)
+
+    def test_folds_constant_branches(self):
+        adult = {"field": "age", "operator": ">=", "value": 18}
+        never = {"field": "age", "operator": ">=", "value": None}
+        self.assertEqual(optimize_condition({"AND": [adult, never]}), ALWAYS_FALSE)
+        self.assertEqual(optimize_condition({"OR": [adult, {"AND": []}]}), ALWAYS_TRUE)
+        self.assertEqual(optimize_condition({"OR": [never, adult, {"OR": []}]}), adult)
+
+    def test_merges_numeric_ranges(self):
+        def leaf(op, value):
+            return {"field": "age", "operator": op, "value": value}
+
+        self.assertEqual(optimize_condition({"AND": [leaf(">", 30), leaf("<", 20)]}), ALWAYS_FALSE)
+        self.assertEqual(optimize_condition({"AND": [leaf(">=", 20), leaf("<", 20)]}), ALWAYS_FALSE)
+        self.assertEqual(
+            optimize_condition({"AND": [leaf(">", 10), leaf("<", 65), leaf(">=", 18), leaf("<=", 65)]}),
+            {"AND": [leaf(">=", 18), leaf("<", 65)]}
+        )
+        self.assertEqual(optimize_condition({"AND": [leaf("==", 30), leaf(">", 18)]}), leaf("==", 30))
+        self.assertEqual(optimize_condition({"AND": [leaf("==", "30"), leaf(">", 18)]}), ALWAYS_FALSE)
+        self.assertEqual(optimize_condition({"OR": [leaf(">", 30), leaf(">=", 18), leaf("<", 5)]}), {"OR": [leaf(">=", 18), leaf("<", 5)]})
+
+        payloads = [{"age": age} for age in (5, 17, 18, 19.5, 30, 64, 65, 66, "30", None)] + [{}]
+        condition = {"OR": [{"AND": [leaf(">", 10), leaf("<=", 65), leaf(">=", 18)]}, leaf("==", 5)]}
+        optimized = optimize_condition(condition)
+        for payload in payloads:
+            self.assertEqual(
+                RuleEvaluation.evaluate_condition(optimized, payload),
+                RuleEvaluation.evaluate_condition(condition, payload)
+            )
+
+    def test_optimized_at_save_and_reported(self):
+        api_client = APIClient()
+        api_client.force_authenticate(user=self.admin_user)
+        rule_data = {
+            "name": "Contradiction",
+            "condition": {"AND": [
+                {"field": "age", "operator": ">", "value": 30},
+                {"field": "age", "operator": "<", "value": 20}
+            ]}
+        }
+        response = api_client.post('/api/rules/', rule_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        rule = self.rule_servie.find(name="Contradiction")
+        self.assertEqual(rule.optimized_condition, ALWAYS_FALSE)
+        self.assertEqual(self.rule_servie.get_rules_by_names(["Contradiction"]), [("Contradiction", ALWAYS_FALSE)])
+
+        response = api_client.get(f'/api/rules/{rule.id}/')
+        self.assertEqual(response.data['optimized_condition'], ALWAYS_FALSE)
+        self.assertIs(response.data['constant_result'], False)
+
+        response = api_client.patch(f'/api/rules/{rule.id}/', {"condition": {"field": "age", "operator": ">", "value": 30}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['constant_result'])
+        self.assertEqual(response.data['optimized_condition'], {"field": "age", "operator": ">", "value": 30})
+
+
+class DeepConditionTests(TestCase):
+
+    def build_condition(self, depth, leaf):
+        condition = leaf
+        for level in range(depth - 1):
+            if level % 2:
+                condition = {"AND": [{"field": "user.age", "operator": ">", "value": 0}, condition]}
+            else:
+                condition = {"OR": [{"field": "user.age", "operator": "<", "value": 0}, condition]}
+        return condition
+
+    def test_evaluates_and_validates_beyond_recursion_limit(self):
+        condition = self.build_condition(5000, {"field": "user.age", "operator": ">=", "value": 18})
+        self.assertEqual(condition_depth(condition), 5000)
+        self.assertTrue(RuleEvaluation.evaluate_condition(condition, {"user": {"age": 30}}))
+        self.assertFalse(RuleEvaluation.evaluate_condition(condition, {"user": {"age": 10}}))
+        self.assertFalse(RuleEvaluation.evaluate_condition(condition, {}))
+        validate_condition_json(condition)
+
+        invalid = self.build_condition(5000, {"field": "user.age", "operator": "~", "value": 18})
+        with self.assertRaises(ValidationError):
+            validate_condition_json(invalid)
+
+    def test_matches_all_and_any_semantics(self):
+        adult = {"field": "age", "operator": ">=", "value": 18}
+        cases = [
+            ({"AND": []}, [True, True, True]),
+            ({"OR": []}, [False, False, False]),
+            ({"AND": [{"OR": []}, adult]}, [False, False, False]),
+            ({"OR": [{"AND": []}, adult]}, [True, True, True]),
+            ({"AND": [adult, {"OR": [{"OR": []}, adult]}]}, [True, False, False]),
+        ]
+        for condition, expected in cases:
+            results = [RuleEvaluation.evaluate_condition(condition, payload) for payload in ({"age": 20}, {"age": 10}, {})]
+            self.assertEqual(results, expected)
+
+        payload = CountingPayload({"age": 20})
+        self.assertTrue(RuleEvaluation.evaluate_condition({"OR": [adult, adult, adult]}, payload))
+        self.assertEqual(payload.reads, 1)
+
+    def test_engines_fall_back_for_deep_conditions(self):
+        depth = MAX_NESTING_DEPTH * 30
+        conditions = [
+            ("Deep Adult", self.build_condition(depth, {"field": "user.age", "operator": ">=", "value": 18})),
+            ("Shallow Adult", {"field": "user.age", "operator": ">=", "value": 18}),
+        ]
+        payloads = [{"user": {"age": 30}}, {"user": {"age": 10}}, {}]
+        expected = [evaluate_rules(conditions, payload) for payload in payloads]
+        rule_entries = [RuleEntry(rule_id, name, condition, None) for rule_id, (name, condition) in enumerate(conditions, start=1)]
+
+        self.assertEqual(condition_cost(conditions[0][1]), (depth - 1) * 4 + 3)
+        self.assertIs(optimize_condition(conditions[0][1]), conditions[0][1])
+
+        predicate = compile_condition(conditions[0][1])
+        self.assertEqual([predicate(payload) for payload in payloads], [True, False, False])
+
+        network = RuleNetwork(rule_entries)
+        compiled_rules = network.bind(["Deep Adult", "Shallow Adult"])
+        self.assertEqual([RuleEvaluation.evaluate_compiled_rules(compiled_rules, payload) for payload in payloads], expected)
+
+        adaptive_rule = AdaptiveRule(conditions[0][1], reorder_interval=1)
+        self.assertEqual([adaptive_rule(payload) for payload in payloads], [True, False, False])
+
+        rule_index = PredicateIndex(rule_entries)
+        self.assertEqual([rule_index.match(payload) for payload in payloads], [result["passed_rules"] for result in expected])
+
+        if vectorized.is_available():
+            self.assertEqual(vectorized.evaluate_batch(conditions, payloads), expected)
+
+
+class BytecodeEngineTests(TestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            email='admin1@gmail.com',
+            password='password123',
+            role='admin'
+        )
+        self.rule_servie = RuleService()
+        rule_store.clear()
+
+    def test_generated_source(self):
+        condition = {"OR": [
+            {"field": "user.profile.age", "operator": ">=", "value": 18},
+            {"field": "vip", "operator": "==", "value": True}
+        ]}
+        self.assertEqual(
+            generate_source(condition).splitlines()[2].strip(),
+            "return 'user' in payload and 'profile' in (_v := payload['user']) and ('age' in (_v := _v['profile'])) "
+            "and (_v['age'] >= 18) or ('vip' in payload and payload['vip'] == True)"
+        )
+
+    def test_matches_interpreter(self):
+        rule_conditions = [
+            ("Numeric", {"AND": [
+                {"field": "user.age", "operator": ">=", "value": 18},
+                {"field": "user.score", "operator": "<", "value": 99.5}
+            ]}),
+            ("Strings", {"OR": [
+                {"field": "user.country", "operator": "==", "value": "Thailand"},
+                {"field": "user.email", "operator": "contains", "value": "gmail"},
+                {"field": "user.version", "operator": ">=", "value": "2.0.0"}
+            ]}),
+            ("Containers", {"AND": [
+                {"field": "user.country", "operator": "!=", "value": 5},
+                {"field": "user.tags", "operator": "contains", "value": "vip"},
+                {"field": "user.tags", "operator": "!=", "value": ["blocked"]}
+            ]}),
+            ("Single", {"AND": [{"OR": [{"field": "user", "operator": "contains", "value": "age"}]}]}),
+            ("Empty AND", {"AND": []}),
+            ("Empty OR", {"OR": []}),
+            ("Invalid Leaf", {"field": "user.age", "operator": "~", "value": 1})
+        ]
+        payloads = [
+            {"user": {"age": 30, "score": 10, "country": "Thailand", "tags": ["vip"], "version": "2.5.0"}},
+            {"user": {"age": "30", "score": None, "country": 5, "email": "a@gmail.com", "tags": {"vip": 1}}},
+            {"user": {"age": True, "score": [1], "country": ["Thailand"], "tags": "very vip", "version": 2}},
+            {"user": {"age": 2 ** 60, "score": 99.5, "email": ["gmail"], "tags": ("vip",)}},
+            {"user": ["age", "score"]},
+            {"user": "age"},
+            {"user": None},
+            []
+        ]
+        expected = [evaluate_rules(rule_conditions, payload) for payload in payloads]
+        compiled_rules = [(name, compile_rule(condition)) for name, condition in rule_conditions]
+        self.assertEqual([RuleEvaluation.evaluate_compiled_rules(compiled_rules, payload) for payload in payloads], expected)
+
+    def test_bytecode_engine_api(self):
+        self.rule_servie.create(name="Adult", condition={"field": "user.age", "operator": ">=", "value": 18}, created_by=self.admin_user)
+        api_client = APIClient()
+        api_client.force_authenticate(user=self.admin_user)
+
+        response = api_client.post('/api/rule-evaluation/evaluate/', {"rules": ["Adult"], "payload": {"user": {"age": "x"}}, "engine": "bytecode"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"result": "REJECTED", "passed_rules": [], "failed_rules": ["Adult"], "ruleset_version": self.rule_servie.get_ruleset().version})
+
+        batch_data = {"rules": ["Adult"], "payloads": [{"payload": {"user": {"age": 20}}}], "engine": "bytecode"}
+        response = api_client.post('/api/rule-evaluation/evaluate_batch/', batch_data, format='json')
+        self.assertEqual(response.data['results'], [{"result": "APPROVED", "passed_rules": ["Adult"], "failed_rules": []}])
+
+
+class RulesetEngineTests(TestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            email='admin1@gmail.com',
+            password='password123',
+            role='admin'
+        )
+        self.rule_servie = RuleService()
+        adult = {"field": "user.age", "operator": ">=", "value": 18}
+        self.rule_conditions = [
+            ("Adult", adult),
+            ("Thai Adult", {"AND": [adult, {"field": "user.country", "operator": "==", "value": "Thailand"}]}),
+            ("VIP Or Adult", {"OR": [{"field": "user.tags", "operator": "contains", "value": "vip"}, adult]}),
+            ("Gmail", {"field": "user.email", "operator": "contains", "value": "gmail"}),
+            ("Version", {"field": "user.version", "operator": "!=", "value": 2}),
+            ("Empty AND", {"AND": []}),
+            ("Invalid Leaf", {"field": "user.age", "operator": "~", "value": 1})
+        ]
+        for name, condition in self.rule_conditions:
+            self.rule_servie.create(name=name, condition=condition, created_by=self.admin_user)
+        rule_store.clear()
+        ruleset_cache.clear()
+
+    def test_matches_interpreter(self):
+        rule_names = [name for name, _ in self.rule_conditions]
+        compiled_rules = self.rule_servie.get_compiled_rules_by_names(rule_names, engine="ruleset")
+        self.assertIsInstance(compiled_rules, CompiledRuleset)
+        payloads = [
+            {"user": {"age": 30, "country": "Thailand", "tags": ["vip"], "email": "a@gmail.com", "version": 2}},
+            {"user": {"age": "30", "country": 5, "tags": {"vip": 1}, "email": ["gmail"], "version": "2"}},
+            {"user": {"age": 2 ** 60, "tags": ("vip",), "email": None}},
+            {"user": ["age"]},
+            {"user": None},
+            []
+        ]
+        for payload in payloads:
+            expected = evaluate_rules(self.rule_conditions, payload)
+            self.assertEqual(RuleEvaluation.evaluate(compiled_rules, payload), expected)
+            self.assertEqual(
+                RuleEvaluation.evaluate(compiled_rules, payload, mode="verdict"),
+                RuleEvaluation.evaluate_verdict([(name, compile_condition(condition)) for name, condition in self.rule_conditions], payload)
+            )
+
+    def test_paths_resolved_once(self):
+        user = CountingPayload({"age": 30, "country": "Thailand", "tags": ["vip"], "email": "a@gmail.com"})
+        payload = CountingPayload({"user": user})
+        ruleset = compile_ruleset([RuleEntry(index, name, condition, None) for index, (name, condition) in enumerate(self.rule_conditions)])
+        ruleset(payload, False)
+        self.assertEqual(payload.reads, 1)
+        self.assertEqual(user.reads, 4)
+
+    def test_cached_by_rules_and_versions(self):
+        compiled_rules = self.rule_servie.get_compiled_rules_by_names(["Adult", "Gmail"], engine="ruleset")
+        self.assertIs(compiled_rules, self.rule_servie.get_compiled_rules_by_names(["Adult", "Gmail"], engine="ruleset"))
+        self.assertIsNot(compiled_rules, self.rule_servie.get_compiled_rules_by_names(["Gmail", "Adult"], engine="ruleset"))
+
+        rule = self.rule_servie.get_by_name("Adult")
+        rule.condition = {"field": "user.age", "operator": ">=", "value": 21}
+        rule.save()
+        rule_store.clear()
+        updated_rules = self.rule_servie.get_compiled_rules_by_names(["Adult", "Gmail"], engine="ruleset")
+        self.assertIsNot(compiled_rules, updated_rules)
+        self.assertEqual(RuleEvaluation.evaluate(updated_rules, {"user": {"age": 20}})["failed_rules"], ["Adult", "Gmail"])
+
+    def test_ruleset_engine_api(self):
+        api_client = APIClient()
+        api_client.force_authenticate(user=self.admin_user)
+
+        evaluation_data = {"rules": ["Adult", "Thai Adult"], "payload": {"user": {"age": 20, "country": "Laos"}}, "engine": "ruleset"}
+        response = api_client.post('/api/rule-evaluation/evaluate/', evaluation_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"result": "REJECTED", "passed_rules": ["Adult"], "failed_rules": ["Thai Adult"], "ruleset_version": self.rule_servie.get_ruleset().version})
+
+        batch_data = {"rules": ["Adult"], "payloads": [{"payload": {"user": {"age": 20}}}, {"payload": {"user": {"age": 2}}}], "engine": "ruleset"}
+        response = api_client.post('/api/rule-evaluation/evaluate_batch/', batch_data, format='json')
+        self.assertEqual([result["result"] for result in response.data['results']], ["APPROVED", "REJECTED"])
+
+
+class PayloadAccessorTests(TestCase):
+
+    def setUp(self):
+        self.employment = CountingPayload({"status": "employed", "years": 5})
+        self.applicant = CountingPayload({"age": 30, "employment": self.employment, "tags": ["vip"]})
+        self.payload = CountingPayload({"applicant": self.applicant})
+        self.rule_conditions = [
+            ("Employed", {"field": "applicant.employment.status", "operator": "==", "value": "employed"}),
+            ("Experienced", {"AND": [
+                {"field": "applicant.employment.status", "operator": "==", "value": "employed"},
+                {"field": "applicant.employment.years", "operator": ">=", "value": 2}
+            ]}),
+            ("Adult", {"field": "applicant.age", "operator": ">=", "value": 18}),
+            ("Insured", {"field": "applicant.insurance.provider", "operator": "!=", "value": "none"}),
+            ("Also Insured", {"field": "applicant.insurance.provider", "operator": "==", "value": "acme"})
+        ]
+
+    def assert_each_path_read_once(self):
+        self.assertEqual((self.payload.reads, self.applicant.reads, self.employment.reads), (1, 2, 2))
+
+    def test_resolves_and_memoizes_paths(self):
+        accessor = PayloadAccessor(self.payload)
+        self.assertEqual(accessor["applicant.employment.years"], 5)
+        self.assertEqual(accessor["applicant.employment.status"], "employed")
+        self.assertIs(accessor["applicant.tags.0"], MISSING)
+        self.assertIs(accessor["applicant.insurance.provider"], MISSING)
+        self.assertIs(accessor["applicant.insurance.provider"], MISSING)
+        self.assertEqual((self.payload.reads, self.applicant.reads, self.employment.reads), (1, 2, 2))
+        self.assertIs(PayloadAccessor([])["applicant"], MISSING)
+
+    def test_interpreter_shares_lookups_across_rules(self):
+        result = evaluate_rules(self.rule_conditions, self.payload)
+        self.assertEqual(result, {"passed_rules": ["Employed", "Experienced", "Adult"], "failed_rules": ["Insured", "Also Insured"]})
+        self.assert_each_path_read_once()
+
+    def test_compiled_rules_share_lookups_across_rules(self):
+        compiled_rules = CompiledRules((name, compile_condition(condition)) for name, condition in self.rule_conditions)
+        self.assertEqual(
+            RuleEvaluation.evaluate(compiled_rules, self.payload),
+            {"passed_rules": ["Employed", "Experienced", "Adult"], "failed_rules": ["Insured", "Also Insured"]}
+        )
+        self.assert_each_path_read_once()
+        self.assertEqual(
+            RuleEvaluation.evaluate(compiled_rules, {"applicant": {"employment": {"status": "employed"}}}, mode="verdict"),
+            {"passed_rules": ["Employed"], "failed_rules": ["Experienced"]}
+        )
+
+
+class EvaluationResultCacheTests(TestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            email='admin1@gmail.com',
+            password='password123',
+            role='admin'
+        )
+        self.rule_servie = RuleService()
+        self.rule_servie.create(name="Adult", condition={"field": "user.age", "operator": ">=", "value": 18}, created_by=self.admin_user)
+        self.rule_servie.create(name="Thai", condition={"OR": [
+            {"field": "user.country", "operator": "==", "value": "Thailand"},
+            {"field": "user.tags", "operator": "contains", "value": "thai"}
+        ]}, created_by=self.admin_user)
+        rule_store.clear()
+        cache.clear()
+        evaluation_result_cache.clear()
+        evaluation_result_cache.reset_stats()
+        evaluation_result_cache.enabled = True
+
+    def tearDown(self):
+        evaluation_result_cache.enabled = False
+        evaluation_result_cache.shared = False
+        evaluation_result_cache.ttl = 60.0
+        evaluation_result_cache.clear()
+
+    def evaluate(self, payload, **kwargs):
+        result = self.rule_servie.evaluate(["Adult", "Thai"], payload, **kwargs)
+        self.assertEqual(result.pop("ruleset_version"), self.rule_servie.get_ruleset().version)
+        return result
+
+    def test_referenced_fields(self):
+        self.assertEqual(
+            referenced_fields({"AND": [
+                {"field": "b.c", "operator": "==", "value": 1},
+                {"OR": [{"field": "a", "operator": ">", "value": 1}, {"field": "b.c", "operator": "<", "value": 9}]}
+            ]}),
+            ("a", "b.c")
+        )
+        self.assertIsNone(referenced_fields({"field": ["a"], "operator": "==", "value": 1}))
+
+    def test_hits_ignore_unreferenced_fields(self):
+        expected = {"passed_rules": ["Adult", "Thai"], "failed_rules": []}
+        self.assertEqual(self.evaluate({"user": {"age": 30, "country": "Thailand"}, "request_id": 1}), expected)
+        self.assertEqual(self.evaluate({"user": {"age": 30, "country": "Thailand", "name": "x"}, "request_id": 2}), expected)
+        self.assertEqual(self.evaluate({"user": {"age": 30, "country": "Thailand"}}, mode="verdict"), expected)
+        self.assertEqual(self.evaluate({"user": {"age": 30, "country": "Laos"}}), {"passed_rules": ["Adult"], "failed_rules": ["Thai"]})
+        # An explicit null isn't the same as a missing field
+        self.evaluate({"user": {"age": 30, "country": "Laos", "tags": None}})
+        self.assertEqual(evaluation_result_cache.stats(), {
+            'enabled': True, 'shared': False, 'size': 4, 'hits': 1, 'shared_hits': 0, 'misses': 4
+        })
+
+    def test_cached_result_is_not_shared(self):
+        self.evaluate({"user": {"age": 30}})["passed_rules"].append("Tampered")
+        self.assertEqual(self.evaluate({"user": {"age": 30}}), {"passed_rules": ["Adult"], "failed_rules": ["Thai"]})
+
+    def test_saving_rule_invalidates(self):
+        payload = {"user": {"age": 20, "country": "Thailand"}}
+        self.assertEqual(self.evaluate(payload)["failed_rules"], [])
+        rule = self.rule_servie.get_by_name("Adult")
+        rule.condition = {"field": "user.age", "operator": ">=", "value": 21}
+        rule.save()
+        self.assertEqual(evaluation_result_cache.stats()['size'], 0)
+        self.assertEqual(self.evaluate(payload)["failed_rules"], ["Adult"])
+        self.assertEqual(evaluation_result_cache.stats()['hits'], 0)
+
+    def test_ttl_and_shared_tier(self):
+        evaluation_result_cache.shared = True
+        payload = {"user": {"age": 20, "tags": ["thai"]}}
+        self.evaluate(payload)
+        evaluation_result_cache.clear()
+        self.assertEqual(self.evaluate(payload), {"passed_rules": ["Adult", "Thai"], "failed_rules": []})
+        self.assertEqual(evaluation_result_cache.stats()['shared_hits'], 1)
+
+        evaluation_result_cache.shared = False
+        evaluation_result_cache.ttl = 0
+        self.evaluate({"user": {"age": 5}})
+        self.evaluate({"user": {"age": 5}})
+        self.assertEqual(evaluation_result_cache.stats()['misses'], 3)
+
+    def test_evaluate_and_stats_api(self):
+        api_client = APIClient()
+        api_client.force_authenticate(user=self.admin_user)
+        evaluation_data = {"rules": ["Adult", "Thai"], "payload": {"user": {"age": 30, "country": "Thailand"}}}
+        for _ in range(2):
+            response = api_client.post('/api/rule-evaluation/evaluate/', evaluation_data, format='json')
+            self.assertEqual(response.data["result"], "APPROVED")
+
+        response = api_client.get('/api/rule-evaluation/cache_stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['hits'], response.data['misses']), (1, 1))
+
+        client_user = User.objects.create_user(email='client1@gmail.com', password='password123', role='client')
+        api_client.force_authenticate(user=client_user)
+        self.assertEqual(api_client.get('/api/rule-evaluation/cache_stats/').status_code, status.HTTP_403_FORBIDDEN)
+
+
+class RulesetSnapshotTests(TestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            email='admin1@gmail.com',
+            password='password123',
+            role='admin'
+        )
+        self.rule_servie = RuleService()
+        self.rule = self.rule_servie.create(name="Adult", condition={"field": "age", "operator": ">=", "value": 18}, created_by=self.admin_user)
+        rule_store.clear()
+
+    def latest_version(self):
+        return RulesetSnapshot.objects.order_by('-version').first().version
+
+    def test_every_write_bumps_the_version(self):
+        version = self.latest_version()
+        self.rule.condition = {"field": "age", "operator": ">=", "value": 21}
+        self.rule.save()
+        self.assertEqual(self.latest_version(), version + 1)
+
+        Rule.objects.filter(pk=self.rule.pk).update(is_active=False)
+        self.assertEqual(self.latest_version(), version + 2)
+        self.assertEqual(RulesetSnapshot.objects.get(version=version + 2).rules, [])
+
+        # Updates that match no rows don't create a version
+        Rule.objects.filter(name="Unknown Rule").update(is_active=False)
+        self.rule.delete()
+        self.assertEqual(self.latest_version(), version + 3)
+
+    def test_bulk_update_is_evaluated(self):
+        payload = {"age": 20}
+        self.assertEqual(self.rule_servie.evaluate(["Adult"], payload)["passed_rules"], ["Adult"])
+        for engine in ('compiled', 'bytecode', 'ruleset'):
+            self.rule_servie.evaluate(["Adult"], payload, engine=engine)
+        evaluation_result_cache.enabled = True
+        try:
+            self.rule_servie.evaluate(["Adult"], payload)
+            with self.captureOnCommitCallbacks(execute=True):
+                Rule.objects.filter(pk=self.rule.pk).update(condition={"field": "age", "operator": ">=", "value": 21})
+
+            version = self.latest_version()
+            for engine in ('compiled', 'bytecode', 'ruleset', 'network'):
+                self.assertEqual(self.rule_servie.evaluate(["Adult"], payload, engine=engine), {"passed_rules": [], "failed_rules": ["Adult"], "ruleset_version": version}, engine)
+        finally:
+            evaluation_result_cache.enabled = False
+            evaluation_result_cache.clear()
+
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.admin_user)
+        response = self.api_client.post('/api/rule-evaluation/evaluate/', {"rules": ["Adult"], "payload": payload}, format='json')
+        self.assertEqual((response.data['result'], response.data['ruleset_version']), ("REJECTED", version))
+
+    @override_settings(RULE_SNAPSHOT_RETENTION=2)
+    def test_old_versions_are_pruned(self):
+        cache.clear()
+        first = self.latest_version()
+        RulesetSnapshot.pin(first)
+        for value in (19, 20, 21):
+            self.rule.condition = {"field": "age", "operator": ">=", "value": value}
+            self.rule.save()
+        versions = list(RulesetSnapshot.objects.order_by('version').values_list('version', flat=True))
+        self.assertEqual(versions, [first, first + 2, first + 3])
+
+        with self.assertRaises(RulesetVersionNotFoundError):
+            self.rule_servie.get_ruleset(first + 1)
+        self.assertEqual(self.rule_servie.get_ruleset(first).get_many(["Adult"])[0].condition["value"], 18)
+
+    def test_pinned_versions_are_immutable(self):
+        version = self.rule_servie.get_ruleset().version
+        self.rule.condition = {"field": "age", "operator": ">=", "value": 21}
+        self.rule.save()
+
+        payload = {"age": 20}
+        self.assertEqual(self.rule_servie.evaluate(["Adult"], payload), {"passed_rules": [], "failed_rules": ["Adult"], "ruleset_version": version + 1})
+        self.assertEqual(self.rule_servie.evaluate(["Adult"], payload, version=version), {"passed_rules": ["Adult"], "failed_rules": [], "ruleset_version": version})
+
+        # Pinned versions are loaded from their snapshot, not the current rules
+        rule_store.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.rule_servie.get_ruleset(version).get_many(["Adult"])[0].condition["value"], 18)
+        with self.assertRaises(RulesetVersionNotFoundError):
+            self.rule_servie.get_ruleset(version + 100)
+
+    def test_async_evaluation_uses_the_validated_version(self):
+        version = self.rule_servie.get_ruleset().version
+        self.rule.condition = {"field": "age", "operator": ">=", "value": 21}
+        self.rule.save()
+
+        result = evaluate_rules_async(["Adult"], {"age": 20}, ruleset_version=version)
+        self.assertEqual((result['result'], result['ruleset_version']), ("APPROVED", version))
+        result = evaluate_rules_async(["Adult"], {"age": 20}, ruleset_version=version + 100)
+        self.assertEqual(result['status'], 'error')
+
+    def test_responses_report_the_version(self):
+        api_client = APIClient()
+        api_client.force_authenticate(user=self.admin_user)
+        version = self.latest_version()
+        evaluation_data = {"rules": ["Adult"], "payload": {"age": 30}}
+        response = api_client.post('/api/rule-evaluation/evaluate/', evaluation_data, format='json')
+        self.assertEqual(response.data["ruleset_version"], version)
+
+        self.rule.save()
+        response = api_client.post('/api/rule-evaluation/evaluate_batch/', {"rules": ["Adult"], "payloads": [{"payload": {"age": 30}}]}, format='json')
+        self.assertEqual(response.data["ruleset_version"], version + 1)
+
+
+class SnapshotFileTests(TestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            email='admin1@gmail.com',
+            password='password123',
+            role='admin'
+        )
+        self.rule_servie = RuleService()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'ruleset.bin')
+
+    def test_round_trip(self):
+        updated_at = RulesetSnapshot.objects.first().created_at
+        rule_entries = [
+            RuleEntry(1, "Thai Adult", {"AND": [
+                {"field": "user.age", "operator": ">=", "value": 18},
+                {"OR": [{"field": "user.country", "operator": "==", "value": "Thailand"}, {"field": "user.tags", "operator": "contains", "value": ["thai"]}]}
+            ]}, updated_at),
+            RuleEntry(2, "Adult", {"field": "user.age", "operator": ">=", "value": 18.5}, updated_at),
+            # Nodes that aren't plain groups or leaves are kept as they are
+            RuleEntry(3, "Odd", {"AND": [{"field": 1, "operator": "==", "value": None}, {"field": "a"}, {"OR": "x"}]}, updated_at),
+            RuleEntry(4, "Empty", {}, updated_at),
+        ]
+        write_snapshot(self.path, 7, rule_entries)
+
+        ruleset = MappedRuleset(SnapshotFile(self.path))
+        self.assertEqual((ruleset.version, len(ruleset)), (7, 4))
+        self.assertEqual(ruleset.get_many(["Odd", "Adult", "Odd"]), [rule_entries[2], rule_entries[1]])
+        with self.assertRaises(RuleNotFoundError):
+            ruleset.get_many(["Unknown Rule"])
+        self.assertEqual(ruleset.entries, tuple(rule_entries))
+        # Field paths are interned, so every decoded rule shares one string per path
+        self.assertIs(ruleset.entries[0].condition["AND"][0]["field"], ruleset.entries[1].condition["field"])
+
+    def test_store_maps_the_current_ruleset(self):
+        rule = self.rule_servie.create(name="Adult", condition={"field": "age", "operator": ">=", "value": 18}, created_by=self.admin_user)
+        old_ruleset = RuleStore(snapshot_path=self.path).get_ruleset()
+        self.assertIsInstance(old_ruleset, MappedRuleset)
+
+        # Another process maps the file written by the first, only checking the version
+        with self.assertNumQueries(1):
+            self.assertEqual(RuleStore(snapshot_path=self.path).get_many(["Adult"])[0].condition["value"], 18)
+
+        rule.condition = {"field": "age", "operator": ">=", "value": 21}
+        rule.save()
+        ruleset = RuleStore(snapshot_path=self.path).get_ruleset()
+        self.assertEqual((ruleset.version, ruleset.get_many(["Adult"])[0].condition["value"]), (old_ruleset.version + 1, 21))
+        # The new file replaced the old one; rulesets mapped before keep reading theirs
+        self.assertEqual(old_ruleset.get_many(["Adult"])[0].condition["value"], 18)
+
+    def test_store_never_maps_another_version(self):
+        self.rule_servie.create(name="Adult", condition={"field": "age", "operator": ">=", "value": 18}, created_by=self.admin_user)
+        version = self.rule_servie.get_ruleset().version
+        # A process that has seen a later version already wrote the file
+        write_snapshot(self.path, version + 1, [RuleEntry(1, "Adult", {"field": "age", "operator": ">=", "value": 21}, timezone.now())])
+
+        ruleset = RuleStore(snapshot_path=self.path).get_ruleset()
+        self.assertEqual((ruleset.version, ruleset.get_many(["Adult"])[0].condition["value"]), (version, 18))
+        self.assertEqual(read_version(self.path), version + 1)
+
+    def test_compact_store(self):
+        self.rule_servie.create(name="Adult", condition={"field": "user.age", "operator": ">=", "value": 18}, created_by=self.admin_user)
+        self.rule_servie.create(name="Thai", condition={"field": "user.country", "operator": "==", "value": "Thailand"}, created_by=self.admin_user)
+        ruleset = RuleStore(compact=True).get_ruleset()
+        self.assertIsInstance(ruleset, MappedRuleset)
+        self.assertEqual(ruleset.entries, RuleStore().get_ruleset().entries)
+        self.assertEqual(PredicateIndex(ruleset.entries).match({"user": {"age": 30, "country": "Thailand"}}), ["Adult", "Thai"])
+        self.assertEqual(RuleStore(compact=True).get_ruleset(ruleset.version - 1).get_many(["Adult"])[0].condition["value"], 18)
+
+    def test_memory_report(self):
+        # Objects referenced more than once are counted once
+        self.assertEqual(deep_sizeof(["x", "x"]), sys.getsizeof(["x", "x"]) + sys.getsizeof("x"))
+        self.rule_servie.create(name="Adult", condition={"AND": [
+            {"field": "user.age", "operator": ">=", "value": 18},
+            {"field": "user.age", "operator": "<", "value": 65}
+        ]}, created_by=self.admin_user)
+        footprint = ruleset_footprint(RuleStore().get_ruleset())
+        self.assertEqual(
+            {key: footprint[key] for key in ('rules', 'nodes', 'leaves', 'distinct_fields', 'distinct_constants', 'compact')},
+            {'rules': 1, 'nodes': 3, 'leaves': 2, 'distinct_fields': 1, 'distinct_constants': 2, 'compact': False}
+        )
+        self.assertLess(footprint['bytes'], footprint['decoded_bytes'])
+        # Compiled structures are counted through their closures
+        values = list(range(1000, 1100))
+        self.assertGreater(deep_sizeof(lambda: values), deep_sizeof(values))
+
+        def unbound():
+            def inner():
+                return late
+            return inner
+            late = None  # noqa: F841
+        self.assertGreater(deep_sizeof(unbound()), 0)
+        self.assertGreater(footprint['index_bytes'], 0)
+        self.assertGreater(footprint['network_bytes'], 0)
+        self.assertEqual(footprint['total_bytes_per_rule'], footprint['decoded_bytes'] + footprint['index_bytes'] + footprint['network_bytes'])
+
+        out = StringIO()
+        call_command('ruleset_memory', stdout=out)
+        self.assertIn('decoded_bytes', out.getvalue())
+
+
+class FastJSONTests(TestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            email='admin1@gmail.com',
+            password='password123',
+            role='admin'
+        )
+        self.rule_servie = RuleService()
+        self.rule_servie.create(name="Adult", condition={"field": "age", "operator": ">=", "value": 18}, created_by=self.admin_user)
+        rule_store.clear()
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.admin_user)
+
+    def post(self, body):
+        return self.api_client.post('/api/rule-evaluation/evaluate/', body, content_type='application/json')
+
+    def test_loads_and_dumps(self):
+        self.assertEqual(fastjson.loads(b'{"a": [1, 2.5, "\u00e9", null]}'), {"a": [1, 2.5, "\u00e9", None]})
+        # Integers wider than 64 bits fall back to the standard library
+        self.assertEqual(fastjson.loads(b'{"a": 123456789012345678901234567890}'), {"a": 123456789012345678901234567890})
+        self.assertEqual(fastjson.dumps({1: [2 ** 70]}), b'{"1":[1180591620717411303424]}')
+        with self.assertRaises(ValueError):
+            fastjson.loads(b'{"a": NaN}')
+        with self.assertRaises(ValueError):
+            fastjson.loads(b'{"a": ')
+
+    def test_evaluate_api(self):
+        response = self.post(b'{"rules": ["Adult"], "payload": {"age": 30, "big": 123456789012345678901234567890}}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, fastjson.dumps({
+            "result": "APPROVED", "passed_rules": ["Adult"], "failed_rules": [], "ruleset_version": self.rule_servie.get_ruleset().version
+        }))
+
+        response = self.post(b'{"rules": ["Adult"], "payload": ')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('JSON parse error', response.data['detail'])
+
+    def test_renders_types_only_drf_knows(self):
+        response = self.api_client.get(f'/api/rules/{self.rule_servie.get_by_name("Adult").pk}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['created_by'], 'admin1@gmail.com')
+
+
+@skipUnless(messagepack.is_available(), "msgpack is not installed")
+class MessagePackTests(TestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            email='admin1@gmail.com',
+            password='password123',
+            role='admin'
+        )
+        self.rule_servie = RuleService()
+        self.rule_servie.create(name="Adult", condition={"field": "age", "operator": ">=", "value": 18}, created_by=self.admin_user)
+        rule_store.clear()
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.admin_user)
+
+    def post(self, url, data, **kwargs):
+        return self.api_client.post(url, messagepack.msgpack.packb(data), content_type='application/msgpack', HTTP_ACCEPT='application/msgpack', **kwargs)
+
+    def test_evaluate_and_batch(self):
+        version = self.rule_servie.get_ruleset().version
+        response = self.post('/api/rule-evaluation/evaluate/', {"rules": ["Adult"], "payload": {"age": 30}})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(messagepack.msgpack.unpackb(response.content), {
+            "result": "APPROVED", "passed_rules": ["Adult"], "failed_rules": [], "ruleset_version": version
+        })
+
+        response = self.post('/api/rule-evaluation/evaluate_batch/', {"rules": ["Adult"], "payloads": [{"id": "a", "payload": {"age": 10}}]})
+        self.assertEqual(messagepack.msgpack.unpackb(response.content), {
+            "results": [{"id": "a", "result": "REJECTED", "passed_rules": [], "failed_rules": ["Adult"]}], "ruleset_version": version
+        })
+
+    def test_errors_and_json_unchanged(self):
+        response = self.api_client.post('/api/rule-evaluation/evaluate/', b'\xc1', content_type='application/msgpack', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('MessagePack parse error', messagepack.msgpack.unpackb(response.content)['detail'])
+        # Binary values aren't JSON, so they aren't valid payloads either
+        response = self.post('/api/rule-evaluation/evaluate/', {"rules": ["Adult"], "payload": {"age": b'30'}})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.api_client.post('/api/rule-evaluation/evaluate/', {"rules": ["Adult"], "payload": {"age": 30}}, format='json')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.data['result'], 'APPROVED')
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            email='admin1@gmail.com',
+            password='password123',
+            role='admin'
+        )
+        self.rule_servie = RuleService()
+        self.rule_servie.create(name="Adult", condition={"field": "age", "operator": ">=", "value": 18}, created_by=self.admin_user)
+        self.rule_servie.create(name="Thai", condition={"field": "country", "operator": "==", "value": "Thailand"}, created_by=self.admin_user)
+        rule_store.clear()
+        cache.clear()
+        metrics_registry.reset()
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.admin_user)
+
+    def evaluate(self, rules, payload, mode='full'):
+        return self.api_client.post('/api/rule-evaluation/evaluate/', {"rules": rules, "payload": payload, "mode": mode}, format='json')
+
+    def count(self, histogram, *labels):
+        series = histogram.snapshot().get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def test_stage_and_rule_latencies(self):
+        with mock.patch('apps.rules.services.sample_rule_latency', return_value=True):
+            response = self.evaluate(["Adult", "Thai"], {"age": 30, "country": "Laos"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for stage in ('auth', 'parse', 'db', 'compile', 'eval', 'serialize'):
+            self.assertEqual(self.count(STAGE_SECONDS, 'evaluate', stage), 1, stage)
+        self.assertEqual(self.count(REQUEST_SECONDS, 'evaluate'), 1)
+        self.assertEqual(self.count(RULE_SECONDS, 'Adult'), 1)
+        self.assertEqual(self.count(RULE_SECONDS, 'Thai'), 1)
+
+        # Unsampled evaluations don't time rules one by one
+        with mock.patch('apps.rules.services.sample_rule_latency', return_value=False):
+            self.evaluate(["Adult"], {"age": 30})
+        self.assertEqual(self.count(RULE_SECONDS, 'Adult'), 1)
+        self.assertEqual(self.count(STAGE_SECONDS, 'evaluate', 'eval'), 2)
+
+    def test_timed_evaluation_matches_every_engine(self):
+        payload = {"age": 10, "country": "Thailand"}
+        ruleset = self.rule_servie.get_ruleset()
+        for engine in ('compiled', 'network', 'adaptive', 'bytecode', 'ruleset'):
+            compiled_rules = self.rule_servie.get_compiled_rules_by_names(["Adult", "Thai"], engine=engine, ruleset=ruleset)
+            for mode in ('full', 'verdict'):
+                observed = []
+                result = RuleEvaluation.evaluate_timed(compiled_rules, payload, mode, lambda seconds, name: observed.append(name))
+                self.assertEqual(result, RuleEvaluation.evaluate(compiled_rules, payload, mode), (engine, mode))
+                self.assertEqual(observed, ["Adult"] if mode == 'verdict' else ["Adult", "Thai"])
+
+    def test_counters(self):
+        response = self.evaluate(["Missing"], {"age": 30})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(RULE_NOT_FOUND_TOTAL.snapshot(), {('evaluate',): 1})
+
+        with mock.patch.object(RuleService, 'evaluate', side_effect=Exception('boom')):
+            response = self.evaluate(["Adult"], {"age": 30})
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(ERRORS_TOTAL.snapshot(), {('evaluate',): 1})
+
+        evaluation_result_cache.enabled = True
+        try:
+            self.evaluate(["Adult"], {"age": 30})
+            self.evaluate(["Adult"], {"age": 30})
+        finally:
+            evaluation_result_cache.enabled = False
+            evaluation_result_cache.clear()
+        self.assertEqual(RESULT_CACHE_TOTAL.snapshot(), {('miss',): 1, ('hit',): 1})
+
+        self.assertEqual(evaluate_rules_async(["Missing"], {"age": 30})['status'], 'error')
+        self.assertEqual(RULE_NOT_FOUND_TOTAL.snapshot()[('evaluate_rules_async',)], 1)
+        self.assertEqual(self.count(REQUEST_SECONDS, 'evaluate_rules_async'), 1)
+
+    def test_metrics_endpoint_adds_up_published_processes(self):
+        self.evaluate(["Missing"], {"age": 30})
+        # Another process, e.g. a Celery worker, publishing its totals
+        worker_registry = MetricsRegistry()
+        worker_registry.counter(RULE_NOT_FOUND_TOTAL.name, RULE_NOT_FOUND_TOTAL.documentation, ['endpoint']).inc('evaluate', amount=2)
+        worker_registry.histogram(REQUEST_SECONDS.name, REQUEST_SECONDS.documentation, ['endpoint']).observe(0.3, 'evaluate_rules_async')
+        worker_registry.publish()
+
+        with self.settings(METRICS_AUTH_TOKEN='scrape-token'):
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        lines = response.content.decode().splitlines()
+        self.assertIn('# TYPE rule_engine_rule_not_found_total counter', lines)
+        self.assertIn('rule_engine_rule_not_found_total{endpoint="evaluate"} 3', lines)
+        self.assertIn('# TYPE rule_engine_request_seconds histogram', lines)
+        self.assertIn('rule_engine_request_seconds_bucket{endpoint="evaluate_rules_async",le="0.25"} 0', lines)
+        self.assertIn('rule_engine_request_seconds_bucket{endpoint="evaluate_rules_async",le="0.5"} 1', lines)
+        self.assertIn('rule_engine_request_seconds_bucket{endpoint="evaluate_rules_async",le="+Inf"} 1', lines)
+        self.assertIn('rule_engine_request_seconds_sum{endpoint="evaluate_rules_async"} 0.3', lines)
+        self.assertIn('rule_engine_request_seconds_count{endpoint="evaluate"} 1', lines)
+
+    @override_settings(METRICS_AUTH_TOKEN='scrape-token')
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-token').status_code, status.HTTP_200_OK)
+
+    @override_settings(METRICS_AUTH_TOKEN='')
+    def test_metrics_without_token_only_open_in_debug(self):
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_403_FORBIDDEN)
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_200_OK)
+
+    @override_settings(METRICS_RULE_LABELS=False)
+    def test_rule_latency_needs_rule_labels(self):
+        self.assertFalse(any(sample_rule_latency() for _ in range(1000)))
+        with self.settings(METRICS_RULE_LABELS=True):
+            self.assertTrue(any(sample_rule_latency() for _ in range(1000)))
+
+
+class ServerTimingAndProfilingTests(TestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            email='admin1@gmail.com',
+            password='password123',
+            role='admin'
+        )
+        self.client_user = User.objects.create_user(
+            email='client1@gmail.com',
+            password='password123',
+            role='client'
+        )
+        self.rule_servie = RuleService()
+        self.rule_servie.create(name="Adult", condition={"field": "age", "operator": ">=", "value": 18}, created_by=self.admin_user)
+        rule_store.clear()
+        cache.clear()
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.admin_user)
+
+    def evaluate(self, query=''):
+        return self.api_client.post(f'/api/rule-evaluation/evaluate/{query}', {"rules": ["Adult"], "payload": {"age": 30}}, format='json')
+
+    def test_server_timing_header(self):
+        self.assertNotIn('Server-Timing', self.evaluate())
+
+        with override_settings(RULE_SERVER_TIMING=True):
+            response = self.evaluate()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        stages = [metric.split(';')[0] for metric in response['Server-Timing'].split(', ')]
+        self.assertEqual(stages, ['auth', 'parse', 'db', 'compile', 'eval', 'serialize', 'total'])
+        self.assertRegex(response['Server-Timing'], r'^auth;dur=\d+\.\d{3}, ')
+
+    def test_nested_stages_are_disjoint(self):
+        timer = StageTimer(STAGE_SECONDS, 'test')
+        with mock.patch('apps.core.metrics.time.perf_counter', side_effect=[0.0, 1.0, 3.0, 10.0]):
+            with timer.stage('eval'):
+                with timer.stage('compile'):
+                    pass
+        self.assertEqual(timer.durations, {'compile': 2.0, 'eval': 8.0})
+
+    def test_profile_for_admins(self):
+        response = self.evaluate('?profile=1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['result'], 'APPROVED')
+        self.assertTrue(response.data['profile'])
+        self.assertLessEqual(len(response.data['profile']), 25)
+        self.assertEqual(set(response.data['profile'][0]), {'function', 'calls', 'primitive_calls', 'total_time', 'cumulative_time'})
+        self.assertTrue(any('evaluate' in function['function'] for function in response.data['profile']))
+
+        self.assertNotIn('profile', self.evaluate().data)
+        self.api_client.force_authenticate(user=self.client_user)
+        self.assertNotIn('profile', self.evaluate('?profile=1').data)
+
+    def test_profile_limits(self):
+        with mock.patch.object(profile_limiter, 'max_per_minute', 1):
+            self.assertTrue(self.evaluate('?profile=1').data['profile'])
+            response = self.evaluate('?profile=1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['profile'])
+
+        # One profiled request at a time per process
+        cache.clear()
+        self.assertTrue(profile_limiter.acquire())
+        try:
+            self.assertIsNone(self.evaluate('?profile=1').data['profile'])
+        finally:
+            profile_limiter.release()
+        self.assertTrue(self.evaluate('?profile=1').data['profile'])
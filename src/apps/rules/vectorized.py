@@ -0,0 +1,245 @@
+from itertools import compress
+from typing import Any, Dict, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from .compiler import compile_condition
+from .evaluator import MAX_NESTING_DEPTH, condition_depth
+from .operators import OPERATORS, contains
+
+
+class _Missing:
+    pass
+
+
+_MISSING = _Missing()
+
+# Every projected value is tagged with one of these codes in a single pass,
+# after which the typed masks are plain array operations.
+_MISSING_CODE, _NONE_CODE, _BOOL_CODE, _INT_CODE, _FLOAT_CODE, _STR_CODE, _LIST_CODE, _DICT_CODE, _EXOTIC_CODE = range(9)
+
+
+class _TypeCodes(dict):
+    def __missing__(self, value_type):
+        return _EXOTIC_CODE
+
+
+_TYPE_CODES = _TypeCodes({
+    _Missing: _MISSING_CODE,
+    type(None): _NONE_CODE,
+    bool: _BOOL_CODE,
+    int: _INT_CODE,
+    float: _FLOAT_CODE,
+    str: _STR_CODE,
+    list: _LIST_CODE,
+    dict: _DICT_CODE,
+})
+_NUMERIC_TYPES = (int, float, bool)
+# Largest magnitude for which ints survive the float64 round-trip exactly
+_MAX_EXACT_INT = 2 ** 53
+
+_COMPARE = {
+    "==": lambda column, value: column == value,
+    "!=": lambda column, value: column != value,
+    ">": lambda column, value: column > value,
+    "<": lambda column, value: column < value,
+    ">=": lambda column, value: column >= value,
+    "<=": lambda column, value: column <= value,
+}
+
+
+def is_available() -> bool:
+    return np is not None
+
+
+class Column:
+    def __init__(self, values: List[Any]):
+        self.size = len(values)
+        self.values = np.fromiter(values, dtype=object, count=self.size)
+        codes = np.fromiter(map(_TYPE_CODES.__getitem__, map(type, values)), dtype=np.int8, count=self.size)
+        self.present = codes != _MISSING_CODE
+        self.numeric_mask = (codes >= _BOOL_CODE) & (codes <= _FLOAT_CODE)
+        self.string_mask = codes == _STR_CODE
+        self.container_mask = (codes == _LIST_CODE) | (codes == _DICT_CODE)
+        # Present values that didn't come from JSON; these always take the exact Python path
+        self.exotic_mask = codes == _EXOTIC_CODE
+        self.has_exotic = bool(self.exotic_mask.any())
+        self._numeric = None
+        self._strings = None
+
+    def numeric(self):
+        if self._numeric is None:
+            try:
+                column = self.values[self.numeric_mask].astype(np.float64)
+            except OverflowError:
+                # An int beyond float range (valid JSON): the column is compared in Python
+                column, exact = None, False
+            else:
+                exact = not column.size or float(np.abs(column).max()) <= _MAX_EXACT_INT
+            self._numeric = (column, exact)
+        return self._numeric
+
+    def strings(self):
+        if self._strings is None:
+            values = self.values[self.string_mask]
+            # NumPy drops trailing NULs from fixed-width strings, which would change comparisons
+            exact = not any(value.endswith('\x00') for value in values)
+            self._strings = (values.astype(str), exact)
+        return self._strings
+
+    def scatter(self, rows, subset_result) -> 'np.ndarray':
+        result = np.zeros(self.size, dtype=bool)
+        result[rows] = subset_result
+        return result
+
+    def contains(self, value) -> 'np.ndarray':
+        # Hashable scalars can't raise inside list/dict membership tests
+        return self.scatter(self.container_mask, [value in container for container in self.values[self.container_mask]])
+
+    def apply(self, compare, value, rows=None) -> 'np.ndarray':
+        result = np.zeros(self.size, dtype=bool)
+        rows = self.present if rows is None else rows
+        values = self.values
+        for index in np.flatnonzero(rows):
+            try:
+                result[index] = bool(compare(values[index], value))
+            except (TypeError, ValueError):
+                pass
+        return result
+
+
+class ColumnarBatch:
+    def __init__(self, payloads: List[Dict[str, Any]]):
+        self.payloads = payloads
+        self.size = len(payloads)
+        self._columns: Dict[str, Column] = {}
+        self._values: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def column(self, field: str) -> Column:
+        column = self._columns.get(field)
+        if column is None:
+            column = self._columns[field] = Column(self._project(tuple(field.split('.'))))
+        return column
+
+    def _project(self, field_parts: Tuple[str, ...]) -> List[Any]:
+        # Dotted paths are projected one level at a time so shared prefixes are walked once
+        values = self._values.get(field_parts)
+        if values is not None:
+            return values
+
+        parent_values = self._project(field_parts[:-1]) if len(field_parts) > 1 else self.payloads
+        part = field_parts[-1]
+        values = [
+            value[part] if isinstance(value, dict) and part in value else _MISSING
+            for value in parent_values
+        ]
+        self._values[field_parts] = values
+        return values
+
+
+def _leaf_mask(condition: Dict[str, Any], batch: ColumnarBatch) -> 'np.ndarray':
+    field = condition.get("field")
+    op = condition.get("operator")
+    value = condition.get("value")
+
+    if not all([field, op, value is not None]) or op not in OPERATORS:
+        return np.zeros(batch.size, dtype=bool)
+
+    column = batch.column(field)
+    value_type = type(value)
+    is_number = value_type in _NUMERIC_TYPES
+
+    if op == "contains":
+        if value_type is str and '\x00' not in value:
+            strings, exact = column.strings()
+            if exact:
+                result = column.contains(value)
+                result[column.string_mask] = np.char.find(strings, value) >= 0
+                if column.has_exotic:
+                    result |= column.apply(contains, value, column.exotic_mask)
+                return result
+        elif is_number:
+            result = column.contains(value)
+            if column.has_exotic:
+                result |= column.apply(contains, value, column.exotic_mask)
+            return result
+        return column.apply(contains, value)
+
+    if is_number:
+        typed, exact = column.numeric()
+        typed_mask = column.numeric_mask
+        exact = exact and abs(value) <= _MAX_EXACT_INT
+    elif value_type is str:
+        typed, exact = column.strings()
+        typed_mask = column.string_mask
+        exact = exact and '\x00' not in value
+    else:
+        exact = False
+
+    if not exact:
+        return column.apply(OPERATORS[op], value)
+
+    result = column.scatter(typed_mask, _COMPARE[op](typed, value))
+    if op == "!=":
+        # Mismatched JSON types are never equal
+        result |= column.present & ~typed_mask & ~column.exotic_mask
+    if column.has_exotic:
+        result |= column.apply(OPERATORS[op], value, column.exotic_mask)
+    return result
+
+
+def condition_mask(condition: Dict[str, Any], batch: ColumnarBatch) -> 'np.ndarray':
+    if "AND" in condition:
+        mask = np.ones(batch.size, dtype=bool)
+        for subcondition in condition["AND"]:
+            mask &= condition_mask(subcondition, batch)
+            if not mask.any():
+                break
+        return mask
+
+    if "OR" in condition:
+        mask = np.zeros(batch.size, dtype=bool)
+        for subcondition in condition["OR"]:
+            mask |= condition_mask(subcondition, batch)
+            if mask.all():
+                break
+        return mask
+
+    return _leaf_mask(condition, batch)
+
+
+def rule_mask(condition: Dict[str, Any], batch: ColumnarBatch) -> 'np.ndarray':
+    if condition_depth(condition) > MAX_NESTING_DEPTH:
+        # Evaluated row by row; building masks recursively would need a frame per level
+        predicate = compile_condition(condition)
+        return np.fromiter(map(predicate, batch.payloads), dtype=bool, count=batch.size)
+    return condition_mask(condition, batch)
+
+
+def evaluate_batch(rule_conditions: List[Tuple[str, Dict[str, Any]]], payloads: List[Dict[str, Any]]) -> List[Dict[str, List[str]]]:
+    if not payloads:
+        return []
+
+    batch = ColumnarBatch(payloads)
+    rule_names = [rule_name for rule_name, _ in rule_conditions]
+    if not rule_names:
+        return [{"passed_rules": [], "failed_rules": []} for _ in payloads]
+
+    passed = np.column_stack([rule_mask(condition, batch) for _, condition in rule_conditions])
+
+    # Payloads overwhelmingly share a handful of pass/fail patterns, so the
+    # name lists are built once per distinct row rather than once per payload.
+    packed = np.packbits(passed, axis=1)
+    row_keys = np.ascontiguousarray(packed).view(np.dtype((np.void, packed.shape[1]))).ravel()
+    _, first_rows, pattern_ids = np.unique(row_keys, return_index=True, return_inverse=True)
+    patterns = [
+        (list(compress(rule_names, passed[row])), list(compress(rule_names, ~passed[row])))
+        for row in first_rows.tolist()
+    ]
+    return [
+        {"passed_rules": list(passed_rules), "failed_rules": list(failed_rules)}
+        for passed_rules, failed_rules in map(patterns.__getitem__, pattern_ids.ravel().tolist())
+    ]
@@ -1,20 +1,33 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from django.conf import settings
 from django.db import transaction
+from django.http import StreamingHttpResponse
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
+from apps.core import fastjson, messagepack
 from apps.core.exceptions import RuleNotFoundError, InvalidPayloadError
 from apps.core.permissions import IsAdminUser, IsClientUser
-from .models import Rule
+from .models import Rule, RulesetSnapshot
 from .serializers import (
     RuleSerializer, 
     RuleEvaluationRequestSerializer,
     RuleEvaluationResponseSerializer,
-    RuleEvaluationAsyncResponseSerializer
+    RuleEvaluationAsyncResponseSerializer,
+    RuleBatchEvaluationRequestSerializer,
+    RuleBatchEvaluationResponseSerializer,
+    RuleMatchRequestSerializer,
+    RuleMatchResponseSerializer
 )
-from .services import RuleService, RuleEvaluation
+from .adaptive import adaptive_rule_cache
+from .metrics import RULE_NOT_FOUND_TOTAL, InstrumentedViewMixin
+from .result_cache import evaluation_result_cache
+from .services import RuleService, RuleEvaluation, BATCH_ENGINES, ENGINE_COMPILED, ENGINE_VECTORIZED
+from .store import RuleEntry
+from . import vectorized
 from .tasks import evaluate_rules_async
 
 
@@ -31,11 +44,28 @@ class RuleViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         validated_data = serializer.validated_data
-        self.rule_service.create(created_by=self.request.user, **validated_data)
+        serializer.instance = self.rule_service.create(created_by_id=self.request.user.pk, **validated_data)
+    
+    @swagger_auto_schema(
+        operation_description="Per-node pass rates and average costs the adaptive engine gathered from a sample of requests (one in RULE_ADAPTIVE_SAMPLE_INTERVAL) for the current version of this rule, with AND/OR children listed in their current evaluation order. Returns null statistics if the rule hasn't been evaluated with the adaptive engine yet.",
+        operation_summary="Adaptive Evaluation Statistics"
+    )
+    @action(detail=True, methods=['get'])
+    def adaptive_stats(self, request, pk=None):
+        rule = self.get_object()
+        adaptive_rule = adaptive_rule_cache.get(RuleEntry.from_rule(rule).version)
+        return Response({
+            'rule': rule.name,
+            'stats': adaptive_rule.stats() if adaptive_rule is not None else None
+        })
 
 
-class RuleEvaluationViewSet(viewsets.ViewSet):
+class RuleEvaluationViewSet(InstrumentedViewMixin, viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
+    # Service callers can send and accept application/msgpack instead of JSON
+    if messagepack.is_available():
+        parser_classes = [*api_settings.DEFAULT_PARSER_CLASSES, messagepack.MessagePackParser]
+        renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, messagepack.MessagePackRenderer]
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -49,38 +79,194 @@ class RuleEvaluationViewSet(viewsets.ViewSet):
             404: "Rule Not Found",
             500: "Server Error"
         },
-        operation_description="Evaluate a payload against the specified rules. Returns APPROVED if all rules pass, REJECTED if any rule fails.",
+        manual_parameters=[
+            openapi.Parameter(
+                'profile', openapi.IN_QUERY, description="Admins only: 1 runs the request under cProfile and adds its top functions to the response as `profile` (null when over the profiling limit)",
+                type=openapi.TYPE_INTEGER, enum=[1]
+            )
+        ],
+        operation_description="Evaluate a payload against the specified rules. Returns APPROVED if all rules pass, REJECTED if any rule fails. With mode=verdict evaluation stops at the first failing rule.",
         operation_summary="Evaluate Rules"
     )
     @action(detail=False, methods=['post'])
     def evaluate(self, request):
-        serializer = RuleEvaluationRequestSerializer(data=request.data)
-        if not serializer.is_valid():
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        with self.timer.stage('parse'):
+            serializer = RuleEvaluationRequestSerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         rule_names = serializer.validated_data['rules']
         payload = serializer.validated_data['payload']
+        mode = serializer.validated_data['mode']
+        cheapest_first = serializer.validated_data['cheapest_first']
+        engine = serializer.validated_data['engine']
         
         try:
-            rule_conditions = self.rule_service.get_rules_by_names(rule_names)
-            evaluation_result = RuleEvaluation.evaluate_rules(rule_conditions, payload)
+            evaluation_result = self.rule_service.evaluate(rule_names, payload, mode, cheapest_first, engine, timer=self.timer)
             result = "APPROVED" if not evaluation_result['failed_rules'] else "REJECTED"
             
             response_data = {
                 'result': result,
                 'passed_rules': evaluation_result['passed_rules'],
-                'failed_rules': evaluation_result['failed_rules']
+                'failed_rules': evaluation_result['failed_rules'],
+                'ruleset_version': evaluation_result['ruleset_version']
             }
             
-            response_serializer = RuleEvaluationResponseSerializer(data=response_data)
-            response_serializer.is_valid(raise_exception=True)
+            return Response(response_data)
+        except RuleNotFoundError as e:
+            RULE_NOT_FOUND_TOTAL.inc(self.action)
+            return Response({'detail': str(e)}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response({'detail': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @swagger_auto_schema(
+        request_body=RuleMatchRequestSerializer,
+        responses={
+            200: RuleMatchResponseSerializer,
+            400: "Bad Request",
+            500: "Server Error"
+        },
+        operation_description="Return every active rule the payload satisfies, in rule id order. Rules are looked up through an index over their conditions, so only rules that could match are evaluated in full.",
+        operation_summary="Match Active Rules"
+    )
+    @action(detail=False, methods=['post'])
+    def match(self, request):
+        with self.timer.stage('parse'):
+            serializer = RuleMatchRequestSerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        payload = serializer.validated_data['payload']
+        
+        try:
+            with self.timer.stage('db'):
+                ruleset = self.rule_service.get_ruleset()
+                rule_index = self.rule_service.get_rule_index(ruleset)
+            with self.timer.stage('eval'):
+                matched_rules = rule_index.match(payload)
+            return Response({'matched_rules': matched_rules, 'ruleset_version': ruleset.version})
+        except Exception as e:
+            return Response({'detail': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @swagger_auto_schema(
+        request_body=RuleBatchEvaluationRequestSerializer,
+        responses={
+            200: RuleBatchEvaluationResponseSerializer,
+            400: "Bad Request",
+            404: "Rule Not Found",
+            500: "Server Error"
+        },
+        operation_description="Evaluate a list of payloads against the specified rules. The rules are resolved once for the whole batch and a result is returned for each payload, in request order.",
+        operation_summary="Evaluate Rules Batch"
+    )
+    @action(detail=False, methods=['post'])
+    def evaluate_batch(self, request):
+        with self.timer.stage('parse'):
+            serializer = RuleBatchEvaluationRequestSerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        rule_names = serializer.validated_data['rules']
+        items = serializer.validated_data['payloads']
+        engine = serializer.validated_data['engine']
+        
+        try:
+            with self.timer.stage('db'):
+                ruleset = self.rule_service.get_ruleset()
+                rule_entries = self.rule_service.get_rule_entries_by_names(rule_names, ruleset)
+            with self.timer.stage('eval'):
+                evaluation_results = RuleEvaluation.evaluate_batch(rule_entries, [item['payload'] for item in items], engine, ruleset)
+            
+            results = []
+            for item, evaluation_result in zip(items, evaluation_results):
+                result_data = {
+                    'result': "APPROVED" if not evaluation_result['failed_rules'] else "REJECTED",
+                    'passed_rules': evaluation_result['passed_rules'],
+                    'failed_rules': evaluation_result['failed_rules']
+                }
+                if 'id' in item:
+                    result_data['id'] = item['id']
+                results.append(result_data)
             
-            return Response(response_serializer.data)
+            return Response({'results': results, 'ruleset_version': ruleset.version})
         except RuleNotFoundError as e:
+            RULE_NOT_FOUND_TOTAL.inc(self.action)
             return Response({'detail': str(e)}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({'detail': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                'rules', openapi.IN_QUERY, description="Rule name to evaluate, repeat for multiple rules",
+                type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_STRING),
+                collection_format='multi', required=True
+            ),
+            openapi.Parameter(
+                'engine', openapi.IN_QUERY, description="Evaluation engine for each chunk of lines",
+                type=openapi.TYPE_STRING, enum=list(BATCH_ENGINES), default=ENGINE_COMPILED
+            )
+        ],
+        responses={
+            200: "application/x-ndjson stream, one result object per input line",
+            400: "Bad Request",
+            404: "Rule Not Found"
+        },
+        operation_description="Evaluate newline-delimited JSON payloads against the specified rules. Each request line is an object with a `payload` and an optional `id`. Results are streamed back as one JSON object per line while the request body is still being read, so memory use does not grow with the number of payloads. Malformed lines produce an object with `line` and `error` instead of a result.",
+        operation_summary="Evaluate Rules Stream"
+    )
+    @action(detail=False, methods=['post'])
+    def evaluate_stream(self, request):
+        rule_names = request.query_params.getlist('rules')
+        if not rule_names:
+            return Response(
+                {'detail': 'rules parameter is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        engine = request.query_params.get('engine', ENGINE_COMPILED)
+        if engine not in BATCH_ENGINES or (engine == ENGINE_VECTORIZED and not vectorized.is_available()):
+            return Response(
+                {'detail': f'engine must be one of: {", ".join(BATCH_ENGINES)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            with self.timer.stage('db'):
+                ruleset = self.rule_service.get_ruleset()
+                rule_entries = self.rule_service.get_rule_entries_by_names(rule_names, ruleset)
+        except RuleNotFoundError as e:
+            RULE_NOT_FOUND_TOTAL.inc(self.action)
+            return Response({'detail': str(e)}, status=status.HTTP_404_NOT_FOUND)
+        
+        chunk_size = settings.RULE_EVALUATION_STREAM_CHUNK_SIZE
+        results = RuleEvaluation.evaluate_stream(rule_entries, request._request, engine, chunk_size, ruleset)
+        response = StreamingHttpResponse(
+            self._render_ndjson(results, chunk_size),
+            content_type='application/x-ndjson'
+        )
+        response['X-Ruleset-Version'] = str(ruleset.version)
+        return response
+    
+    @staticmethod
+    def _render_ndjson(results, chunk_size):
+        chunk = []
+        for result in results:
+            chunk.append(fastjson.dumps(result))
+            if len(chunk) >= chunk_size:
+                yield b'\n'.join(chunk) + b'\n'
+                chunk = []
+        if chunk:
+            yield b'\n'.join(chunk) + b'\n'
+
+    @swagger_auto_schema(
+        operation_description="Hit and miss counters of the evaluation result cache in this process. shared_hits counts results found in the shared (Redis) tier.",
+        operation_summary="Result Cache Statistics"
+    )
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        return Response(evaluation_result_cache.stats())
+
     @swagger_auto_schema(
         request_body=RuleEvaluationRequestSerializer,
         responses={
@@ -94,27 +280,39 @@ class RuleEvaluationViewSet(viewsets.ViewSet):
     )
     @action(detail=False, methods=['post'])
     def evaluate_async(self, request):
-        serializer = RuleEvaluationRequestSerializer(data=request.data)
-        if not serializer.is_valid():
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        with self.timer.stage('parse'):
+            serializer = RuleEvaluationRequestSerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         rule_names = serializer.validated_data['rules']
         payload = serializer.validated_data['payload']
         
         try:
-            self.rule_service.get_rules_by_names(rule_names)
+            with self.timer.stage('db'):
+                ruleset = self.rule_service.get_ruleset()
+                self.rule_service.get_rule_entries_by_names(rule_names, ruleset)
         except RuleNotFoundError as e:
+            RULE_NOT_FOUND_TOTAL.inc(self.action)
             return Response({'detail': str(e)}, status=status.HTTP_404_NOT_FOUND)
         
+        # The task evaluates against the snapshot validated here, whatever is
+        # written to the rules before the worker picks it up
+        RulesetSnapshot.pin(ruleset.version)
         task = evaluate_rules_async.delay(
             rule_names=rule_names,
-            payload=payload
+            payload=payload,
+            mode=serializer.validated_data['mode'],
+            cheapest_first=serializer.validated_data['cheapest_first'],
+            engine=serializer.validated_data['engine'],
+            ruleset_version=ruleset.version
         )
 
         return Response({
             'task_id': task.id,
             'status': 'pending',
-            'message': 'Rule evaluation has been scheduled'
+            'message': 'Rule evaluation has been scheduled',
+            'ruleset_version': ruleset.version
         }, status=status.HTTP_202_ACCEPTED)
     
     @swagger_auto_schema(
@@ -158,11 +356,10 @@ class RuleEvaluationViewSet(viewsets.ViewSet):
                 'passed_rules': result.get('passed_rules'),
                 'failed_rules': result.get('failed_rules')
             }
+            if result.get('ruleset_version') is not None:
+                response_data['ruleset_version'] = result['ruleset_version']
             
-            response_serializer = RuleEvaluationResponseSerializer(data=response_data)
-            response_serializer.is_valid(raise_exception=True)
-            
-            return Response(response_serializer.data)
+            return Response(response_data)
         else:
             return Response({
                 'task_id': task_id,
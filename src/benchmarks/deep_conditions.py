@@ -0,0 +1,128 @@
+"""Compares the iterative condition evaluator and validator with the recursive
+versions they replaced, on nested AND/OR trees of increasing depth.
+
+Run from src/:
+
+    python -m benchmarks.deep_conditions [--number 2000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+django.setup()
+
+from django.core.exceptions import ValidationError  # noqa: E402
+
+from apps.rules.evaluator import evaluate_condition  # noqa: E402
+from apps.rules.models import validate_condition_json, validate_subcondition  # noqa: E402
+from apps.rules.operators import OPERATORS, LOGIC_OPERATORS  # noqa: E402
+
+DEPTHS = (10, 50, 100, 200, 300, 1000, 5000)
+
+
+def recursive_evaluate_condition(condition, payload):
+    # RuleEvaluation.evaluate_condition before the explicit-stack rewrite
+    if "AND" in condition:
+        return LOGIC_OPERATORS["AND"](
+            recursive_evaluate_condition(subcondition, payload) for subcondition in condition["AND"]
+        )
+
+    if "OR" in condition:
+        return LOGIC_OPERATORS["OR"](
+            recursive_evaluate_condition(subcondition, payload) for subcondition in condition["OR"]
+        )
+
+    field = condition.get("field")
+    op = condition.get("operator")
+    value = condition.get("value")
+
+    if not all([field, op, value is not None]):
+        return False
+
+    if op not in OPERATORS:
+        return False
+
+    field_value_from_payload = payload
+    for part in field.split('.'):
+        if isinstance(field_value_from_payload, dict) and part in field_value_from_payload:
+            field_value_from_payload = field_value_from_payload[part]
+        else:
+            return False
+
+    try:
+        return OPERATORS[op](field_value_from_payload, value)
+    except (TypeError, ValueError):
+        return False
+
+
+def recursive_validate_condition_json(condition):
+    # validate_condition_json before the explicit-stack rewrite
+    if not isinstance(condition, dict):
+        raise ValidationError("Condition must be a JSON object")
+
+    if "AND" in condition or "OR" in condition:
+        if "AND" in condition and isinstance(condition["AND"], list):
+            for subcondition in condition["AND"]:
+                recursive_validate_condition_json(subcondition)
+        elif "OR" in condition and isinstance(condition["OR"], list):
+            for subcondition in condition["OR"]:
+                recursive_validate_condition_json(subcondition)
+        else:
+            raise ValidationError("AND/OR conditions must contain a list of subconditions")
+    else:
+        validate_subcondition(condition)
+
+
+def build_condition(depth):
+    # Alternating AND/OR levels, each with a leaf that doesn't decide the group,
+    # so every level is visited.
+    condition = {"field": "user.age", "operator": ">=", "value": 18}
+    for level in range(depth - 1):
+        if level % 2:
+            condition = {"AND": [{"field": "user.age", "operator": ">", "value": 0}, condition]}
+        else:
+            condition = {"OR": [{"field": "user.age", "operator": "<", "value": 0}, condition]}
+    return condition
+
+
+def measure(function, number):
+    try:
+        return min(timeit.repeat(function, number=number, repeat=3)) / number * 1e6
+    except RecursionError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000, help="evaluations per timing run")
+    args = parser.parse_args(argv)
+
+    payload = {"user": {"age": 30}}
+    print(f"recursion limit {sys.getrecursionlimit()}, times in microseconds per call")
+    print(f"{'depth':>6} {'eval recursive':>15} {'eval iterative':>15} {'speedup':>8} {'validate recursive':>19} {'validate iterative':>19}")
+
+    for depth in DEPTHS:
+        condition = build_condition(depth)
+        number = max(1, args.number * 10 // depth)
+
+        recursive = measure(lambda: recursive_evaluate_condition(condition, payload), number)
+        iterative = measure(lambda: evaluate_condition(condition, payload), number)
+        validate_recursive = measure(lambda: recursive_validate_condition_json(condition), number)
+        validate_iterative = measure(lambda: validate_condition_json(condition), number)
+
+        def show(value):
+            return 'RecursionError' if value is None else f"{value:.1f}"
+
+        speedup = f"{recursive / iterative:.2f}x" if recursive is not None else '-'
+        print(
+            f"{depth:>6} {show(recursive):>15} {show(iterative):>15} {speedup:>8} "
+            f"{show(validate_recursive):>19} {show(validate_iterative):>19}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Seeded generators for benchmark rules and payloads.
+
+The same seed and parameters always produce the same rules and payloads, so
+runs can be compared with each other.
+"""
+import random
+from typing import Any, Dict, List, Optional, Tuple
+
+from apps.rules.operators import OPERATORS
+
+NUMERIC_OPERATORS = ('>', '<', '>=', '<=')
+FIELD_TYPES = ('int', 'str', 'list')
+WORDS = ('alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'eta', 'theta')
+
+
+class RuleGenerator:
+    # depth is the maximum AND/OR nesting of a condition (1 is a single leaf)
+    # and fan_out the number of children per AND/OR node. operators weights
+    # how often each operator is used. overlap is the share of leaves drawn
+    # from a small pool common to every rule, as happens when many rules
+    # check the same thresholds. missing is the share of payload fields left
+    # out.
+    def __init__(self, seed: int = 0, fields: int = 30, depth: int = 3, fan_out: int = 3, operators: Optional[Dict[str, float]] = None, overlap: float = 0.3, missing: float = 0.1):
+        self.seed = seed
+        self.depth = depth
+        self.fan_out = fan_out
+        self.operators = operators or {operator: 1.0 for operator in OPERATORS}
+        self.overlap = overlap
+        self.missing = missing
+        rng = random.Random(seed)
+        # A third of the fields sit one level deeper, so lookups walk different path lengths
+        self.fields: List[Tuple[str, str]] = [
+            (f"applicant.{'profile.' if index % 3 == 0 else ''}field_{index}", FIELD_TYPES[index % len(FIELD_TYPES)])
+            for index in range(fields)
+        ]
+        self._shared_leaves = [self._leaf(rng) for _ in range(max(fields // 2, 1))]
+
+    def rules(self, count: int) -> List[Tuple[str, Dict[str, Any]]]:
+        rng = random.Random(f"{self.seed}:rules")
+        return [(f"rule-{index}", self._condition(rng, self.depth)) for index in range(count)]
+
+    def payloads(self, count: int) -> List[Dict[str, Any]]:
+        rng = random.Random(f"{self.seed}:payloads")
+        payloads = []
+        for _ in range(count):
+            payload: Dict[str, Any] = {}
+            for field, field_type in self.fields:
+                if rng.random() < self.missing:
+                    continue
+                node = payload
+                *parents, name = field.split('.')
+                for parent in parents:
+                    node = node.setdefault(parent, {})
+                node[name] = self._value(rng, field_type)
+            payloads.append(payload)
+        return payloads
+
+    def _condition(self, rng: random.Random, depth: int) -> Dict[str, Any]:
+        # Some branches end early, so rules aren't all perfectly balanced trees
+        if depth <= 1 or (depth < self.depth and rng.random() < 0.25):
+            if rng.random() < self.overlap:
+                return dict(rng.choice(self._shared_leaves))
+            return self._leaf(rng)
+        return {rng.choice(('AND', 'OR')): [self._condition(rng, depth - 1) for _ in range(self.fan_out)]}
+
+    def _leaf(self, rng: random.Random) -> Dict[str, Any]:
+        operator = rng.choices(list(self.operators), weights=list(self.operators.values()))[0]
+        if operator in NUMERIC_OPERATORS:
+            candidates = [field for field in self.fields if field[1] == 'int']
+        elif operator == 'contains':
+            candidates = [field for field in self.fields if field[1] != 'int']
+        else:
+            candidates = self.fields
+        field, field_type = rng.choice(candidates or self.fields)
+        value = self._value(rng, field_type)
+        if operator == 'contains':
+            value = rng.choice(WORDS) if field_type == 'list' else rng.choice(WORDS)[:2]
+        return {"field": field, "operator": operator, "value": value}
+
+    def _value(self, rng: random.Random, field_type: str) -> Any:
+        if field_type == 'int':
+            return rng.randint(0, 100)
+        if field_type == 'str':
+            return rng.choice(WORDS)
+        return rng.sample(WORDS, rng.randint(0, 3))
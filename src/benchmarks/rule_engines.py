@@ -0,0 +1,116 @@
+"""Compares the per-payload rule engines on a mixed set of realistic rules.
+
+Run from src/:
+
+    python -m benchmarks.rule_engines [--payloads 20000] [--copies 8]
+"""
+import argparse
+import copy
+import os
+import random
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+django.setup()
+
+from apps.rules.adaptive import AdaptiveRule  # noqa: E402
+from apps.rules.codegen import compile_rule  # noqa: E402
+from apps.rules.compiler import CompiledRules, compile_condition  # noqa: E402
+from apps.rules.ruleset import compile_ruleset  # noqa: E402
+from apps.rules.services import RuleEvaluation  # noqa: E402
+from apps.rules.store import RuleEntry  # noqa: E402
+
+CONDITIONS = [
+    {"AND": [
+        {"field": "applicant.age", "operator": ">=", "value": 18},
+        {"field": "applicant.employment.status", "operator": "==", "value": "employed"},
+        {"OR": [
+            {"field": "applicant.employment.years", "operator": ">=", "value": 2},
+            {"field": "applicant.income", "operator": ">", "value": 50000}
+        ]}
+    ]},
+    {"OR": [
+        {"field": "applicant.country", "operator": "==", "value": "Thailand"},
+        {"field": "applicant.tags", "operator": "contains", "value": "vip"}
+    ]},
+    {"field": "applicant.credit.score", "operator": ">", "value": 650},
+    {"AND": [
+        {"field": "applicant.email", "operator": "contains", "value": "@"},
+        {"field": "applicant.country", "operator": "!=", "value": "Unknown"}
+    ]},
+]
+
+
+def make_payloads(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        {"applicant": {
+            "age": rng.randint(10, 80),
+            "income": rng.randint(0, 150000),
+            "country": rng.choice(["Thailand", "Laos", "Vietnam", "Unknown"]),
+            "email": rng.choice(["a@example.com", "nobody"]),
+            "tags": rng.sample(["vip", "new", "flagged", "returning"], rng.randint(0, 2)),
+            "employment": {"status": rng.choice(["employed", "unemployed"]), "years": rng.randint(0, 10)},
+            "credit": {"score": rng.randint(300, 850)},
+        }}
+        for _ in range(count)
+    ]
+
+
+def make_rules(copies):
+    # Each copy shifts the numeric thresholds, so copies share paths but not every leaf
+    rules = []
+    for copy_index in range(copies):
+        for rule_index, condition in enumerate(CONDITIONS):
+            condition = copy.deepcopy(condition)
+            stack = [condition]
+            while stack:
+                node = stack.pop()
+                if "AND" in node or "OR" in node:
+                    stack.extend(node.get("AND", node.get("OR")))
+                elif type(node["value"]) is int:
+                    node["value"] += copy_index
+            rules.append((f"rule-{copy_index}-{rule_index}", condition))
+    return rules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--payloads', type=int, default=20000)
+    parser.add_argument('--copies', type=int, default=8, help="copies of the rule set, for a realistic request size")
+    args = parser.parse_args(argv)
+
+    payloads = make_payloads(args.payloads)
+    rules = make_rules(args.copies)
+    adaptive_rules = [(name, AdaptiveRule(condition)) for name, condition in rules]
+    ruleset = compile_ruleset([RuleEntry(index, name, condition, None) for index, (name, condition) in enumerate(rules)])
+    engines = {
+        'interpreter': lambda payload: RuleEvaluation.evaluate_rules(rules, payload),
+        'compiled': CompiledRules((name, compile_condition(condition)) for name, condition in rules),
+        # As in a request, each payload gets the rules' current predicates
+        'adaptive': lambda payload: CompiledRules((name, rule.select_predicate()) for name, rule in adaptive_rules).evaluate(payload),
+        'bytecode': [(name, compile_rule(condition)) for name, condition in rules],
+        'ruleset': lambda payload: ruleset(payload, False),
+    }
+
+    expected = None
+    baseline = None
+    print(f"{len(payloads)} payloads x {len(rules)} rules")
+    for name, engine in engines.items():
+        if not callable(engine):
+            engine = lambda payload, compiled_rules=engine: RuleEvaluation.evaluate_compiled_rules(compiled_rules, payload)
+        started = time.perf_counter()
+        results = [engine(payload) for payload in payloads]
+        elapsed = time.perf_counter() - started
+
+        expected = expected or results
+        assert results == expected, f"{name} disagrees with the interpreter"
+        baseline = baseline or elapsed
+        per_rule = elapsed / (len(payloads) * len(rules)) * 1e9
+        print(f"{name:>12} {elapsed:8.3f}s {per_rule:8.0f} ns/rule {baseline / elapsed:6.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Compares the per-request JSON parse/validate/render cost of the evaluate endpoint before and after the fast JSON path.
+
+Run from src/:
+
+    python -m benchmarks.serialization [--requests 20000] [--padding 0]
+
+"before" is DRF's stdlib JSON parser and renderer, a stdlib JSONField
+round-trip of the payload and the response validated again through
+RuleEvaluationResponseSerializer. "after" is the path the views use now.
+--padding adds that many extra fields to each payload, as clients that send
+whole documents do.
+"""
+import argparse
+import io
+import os
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+django.setup()
+
+from rest_framework import serializers  # noqa: E402
+from rest_framework.parsers import JSONParser  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from apps.core import fastjson  # noqa: E402
+from apps.core.fastjson import FastJSONParser, FastJSONRenderer  # noqa: E402
+from apps.rules.serializers import RuleEvaluationRequestSerializer, RuleEvaluationResponseSerializer  # noqa: E402
+from benchmarks.rule_engines import make_payloads  # noqa: E402
+
+
+class StdlibRequestSerializer(RuleEvaluationRequestSerializer):
+    payload = serializers.JSONField()
+
+
+def make_bodies(count, padding):
+    bodies = []
+    for index, payload in enumerate(make_payloads(count)):
+        payload["document"] = {f"field_{field}": f"value {index} {field}" for field in range(padding)}
+        request_data = {"rules": [f"rule-{rule}" for rule in range(8)], "payload": payload}
+        bodies.append(fastjson.dumps(request_data))
+    return bodies
+
+
+def handle(body, parser, request_serializer_class, renderer, revalidate):
+    data = parser.parse(io.BytesIO(body), 'application/json', {})
+    request_serializer = request_serializer_class(data=data)
+    request_serializer.is_valid(raise_exception=True)
+    rules = request_serializer.validated_data['rules']
+    response_data = {
+        'result': 'REJECTED',
+        'passed_rules': rules[:5],
+        'failed_rules': rules[5:],
+        'ruleset_version': 42
+    }
+    if revalidate:
+        response_serializer = RuleEvaluationResponseSerializer(data=response_data)
+        response_serializer.is_valid(raise_exception=True)
+        response_data = response_serializer.data
+    return renderer.render(response_data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--padding', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    bodies = make_bodies(args.requests, args.padding)
+    paths = [
+        ('before', JSONParser(), StdlibRequestSerializer, JSONRenderer(), True),
+        ('after', FastJSONParser(), RuleEvaluationRequestSerializer, FastJSONRenderer(), False),
+    ]
+    print(f"{args.requests} requests, {sum(map(len, bodies)) // len(bodies)} byte bodies, orjson {'available' if fastjson.is_available() else 'not installed'}")
+    baseline = None
+    for name, request_parser, request_serializer_class, renderer, revalidate in paths:
+        for body in bodies[:100]:
+            handle(body, request_parser, request_serializer_class, renderer, revalidate)
+        started = time.perf_counter()
+        for body in bodies:
+            handle(body, request_parser, request_serializer_class, renderer, revalidate)
+        per_request = (time.perf_counter() - started) / len(bodies) * 1e6
+        baseline = baseline or per_request
+        print(f"{name:>8}: {per_request:8.1f} us/request  ({baseline / per_request:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+from config.settings import *  # noqa: F401,F403
+
+# Benchmarks run offline: an in-memory database and a process-local cache,
+# with no MySQL or Redis behind them
+DATABASES = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}}
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+RULE_STORE_PUBSUB_URL = ''
+RULE_STORE_SNAPSHOT_PATH = ''
+ALLOWED_HOSTS = ['testserver']
+DEBUG = False
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
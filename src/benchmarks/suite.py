@@ -0,0 +1,208 @@
+"""Runs the reproducible benchmark suite and compares it with a previous run.
+
+Run from src/:
+
+    python -m benchmarks.suite [--quick] [--output results.json] [--compare baseline.json] [--threshold 0.1]
+
+Rules and payloads come from benchmarks.generators with a fixed seed, so two
+runs with the same options time the same work. The microbenchmarks time
+evaluate_condition, evaluate_rules and the compiled engines; the end-to-end
+benchmark posts to /api/rule-evaluation/evaluate/ through the test client.
+Everything runs in-process against an in-memory SQLite database
+(benchmarks.settings). --output writes the results as JSON; --compare reads an
+earlier file, reports the change of every benchmark and exits with status 1
+when any is slower by more than --threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from apps.authentication.models import User  # noqa: E402
+from apps.rules.compiler import CompiledRules, compile_condition  # noqa: E402
+from apps.rules.ruleset import compile_ruleset  # noqa: E402
+from apps.rules.services import RuleEvaluation, RuleService  # noqa: E402
+from apps.rules.store import RuleEntry, rule_store  # noqa: E402
+from benchmarks.generators import RuleGenerator  # noqa: E402
+
+EVALUATE_URL = '/api/rule-evaluation/evaluate/'
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def summarize(samples, operations):
+    # samples are per-operation times in microseconds
+    return {
+        "unit": "us/op",
+        "operations": operations,
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "p95": percentile(samples, 0.95),
+        "p99": percentile(samples, 0.99),
+    }
+
+
+def time_rounds(function, items, rounds):
+    # One sample per round: the mean time per item over the whole list
+    for item in items[:max(len(items) // 10, 1)]:
+        function(item)
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for item in items:
+            function(item)
+        samples.append((time.perf_counter() - started) / len(items) * 1e6)
+    return summarize(samples, len(items) * rounds)
+
+
+def run_microbenchmarks(rules, payloads, rounds):
+    ruleset = compile_ruleset([RuleEntry(index, name, condition, None) for index, (name, condition) in enumerate(rules)])
+    compiled_rules = CompiledRules((name, compile_condition(condition)) for name, condition in rules)
+    expected = [RuleEvaluation.evaluate_rules(rules, payload) for payload in payloads]
+    assert [RuleEvaluation.evaluate_compiled_rules(compiled_rules, payload) for payload in payloads] == expected, "compiled disagrees with the interpreter"
+    assert [ruleset(payload, False) for payload in payloads] == expected, "ruleset disagrees with the interpreter"
+
+    pairs = [(condition, payload) for payload in payloads for _, condition in rules][:len(payloads) * 4]
+    return {
+        "evaluate_condition": time_rounds(lambda pair: RuleEvaluation.evaluate_condition(*pair), pairs, rounds),
+        "evaluate_rules": time_rounds(lambda payload: RuleEvaluation.evaluate_rules(rules, payload), payloads, rounds),
+        "evaluate_compiled_rules": time_rounds(lambda payload: RuleEvaluation.evaluate_compiled_rules(compiled_rules, payload), payloads, rounds),
+        "ruleset": time_rounds(lambda payload: ruleset(payload, False), payloads, rounds),
+    }
+
+
+def run_endpoint(rules, payloads, rounds):
+    call_command('migrate', verbosity=0, interactive=False)
+    admin_user = User.objects.create_user(email='bench@example.com', password='password123', role='admin')
+    rule_service = RuleService()
+    for name, condition in rules:
+        rule_service.create(name=name, condition=condition, created_by=admin_user)
+    rule_store.clear()
+
+    client = APIClient()
+    response = client.post('/api/auth/login/', {'email': 'bench@example.com', 'password': 'password123'}, format='json')
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+    names = [name for name, _ in rules]
+    bodies = [json.dumps({"rules": names, "payload": payload}) for payload in payloads]
+
+    def evaluate(body):
+        response = client.post(EVALUATE_URL, body, content_type='application/json')
+        assert response.status_code == 200, response.content
+
+    for body in bodies[:max(len(bodies) // 10, 1)]:
+        evaluate(body)
+    # Unlike the microbenchmarks every request is a sample, so the percentiles are request latencies
+    samples = []
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for body in bodies:
+            request_started = time.perf_counter()
+            evaluate(body)
+            samples.append((time.perf_counter() - request_started) * 1e6)
+    elapsed = time.perf_counter() - started
+    result = summarize(samples, len(samples))
+    result["requests_per_second"] = len(samples) / elapsed
+    return {"endpoint_evaluate": result}
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print(f"\n{'benchmark':<26}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, result in results["benchmarks"].items():
+        previous = baseline["benchmarks"].get(name)
+        if previous is None:
+            print(f"{name:<26}{'-':>12}{result['median']:>12.2f}{'new':>10}")
+            continue
+        change = result["median"] / previous["median"] - 1
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<26}{previous['median']:>12.2f}{result['median']:>12.2f}{change:>+10.1%}{flag}")
+    if baseline["meta"]["config"] != results["meta"]["config"]:
+        print("warning: the baseline was run with different options, the numbers aren't comparable")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rules', type=int, default=32)
+    parser.add_argument('--payloads', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=500, help="requests per round for the endpoint benchmark")
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--fan-out', type=int, default=3)
+    parser.add_argument('--overlap', type=float, default=0.3)
+    parser.add_argument('--operators', default='', help="operator weights, e.g. '==:3,>:1,contains:1' (all operators equally by default)")
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--quick', action='store_true', help="a tenth of the payloads and requests, for a smoke run")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare with")
+    parser.add_argument('--threshold', type=float, default=0.1, help="relative slowdown of the median reported as a regression")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.payloads = max(args.payloads // 10, 1)
+        args.requests = max(args.requests // 10, 1)
+    operators = None
+    if args.operators:
+        operators = {operator: float(weight) for operator, weight in (item.rsplit(':', 1) for item in args.operators.split(','))}
+    config = {
+        "seed": args.seed, "rules": args.rules, "payloads": args.payloads, "requests": args.requests,
+        "depth": args.depth, "fan_out": args.fan_out, "overlap": args.overlap,
+        "operators": args.operators, "rounds": args.rounds,
+    }
+
+    generator = RuleGenerator(seed=args.seed, depth=args.depth, fan_out=args.fan_out, operators=operators, overlap=args.overlap)
+    rules = generator.rules(args.rules)
+    payloads = generator.payloads(args.payloads)
+
+    benchmarks = run_microbenchmarks(rules, payloads, args.rounds)
+    benchmarks.update(run_endpoint(rules, payloads[:args.requests], args.rounds))
+    results = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "django": django.get_version(),
+            "config": config,
+        },
+        "benchmarks": benchmarks,
+    }
+
+    print(f"{len(rules)} rules, {len(payloads)} payloads, {args.rounds} rounds")
+    for name, result in benchmarks.items():
+        extra = f"  {result['requests_per_second']:.0f} req/s" if "requests_per_second" in result else ''
+        print(f"{name:<26}median {result['median']:10.2f}  p95 {result['p95']:10.2f}  p99 {result['p99']:10.2f} {result['unit']}{extra}")
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
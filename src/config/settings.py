@@ -131,10 +131,23 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'authentication.User'
 
+AUTH_STATELESS_JWT = os.getenv('AUTH_STATELESS_JWT', 'False') == 'True'
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
+        'apps.authentication.authentication.StatelessJWTAuthentication'
+        if AUTH_STATELESS_JWT else
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    'DEFAULT_PARSER_CLASSES': (
+        'apps.core.fastjson.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'apps.core.fastjson.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
@@ -165,6 +178,52 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+REDIS_CACHE_URL = os.getenv('REDIS_CACHE_URL', '')
+
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+        }
+    }
+
+RULE_COMPILED_CACHE_SIZE = int(os.getenv('RULE_COMPILED_CACHE_SIZE', '1024'))
+RULE_STORE_MAX_VERSIONS = int(os.getenv('RULE_STORE_MAX_VERSIONS', '8'))
+RULE_STORE_VERSION_CHECK_INTERVAL = float(os.getenv('RULE_STORE_VERSION_CHECK_INTERVAL', '1.0'))
+RULE_STORE_SHARED_RULESET_TIMEOUT = int(os.getenv('RULE_STORE_SHARED_RULESET_TIMEOUT', '3600'))
+RULE_STORE_PUBSUB_URL = os.getenv('RULE_STORE_PUBSUB_URL', REDIS_CACHE_URL)
+RULE_STORE_SNAPSHOT_PATH = os.getenv('RULE_STORE_SNAPSHOT_PATH', '')
+RULE_STORE_COMPACT = os.getenv('RULE_STORE_COMPACT', 'False') == 'True'
+RULE_SNAPSHOT_RETENTION = int(os.getenv('RULE_SNAPSHOT_RETENTION', '100'))
+RULE_SNAPSHOT_PIN_TIMEOUT = int(os.getenv('RULE_SNAPSHOT_PIN_TIMEOUT', '86400'))
+RULE_EVALUATION_BATCH_MAX_SIZE = int(os.getenv('RULE_EVALUATION_BATCH_MAX_SIZE', '1000'))
+RULE_EVALUATION_STREAM_CHUNK_SIZE = int(os.getenv('RULE_EVALUATION_STREAM_CHUNK_SIZE', '1000'))
+# The adaptive engine records node statistics on one request in every
+# RULE_ADAPTIVE_SAMPLE_INTERVAL and reorders a rule every
+# RULE_ADAPTIVE_REORDER_INTERVAL of those sampled evaluations
+RULE_ADAPTIVE_REORDER_INTERVAL = int(os.getenv('RULE_ADAPTIVE_REORDER_INTERVAL', '100'))
+RULE_ADAPTIVE_SAMPLE_INTERVAL = int(os.getenv('RULE_ADAPTIVE_SAMPLE_INTERVAL', '16'))
+RULE_RULESET_CACHE_SIZE = int(os.getenv('RULE_RULESET_CACHE_SIZE', '128'))
+RULE_RESULT_CACHE_ENABLED = os.getenv('RULE_RESULT_CACHE_ENABLED', 'False') == 'True'
+RULE_RESULT_CACHE_SHARED = os.getenv('RULE_RESULT_CACHE_SHARED', 'False') == 'True'
+RULE_RESULT_CACHE_SIZE = int(os.getenv('RULE_RESULT_CACHE_SIZE', '10000'))
+RULE_RESULT_CACHE_TTL = float(os.getenv('RULE_RESULT_CACHE_TTL', '60'))
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+# Seconds between each process publishing its metrics to the shared cache, for
+# /metrics to add up every web and Celery worker process; 0 reports only the
+# process serving the scrape
+METRICS_PUBLISH_INTERVAL = float(os.getenv('METRICS_PUBLISH_INTERVAL', '10' if REDIS_CACHE_URL else '0'))
+METRICS_RULE_SAMPLE_RATE = float(os.getenv('METRICS_RULE_SAMPLE_RATE', '0.01'))
+# Required to scrape /metrics unless DEBUG is on
+METRICS_AUTH_TOKEN = os.getenv('METRICS_AUTH_TOKEN', '')
+# Time sampled evaluations rule by rule, labelled with the rule names
+METRICS_RULE_LABELS = os.getenv('METRICS_RULE_LABELS', 'False') == 'True'
+RULE_SERVER_TIMING = os.getenv('RULE_SERVER_TIMING', 'False') == 'True'
+RULE_PROFILE_MAX_PER_MINUTE = int(os.getenv('RULE_PROFILE_MAX_PER_MINUTE', '10'))
+RULE_PROFILE_TOP = int(os.getenv('RULE_PROFILE_TOP', '25'))
+
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
         'Bearer': {
@@ -20,6 +20,8 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from apps.core.views import metrics
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Rule Engine API",
@@ -35,6 +37,7 @@ urlpatterns = [
     
     path('api/auth/', include('apps.authentication.urls')),
     path('api/', include('apps.rules.urls')),
+    path('metrics', metrics, name='metrics'),
     
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),